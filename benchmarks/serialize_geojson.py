@@ -0,0 +1,92 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+
+Compares the GeoJSON serialization paths on a synthetic point layer:
+
+    python benchmarks/serialize_geojson.py --num-points 200000
+"""
+
+import click
+import json
+import numpy as np
+
+from timeit import default_timer
+
+from shapely import points
+
+from map_maker.util import GeometryTable, dumps_geojson, to_geojson
+from map_maker.util.serialize import orjson
+
+
+def _make_table(num_points, seed=42):
+    rng = np.random.default_rng(seed)
+    coords = rng.uniform([-106.0, 26.0], [-94.0, 36.0], size=(num_points, 2))
+    return GeometryTable.from_shapes(
+        points(coords),
+        {
+            "color": rng.choice(["red", "green", "blue"], num_points).astype(
+                object
+            ),
+            "alpha": rng.uniform(0.1, 1.0, num_points),
+            "count": rng.integers(0, 1000, num_points),
+            "name": np.array(
+                ["sighting {}".format(ii) for ii in range(num_points)],
+                dtype=object,
+            ),
+        },
+    )
+
+
+def _time(label, func, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        start = default_timer()
+        result = func()
+        best = min(best, default_timer() - start)
+    click.echo(
+        "{:<40} {:>8.3f}s {:>10.1f}MB".format(label, best, len(result) / 1e6)
+    )
+
+
+@click.command()
+@click.option("--num-points", "-n", type=int, default=200000)
+@click.option("--repeat", "-r", type=int, default=3)
+def main(num_points, repeat):
+    table = _make_table(num_points)
+    args = (table, "black", 0.3, 2.0)
+
+    click.echo("{} points".format(num_points))
+    _time(
+        "json.dumps(to_geojson(...))",
+        lambda: json.dumps(to_geojson(*args)),
+        repeat,
+    )
+    _time(
+        "dumps_geojson(..., encoder='json')",
+        lambda: dumps_geojson(*args, encoder="json"),
+        repeat,
+    )
+    if orjson is not None:
+        _time(
+            "dumps_geojson(..., encoder='orjson')",
+            lambda: dumps_geojson(*args, encoder="orjson"),
+            repeat,
+        )
+    else:
+        click.echo("orjson isn't installed, skipping.")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,4 +16,31 @@ limitations under the License.
 
 from .map_maker import base_map_plot, make_map_plot
 
-__all__ = ["base_map_plot", "make_map_plot"]
+# The server needs bokeh.events.RangesUpdate (Bokeh 2.4), so it's only
+# imported when it's used and the map makers still work on older Bokeh.
+_SERVER = (
+    "make_viewport_document",
+    "make_vector_tile_document",
+    "serve_map_plot",
+    "serve_vector_tiles",
+)
+
+
+def __getattr__(name):
+    if name in _SERVER:
+        from . import server
+
+        return getattr(server, name)
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+
+__all__ = [
+    "base_map_plot",
+    "make_map_plot",
+    "make_viewport_document",
+    "make_vector_tile_document",
+    "serve_map_plot",
+    "serve_vector_tiles",
+]
@@ -15,15 +15,41 @@ limitations under the License.
 """
 
 import bokeh.plotting as bp
-import json
+import numpy as np
 
 from bokeh.tile_providers import get_provider, Vendors
-from bokeh.models import GeoJSONDataSource, HoverTool
+from bokeh.models import (
+    CDSView,
+    ColumnDataSource,
+    CustomJS,
+    HoverTool,
+    IndexFilter,
+)
 from toolz import compose, dissoc
-from map_maker.util import extract_geometries, get_bounds, to_geojson
+from map_maker.util import (
+    extract_geometry_tables,
+    to_property_columns,
+    BoundsAccumulator,
+    GeometryTable,
+    hexbin_geometry_tables,
+    pixel_tolerance,
+    rasterize_geometry_tables,
+    simplify_table,
+    ClusterIndex,
+    cluster_columns,
+    zoom_for_extent,
+)
+from map_maker.util.cluster import MERC_HALF_WORLD, TILE_SIZE
+from map_maker.util.util import lla_to_merc_coords
 
 listmap = compose(list, map)
 
+OUTPUT_BACKENDS = ("canvas", "svg", "webgl")
+
+# The number of points and linestrings above which make_map_plot switches to
+# the WebGL output backend when none is given.
+WEBGL_THRESHOLD = 10000
+
 
 def _get_tooltips(shape_datum):
     """ Generate the tooltip specifier for the plot.
@@ -36,6 +62,167 @@ def _get_tooltips(shape_datum):
     ]
 
 
+def _point_columns(points, default_color, default_alpha, default_size):
+    """ Builds the x / y and property columns of a point table.
+    """
+    # Points are exploded during extraction, so each row is one coordinate.
+    # The coordinate columns take precedence over properties of the same name.
+    return {
+        **to_property_columns(
+            points, default_color, default_alpha, default_size
+        ),
+        "x": points.coords[:, 0],
+        "y": points.coords[:, 1],
+    }
+
+
+def _point_source(points, default_color, default_alpha, default_size):
+    """ Builds a ColumnDataSource with x / y arrays for a point table.
+    """
+    return ColumnDataSource(
+        _point_columns(points, default_color, default_alpha, default_size)
+    )
+
+
+def _ragged_columns(
+    table, default_color, default_alpha, default_size, exteriors_only=False
+):
+    """ Builds the xs / ys and property columns of a linestring or polygon
+        table. Multi-part shapes are NaN separated.
+    """
+    xs, ys = table.ragged_xy(exteriors_only=exteriors_only)
+    return {
+        **to_property_columns(
+            table, default_color, default_alpha, default_size
+        ),
+        "xs": xs,
+        "ys": ys,
+    }
+
+
+def _ragged_source(
+    table, default_color, default_alpha, default_size, exteriors_only=False
+):
+    """ Builds a ColumnDataSource with xs / ys arrays for a linestring or
+        polygon table. Multi-part shapes are NaN separated.
+    """
+    return ColumnDataSource(
+        _ragged_columns(
+            table, default_color, default_alpha, default_size, exteriors_only
+        )
+    )
+
+
+# Points the view of the cluster levels at the level for the zoom level
+# (computed from the x range, like the tile zoom) when it changes.
+_CLUSTER_CALLBACK = """
+const zoom = Math.floor(Math.log2(
+    {plot_width} * {world} / ({tile_size} * (cb_obj.end - cb_obj.start))
+));
+const level = Math.max(0, Math.min(zoom - {min_zoom}, {n_levels} - 1));
+if (view._cluster_level === level) {{
+    return;
+}}
+view._cluster_level = level;
+const offsets = {offsets};
+const indices = [];
+for (let i = offsets[level]; i < offsets[level + 1]; i++) {{
+    indices.push(i);
+}}
+view.filters[0].indices = indices;
+// The view only recomputes its indices when the source changes.
+levels.change.emit();
+"""
+
+
+def _cluster_source(
+    points, default_color, default_alpha, default_size, x_range, plot_width
+):
+    """ Builds the ColumnDataSource with every cluster level for clustered
+        points, a view showing the level for the initial x range, and the
+        callback that moves the view to another level as the plot zooms.
+    """
+    index = ClusterIndex(points.coords)
+    columns, offsets = cluster_columns(
+        index,
+        to_property_columns(
+            points, default_color, default_alpha, default_size
+        ),
+        default_color,
+        default_alpha,
+        default_size,
+    )
+    n_levels = len(offsets) - 1
+    zoom = zoom_for_extent(x_range[1] - x_range[0], plot_width)
+    level = int(
+        np.clip(np.floor(zoom) - index.min_zoom, 0, n_levels - 1)
+    )
+    levels = ColumnDataSource(columns)
+    # Every level is in the one source, the view picks the current one.
+    view = CDSView(
+        source=levels,
+        filters=[IndexFilter(list(range(offsets[level], offsets[level + 1])))],
+    )
+    callback = CustomJS(
+        args={"levels": levels, "view": view},
+        code=_CLUSTER_CALLBACK.format(
+            plot_width=plot_width,
+            world=2 * MERC_HALF_WORLD,
+            tile_size=TILE_SIZE,
+            min_zoom=index.min_zoom,
+            n_levels=n_levels,
+            offsets=offsets.tolist(),
+        ),
+    )
+    return levels, view, callback
+
+
+def _draw_layers(
+    map_figure,
+    point_source,
+    linestring_source,
+    polygon_source,
+    point_view=None,
+):
+    """ Draws the points, linestrings and polygons sources that aren't None
+        with glyphs named after the layers, styled from their color, alpha
+        and size columns. The points are drawn through point_view if given.
+    """
+    if point_source is not None:
+        view = {} if point_view is None else {"view": point_view}
+        map_figure.circle(
+            x="x",
+            y="y",
+            size="size",
+            alpha="alpha",  # Pulled from the property columns.
+            color="color",  # Pulled from the property columns.
+            line_width=0,
+            source=point_source,
+            name="points",
+            **view,
+        )
+    if linestring_source is not None:
+        map_figure.multi_line(
+            xs="xs",
+            ys="ys",
+            line_alpha="alpha",
+            color="color",
+            line_width="size",
+            source=linestring_source,
+            name="linestrings",
+        )
+    if polygon_source is not None:
+        map_figure.patches(
+            xs="xs",
+            ys="ys",
+            fill_alpha="alpha",  # Pulled from the property columns.
+            color="color",  # Pulled from the property columns.
+            line_width="size",
+            source=polygon_source,
+            name="polygons",
+        )
+
+
 def base_map_plot(
     x_range,
     y_range,
@@ -43,6 +230,7 @@ def base_map_plot(
     plot_height=800,
     plot_width=800,
     tiles=get_provider(Vendors.CARTODBPOSITRON_RETINA),
+    output_backend="canvas",
 ):
 
     """ Builds a blank map tile plot.
@@ -70,14 +258,27 @@ def base_map_plot(
     tiles : :obj:`bokeh.models.tiles.WMSTTileSource`
         The tile source for the blank map. Default is CartoDB Positron Retina.
 
+    output_backend : str, default "canvas"
+        The Bokeh output backend, one of "canvas", "svg" or "webgl". WebGL
+        draws the point and line glyphs on the GPU, which keeps large maps
+        responsive when panning and zooming.
+
     Returns
     -------
     fig : :obj:`bokeh.plotting.Figure`
         The Bokeh Figure for the blank map.
     """
 
+    if output_backend not in OUTPUT_BACKENDS:
+        raise ValueError(
+            "Unknown output backend {}, must be one of {}.".format(
+                output_backend, ", ".join(OUTPUT_BACKENDS)
+            )
+        )
+
     # Draw the main figure.
     p = bp.figure(
+        output_backend=output_backend,
         tools=tools,
         plot_width=plot_width,
         plot_height=plot_height,
@@ -110,6 +311,24 @@ def make_map_plot(
     polygon_line_width=2,
     linestring_width=2,
     tooltips={"points"},
+    shape_format=None,
+    shape_cache=None,
+    output_backend=None,
+    cluster=False,
+    simplify=False,
+    preserve_topology=True,
+    coordinate_precision=None,
+    raster=None,
+    raster_column=None,
+    raster_cmap=None,
+    raster_shade="eq_hist",
+    hexbin=None,
+    hexbin_column=None,
+    hexbin_size=None,
+    hexbin_cmap=None,
+    chunk_size=100000,
+    workers=None,
+    aggregate_bounds=None,
 ):
     """ Creates a Bokeh map from a list of dicts with geometry / style info.
 
@@ -118,16 +337,17 @@ def make_map_plot(
     .. code-block :: python
 
         {
-            "shape": # WKT | GeoJSON String | Geo-Interface | Shapely Geometry
+            "shape": # WKT | GeoJSON String | (Hex) WKB | Geo-Interface
+                     # | Shapely Geometry
             "alpha": # Alpha value of the fill.
             "color": # Color of the shape
         }
 
     Parameters
     ----------
-    map_data : :obj:`list` of :obj:`dict`
-        A list of dictionaries defining the shape and style to map with the
-        fields defined above.
+    map_data : iterable of :obj:`dict`
+        The dictionaries defining the shape and style to map with the fields
+        defined above.
 
     plot_height : int
         The height of the plot in px.
@@ -152,17 +372,194 @@ def make_map_plot(
         The labels of tooltips to display, can be "points", "linestrings",
         "polygons" or both any combination.
 
+    shape_format : str, optional
+        The serialization format of the shapes, one of "wkt", "geojson",
+        "wkb", "hexwkb", "mapping" or "shapely". Detected from the data if
+        not provided.
+
+    shape_cache : :obj:`map_maker.util.ShapeCache`, optional
+        A cache of parsed shapes, so that shapes repeated across rows (or
+        across calls) are only parsed and projected once.
+
+    output_backend : str, optional
+        The Bokeh output backend, one of "canvas", "svg" or "webgl". If not
+        provided, WebGL is used when there are more than WEBGL_THRESHOLD
+        points and linestrings, and canvas otherwise.
+
+    cluster : bool, default False
+        Whether to draw the points as clusters. The cluster levels for
+        every zoom level are precomputed and embedded in the plot, and
+        only the clusters for the current zoom level are drawn. The
+        point tooltips show the number of points in each cluster.
+
+    simplify : bool or float, default False
+        Whether to simplify the linestrings and polygons with
+        Douglas-Peucker before drawing them. True picks a tolerance of
+        about one pixel at the initial view, a float sets the tolerance in
+        Web Mercator meters.
+
+    preserve_topology : bool, default True
+        Whether simplification keeps the shapes valid, at some extra cost.
+
+    coordinate_precision : int, optional
+        The number of decimals to round the Web Mercator coordinates to, 1
+        is 0.1m. The coordinate arrays are binary encoded, so this makes
+        the values tidier rather than the file smaller.
+
+    raster : str, optional
+        Draw the points as an image aggregated into a pixel grid instead of
+        as glyphs: "count", "sum" or "mean" of raster_column, or
+        "categorical" for counts of every value of raster_column. The
+        data is streamed through the grid in chunks, so memory is bounded
+        by the grid rather than the number of points.
+
+    raster_column : str, optional
+        The column to aggregate for the "sum", "mean" and "categorical"
+        rasters.
+
+    raster_cmap : :obj:`list` of str, optional
+        The "#rrggbb" colors to ramp through for the raster (or to give
+        the categories). Default is light blue to dark blue.
+
+    raster_shade : str, default "eq_hist"
+        How the raster values are scaled to the colors, "eq_hist"
+        (histogram equalization), "log" or "linear".
+
+    hexbin : str, optional
+        Draw the points as hexagonal cells instead of glyphs, colored by
+        the "count", or the "sum" or "mean" of hexbin_column, of the
+        points in each cell. The hexagons are drawn as one polygon layer,
+        with the points tooltips showing the aggregate. Like the raster,
+        the points are streamed through the cells in chunks. Can't be
+        combined with raster.
+
+    hexbin_column : str, optional
+        The column to aggregate for the "sum" and "mean" hexbins.
+
+    hexbin_size : float, optional
+        The radius of the hexagons in pixels. Default is a fiftieth of
+        plot_width.
+
+    hexbin_cmap : :obj:`list` of str, optional
+        The "#rrggbb" colors to ramp through for the hexagons. Default is
+        light blue to dark blue.
+
+    chunk_size : int, default 100000
+        The number of rows of map_data parsed at a time. Only the compact
+        per-layer tables are kept, so map_data can be a stream (a csv
+        reader, say) without ever being held in memory whole.
+
+    workers : int, optional
+        The number of processes to parse and project the chunks with.
+        Default is to parse them in this process.
+
+    aggregate_bounds : tuple of float, optional
+        The (min_lon, min_lat, max_lon, max_lat) box the raster or hexbin
+        covers, when it's known up front (the bbox the data was read with,
+        say). Default is the extent of the data, which means keeping the
+        point coordinates until all of it is read.
+
     Returns
     -------
     fig : :obj:`bokeh.plotting.Figure`
         The Bokeh Figure for the map.
     """
     # Collect the points and polygons.
-    # The data's the same, with a 'shape_obj' field containing the shape
-    # object.
-    points, linestrings, polygons = extract_geometries(map_data)
+    # Each layer is a GeometryTable with the other fields as property columns.
+    # The bounds are collected while the data streams through.
+    if raster and hexbin:
+        raise ValueError("Only one of raster and hexbin can be drawn.")
+    if aggregate_bounds is not None:
+        aggregate_bounds = tuple(
+            lla_to_merc_coords(
+                np.array(aggregate_bounds, dtype=float).reshape(2, 2)
+            ).ravel()
+        )
+    bounds = BoundsAccumulator()
+    aggregator = None
+    hexes = None
+    if raster:
+        # The points go into the raster grid as they stream through.
+        (
+            aggregator,
+            linestrings,
+            polygons,
+            raster_bounds,
+        ) = rasterize_geometry_tables(
+            map_data,
+            plot_width,
+            plot_height,
+            how=raster,
+            column=raster_column,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            bounds=aggregate_bounds,
+            workers=workers,
+        )
+        points = GeometryTable.concat([])
+        bounds.update(raster_bounds)
+    elif hexbin:
+        # The points go into the hexagonal cells as they stream through.
+        (
+            hex_aggregator,
+            linestrings,
+            polygons,
+            hexbin_bounds,
+        ) = hexbin_geometry_tables(
+            map_data,
+            plot_width,
+            size=hexbin_size,
+            how=hexbin,
+            column=hexbin_column,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            bounds=aggregate_bounds,
+            workers=workers,
+        )
+        hexes = hex_aggregator.to_table(cmap=hexbin_cmap)
+        points = GeometryTable.concat([])
+        bounds.update(hexbin_bounds)
+    else:
+        points, linestrings, polygons = extract_geometry_tables(
+            map_data,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            workers=workers,
+            bounds=bounds,
+        )
 
-    min_x, min_y, max_x, max_y = get_bounds(points + polygons)
+    if bounds.bounds is None:
+        raise ValueError("There are no shapes to map.")
+    min_x, min_y, max_x, max_y = bounds.bounds
+
+    if simplify:
+        tolerance = (
+            pixel_tolerance(bounds.bounds, plot_width, plot_height)
+            if simplify is True
+            else simplify
+        )
+        linestrings, _ = simplify_table(
+            linestrings, tolerance, preserve_topology
+        )
+        polygons, _ = simplify_table(polygons, tolerance, preserve_topology)
+
+    # The tables only hold x / y, so Z (and M) are already gone.
+    if coordinate_precision is not None:
+        points = points.round(coordinate_precision)
+        linestrings = linestrings.round(coordinate_precision)
+        polygons = polygons.round(coordinate_precision)
+
+    # WebGL accelerates the point and line glyphs, polygons are drawn on the
+    # canvas either way.
+    if output_backend is None:
+        output_backend = (
+            "webgl"
+            if len(points) + len(linestrings) > WEBGL_THRESHOLD
+            else "canvas"
+        )
 
     map_figure = base_map_plot(
         [min_x, max_x],
@@ -170,15 +567,19 @@ def make_map_plot(
         plot_height=plot_height,
         plot_width=plot_width,
         tiles=tiles,
+        output_backend=output_backend,
     )
 
-    # NOTE This assumes the first point / polygon is representative of all
-    # fields. For CLI this is true, for a library call this may not be true.
-    point_tooltips = _get_tooltips(points[0]) if points else None
+    # The tooltips come from the property columns of each layer.
+    point_tooltips = _get_tooltips(points.properties) if len(points) else None
+    if cluster and len(points):
+        point_tooltips = [("count", "@count")]
     linestring_tooltips = (
-        _get_tooltips(linestrings[0]) if linestrings else None
+        _get_tooltips(linestrings.properties) if len(linestrings) else None
+    )
+    polygon_tooltips = (
+        _get_tooltips(polygons.properties) if len(polygons) else None
     )
-    polygon_tooltips = _get_tooltips(polygons[0]) if polygons else None
 
     if point_tooltips and ("points" in tooltips):
         hover = HoverTool(tooltips=point_tooltips, names=["points"])
@@ -195,48 +596,72 @@ def make_map_plot(
 
         map_figure.add_tools(hover)
 
-    if points:
-        map_figure.circle(
-            x="x",
-            y="y",
-            size="size",
-            alpha="alpha",  # Pulled from geojson properties.
-            color="color",  # Pulled from geojson properties.
-            line_width=0,
-            source=GeoJSONDataSource(
-                geojson=json.dumps(
-                    to_geojson(points, "black", 0.3, point_size)
-                )
-            ),
-            name="points",
+    if hexes is not None and len(hexes) and ("points" in tooltips):
+        hover = HoverTool(
+            tooltips=_get_tooltips(hexes.properties), names=["hexbin"]
         )
-    if linestrings:
-        map_figure.multi_line(
-            xs="xs",
-            ys="ys",
-            line_alpha="alpha",
-            color="color",
-            line_width="size",
-            source=GeoJSONDataSource(
-                geojson=json.dumps(
-                    to_geojson(linestrings, "black", 0.3, linestring_width)
-                )
-            ),
-            name="linestrings",
+
+        map_figure.add_tools(hover)
+
+    if aggregator is not None:
+        image = aggregator.shade(
+            cmap=raster_cmap, how=raster_shade, category_colors=raster_cmap
+        )
+        raster_min_x, raster_min_y, raster_max_x, raster_max_y = (
+            aggregator.bounds
         )
-    if polygons:
+        # The RGBA bytes of every pixel, packed the way image_rgba takes
+        # them. Row 0 is the bottom of the image, like the grid.
+        map_figure.image_rgba(
+            image=[image.view(np.uint32).reshape(image.shape[:2])],
+            x=raster_min_x,
+            y=raster_min_y,
+            dw=raster_max_x - raster_min_x,
+            dh=raster_max_y - raster_min_y,
+            name="raster",
+        )
+
+    if hexes is not None:
+        # No outlines, so the hexagons tile without gaps.
         map_figure.patches(
             xs="xs",
             ys="ys",
-            fill_alpha="alpha",  # Pulled from geojson properties.
-            color="color",  # Pulled from geojson properties.
+            fill_alpha="alpha",
+            color="color",
             line_width="size",
-            source=GeoJSONDataSource(
-                geojson=json.dumps(
-                    to_geojson(polygons, "lightblue", 0.3, polygon_line_width)
-                )
-            ),
-            name="polygons",
+            source=_ragged_source(hexes, "lightblue", 0.7, 0),
+            name="hexbin",
+        )
+
+    point_source = linestring_source = polygon_source = point_view = None
+    if len(points):
+        if cluster:
+            point_source, point_view, callback = _cluster_source(
+                points, "black", 0.3, point_size, [min_x, max_x], plot_width
+            )
+            map_figure.x_range.js_on_change("start", callback)
+            map_figure.x_range.js_on_change("end", callback)
+        else:
+            point_source = _point_source(points, "black", 0.3, point_size)
+    if len(linestrings):
+        linestring_source = _ragged_source(
+            linestrings, "black", 0.3, linestring_width
         )
+    if len(polygons):
+        # Patches can't draw holes, so only the exteriors are used.
+        polygon_source = _ragged_source(
+            polygons,
+            "lightblue",
+            0.3,
+            polygon_line_width,
+            exteriors_only=True,
+        )
+    _draw_layers(
+        map_figure,
+        point_source,
+        linestring_source,
+        polygon_source,
+        point_view,
+    )
 
     return map_figure
@@ -0,0 +1,389 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+import numpy as np
+
+from bokeh.application import Application
+from bokeh.application.handlers import FunctionHandler
+from bokeh.events import RangesUpdate
+from bokeh.models import ColumnDataSource, HoverTool
+from bokeh.server.server import Server
+from bokeh.tile_providers import get_provider, Vendors
+
+from map_maker.tiles import read_metadata, read_tiles
+from map_maker.util import (
+    LAYERS,
+    extract_geometry_tables,
+    zoom_for_extent,
+    ViewportIndex,
+)
+from map_maker.util.util import lla_to_merc_coords
+
+from .map_maker import (
+    base_map_plot,
+    _draw_layers,
+    _get_tooltips,
+    _point_columns,
+    _ragged_columns,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def make_viewport_document(
+    index,
+    plot_height=800,
+    plot_width=800,
+    tiles=get_provider(Vendors.CARTODBPOSITRON_RETINA),
+    point_size=2.0,
+    polygon_line_width=2.0,
+    linestring_width=2.0,
+    tooltips={"points"},
+    preserve_topology=True,
+    output_backend="canvas",
+):
+    """ Builds a Bokeh server application function that draws the shapes
+    in a ViewportIndex, loading only what's visible.
+
+    Every session gets a map plot whose sources hold just the shapes in the
+    current view, reduced to screen resolution: one point per pixel, and
+    linestrings and polygons simplified to about a pixel. Whenever the view
+    changes (after the pan or zoom ends) the sources are refilled from the
+    index, so drawing costs about what's visible rather than the whole
+    dataset.
+
+    Parameters
+    ----------
+    index : :obj:`map_maker.util.ViewportIndex`
+        The index of the projected shapes, shared by every session.
+
+    plot_height : int
+        The height of the plot in pixels.
+
+    plot_width : int
+        The width of the plot in pixels.
+
+    tiles : :obj:`bokeh.models.tiles.WMSTTileSource`
+        The tile source for the map. Default is CartoDB Positron Retina.
+
+    point_size : float
+        The default point size.
+
+    polygon_line_width : float
+        The default polygon line width.
+
+    linestring_width : float
+        The default linestring width.
+
+    tooltips : set
+        The labels of tooltips to display, can be "points", "linestrings",
+        and "polygons". Default is "points".
+
+    preserve_topology : bool, default True
+        Whether simplification keeps the shapes valid.
+
+    output_backend : str, default "canvas"
+        The Bokeh output backend, one of "canvas", "svg" or "webgl".
+
+    Returns
+    -------
+    make_document : callable
+        A function that fills in a :obj:`bokeh.document.Document`, for a
+        :obj:`bokeh.application.handlers.FunctionHandler`.
+    """
+    bounds = index.bounds()
+    if bounds is None:
+        raise ValueError("There are no shapes to map.")
+
+    tables = (index.points, index.linestrings, index.polygons)
+    return _query_document(
+        bounds,
+        # Layers with no shapes at all are left out.
+        {
+            name: table.properties
+            for name, table in zip(LAYERS, tables)
+            if len(table)
+        },
+        lambda view: index.query(
+            view, plot_width, plot_height, preserve_topology
+        ),
+        plot_height=plot_height,
+        plot_width=plot_width,
+        tiles=tiles,
+        point_size=point_size,
+        polygon_line_width=polygon_line_width,
+        linestring_width=linestring_width,
+        tooltips=tooltips,
+        output_backend=output_backend,
+    )
+
+
+def make_vector_tile_document(
+    tile_dir,
+    plot_height=800,
+    plot_width=800,
+    tiles=get_provider(Vendors.CARTODBPOSITRON_RETINA),
+    point_size=2.0,
+    polygon_line_width=2.0,
+    linestring_width=2.0,
+    tooltips={"points"},
+    output_backend="canvas",
+):
+    """ Builds a Bokeh server application function that draws a vector tile
+    pyramid written by map_maker.tiles.write_tiles.
+
+    Like make_viewport_document, but the shapes come from the tiles:
+    whenever the view changes the server reads and decodes the tiles of
+    the zoom level for the view that cover it, and refills the sources
+    with their shapes. Zoomed in past the pyramid, the tiles of its
+    highest zoom level are drawn.
+
+    Parameters
+    ----------
+    tile_dir : str
+        The directory with the tiles and metadata.json.
+
+    plot_height : int
+        The height of the plot in pixels.
+
+    plot_width : int
+        The width of the plot in pixels.
+
+    tiles : :obj:`bokeh.models.tiles.WMSTTileSource`
+        The tile source for the base map. Default is CartoDB Positron
+        Retina.
+
+    point_size : float
+        The default point size.
+
+    polygon_line_width : float
+        The default polygon line width.
+
+    linestring_width : float
+        The default linestring width.
+
+    tooltips : set
+        The labels of tooltips to display, can be "points", "linestrings",
+        and "polygons". Default is "points".
+
+    output_backend : str, default "canvas"
+        The Bokeh output backend, one of "canvas", "svg" or "webgl".
+
+    Returns
+    -------
+    make_document : callable
+        A function that fills in a :obj:`bokeh.document.Document`, for a
+        :obj:`bokeh.application.handlers.FunctionHandler`.
+    """
+    metadata = read_metadata(tile_dir)
+    bounds = tuple(
+        lla_to_merc_coords(
+            np.array(metadata["bounds"], dtype=float).reshape(2, 2)
+        ).ravel()
+    )
+
+    def _query(view):
+        zoom = zoom_for_extent(view[2] - view[0], plot_width)
+        z = int(
+            np.clip(np.floor(zoom), metadata["minzoom"], metadata["maxzoom"])
+        )
+        return read_tiles(tile_dir, z, view, metadata)
+
+    return _query_document(
+        bounds,
+        {
+            name: dict.fromkeys(metadata["layers"][name])
+            for name in LAYERS
+            if name in metadata["layers"]
+        },
+        _query,
+        plot_height=plot_height,
+        plot_width=plot_width,
+        tiles=tiles,
+        point_size=point_size,
+        polygon_line_width=polygon_line_width,
+        linestring_width=linestring_width,
+        tooltips=tooltips,
+        output_backend=output_backend,
+    )
+
+
+def _query_document(
+    bounds,
+    properties,
+    query,
+    plot_height,
+    plot_width,
+    tiles,
+    point_size,
+    polygon_line_width,
+    linestring_width,
+    tooltips,
+    output_backend,
+):
+    """ Builds the application function of a map whose sources are filled
+        with query(view) for the initial bounds and then every view, where
+        query returns (points, linestrings, polygons) GeometryTables. Only
+        the layers in properties (a dict of the property names of every
+        layer) get a source, with tooltips from their property names.
+    """
+    min_x, min_y, max_x, max_y = bounds
+
+    def _columns(points, linestrings, polygons):
+        return {
+            "points": _point_columns(points, "black", 0.3, point_size),
+            "linestrings": _ragged_columns(
+                linestrings, "black", 0.3, linestring_width
+            ),
+            # Patches can't draw holes, so only the exteriors are used.
+            "polygons": _ragged_columns(
+                polygons,
+                "lightblue",
+                0.3,
+                polygon_line_width,
+                exteriors_only=True,
+            ),
+        }
+
+    def make_document(doc):
+        map_figure = base_map_plot(
+            [min_x, max_x],
+            [min_y, max_y],
+            plot_height=plot_height,
+            plot_width=plot_width,
+            tiles=tiles,
+            output_backend=output_backend,
+        )
+
+        columns = _columns(*query(bounds))
+        sources = {
+            name: ColumnDataSource(columns[name]) for name in properties
+        }
+
+        for name in sources:
+            layer_tooltips = _get_tooltips(properties[name])
+            if layer_tooltips and name in tooltips:
+                map_figure.add_tools(
+                    HoverTool(tooltips=layer_tooltips, names=[name])
+                )
+
+        _draw_layers(
+            map_figure,
+            sources.get("points"),
+            sources.get("linestrings"),
+            sources.get("polygons"),
+        )
+
+        def update(event):
+            visible = query((event.x0, event.y0, event.x1, event.y1))
+            columns = _columns(*visible)
+            for name, source in sources.items():
+                source.data = columns[name]
+            logger.info(
+                "Loaded %d points, %d linestrings and %d polygons.",
+                *map(len, visible)
+            )
+
+        map_figure.on_event(RangesUpdate, update)
+        doc.add_root(map_figure)
+
+    return make_document
+
+
+def serve_map_plot(
+    map_data,
+    port=5006,
+    show=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    workers=None,
+    **kwargs
+):
+    """ Runs a local Bokeh server with a map of the shape data that loads
+    only what's visible as it's panned and zoomed. Blocks until interrupted.
+
+    Parameters
+    ----------
+    map_data : iterable of :obj:`dict`
+        The shape data dictionaries, as for make_map_plot.
+
+    port : int, default 5006
+        The port to serve the map on.
+
+    show : bool, default True
+        Whether to open the map in a browser.
+
+    shape_format : str, optional
+        The serialization format of the shapes, detected from the data if
+        not provided.
+
+    shape_cache : :obj:`map_maker.util.ShapeCache`, optional
+        A cache of parsed shapes.
+
+    chunk_size : int, default 100000
+        The number of rows of map_data parsed at a time.
+
+    workers : int, optional
+        The number of processes to parse and project the rows with.
+        Default is to parse them in this process.
+
+    **kwargs
+        The plot options of make_viewport_document.
+    """
+    tables = extract_geometry_tables(
+        map_data,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        workers=workers,
+    )
+    index = ViewportIndex(*tables)
+    _serve(make_viewport_document(index, **kwargs), port, show)
+
+
+def serve_vector_tiles(tile_dir, port=5006, show=True, **kwargs):
+    """ Runs a local Bokeh server with a map of a vector tile pyramid
+    written by map_maker.tiles.write_tiles, which reads the tiles in view
+    as it's panned and zoomed. Blocks until interrupted.
+
+    Parameters
+    ----------
+    tile_dir : str
+        The directory with the tiles and metadata.json.
+
+    port : int, default 5006
+        The port to serve the map on.
+
+    show : bool, default True
+        Whether to open the map in a browser.
+
+    **kwargs
+        The plot options of make_vector_tile_document.
+    """
+    _serve(make_vector_tile_document(tile_dir, **kwargs), port, show)
+
+
+def _serve(make_document, port, show):
+    application = Application(FunctionHandler(make_document))
+
+    server = Server({"/": application}, port=port)
+    server.start()
+    logger.info("Serving the map on http://localhost:%d/.", port)
+    if show:
+        server.io_loop.add_callback(server.show, "/")
+    server.io_loop.start()
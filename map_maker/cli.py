@@ -16,24 +16,57 @@ limitations under the License.
 
 
 import click
-import csv
-import sys
+import logging
 import webbrowser
 import os
 
 import bokeh.plotting as bp
 
-from csv import DictReader
-
 from bokeh.io import show
 
 from map_maker.bokeh import make_map_plot as make_map_plot_bokeh
-from map_maker.folium import make_map_plot as make_map_plot_folium
+from map_maker.folium import (
+    make_map_plot as make_map_plot_folium,
+    make_vector_tile_plot,
+)
+from map_maker.readers import ShapeFiles
+from map_maker.tiles import write_tiles
+
+
+class _DefaultGroup(click.Group):
+    """ A command group that runs the map command when the first argument
+        isn't one of its commands, so map_maker file.csv keeps working.
+    """
 
-csv.field_size_limit(sys.maxsize)
+    def parse_args(self, ctx, args):
+        if not args or (
+            args[0] not in self.commands and args[0] not in ("--help",)
+        ):
+            args = ["map"] + list(args)
+        return super().parse_args(ctx, args)
 
 
-@click.command()
+def _read_files(map_data_files, columns, bbox, *required_columns):
+    """ Opens the input files. When tooltip columns are given only those,
+        and the columns the map needs, are read from the columnar files.
+    """
+    if columns:
+        columns = list(columns) + [c for c in required_columns if c]
+    try:
+        return ShapeFiles(map_data_files, columns=columns or None, bbox=bbox)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="'--bbox'")
+
+
+@click.group(cls=_DefaultGroup)
+def cli():
+    """
+    Creates maps from csv files. Runs the map command unless another
+    command is given.
+    """
+
+
+@cli.command("map")
 @click.argument("map_data_files", type=str, nargs=-1)
 @click.option(
     "--plot-height",
@@ -95,7 +128,129 @@ csv.field_size_limit(sys.maxsize)
     help="The backend to draw the map with. Current choices are folium, bokeh."
     " Default: bokeh",
 )
-def cli(
+@click.option(
+    "--shape-format",
+    "-f",
+    type=click.Choice(["wkt", "geojson", "hexwkb"]),
+    default=None,
+    help="The format of the shape column. Default: detected from the data.",
+)
+@click.option(
+    "--webgl/--no-webgl",
+    default=None,
+    help="Whether to draw the bokeh map with WebGL. Default: WebGL when "
+    "there are more than 10,000 points and linestrings.",
+)
+@click.option(
+    "--cluster",
+    is_flag=True,
+    default=False,
+    help="Draw the points as clusters that split up as the map zooms in.",
+)
+@click.option(
+    "--simplify",
+    is_flag=True,
+    default=False,
+    help="Simplify the linestrings and polygons to about one pixel at the "
+    "initial view.",
+)
+@click.option(
+    "--preserve-topology/--no-preserve-topology",
+    default=True,
+    help="Whether simplification keeps the shapes valid. Default: "
+    "preserve topology.",
+)
+@click.option(
+    "--coordinate-precision",
+    "-p",
+    type=int,
+    default=None,
+    help="The number of decimals to round the coordinates to. Default: no "
+    "rounding.",
+)
+@click.option(
+    "--raster",
+    type=click.Choice(["count", "sum", "mean", "categorical"]),
+    default=None,
+    help="Draw the points as an aggregated image instead of glyphs. sum, "
+    "mean and categorical need --raster-column. Default: no raster.",
+)
+@click.option(
+    "--raster-column",
+    type=str,
+    default=None,
+    help="The column to aggregate for the sum, mean and categorical "
+    "rasters.",
+)
+@click.option(
+    "--raster-shade",
+    type=click.Choice(["eq_hist", "log", "linear"]),
+    default="eq_hist",
+    help="How the raster values are scaled to colors. Default: eq_hist.",
+)
+@click.option(
+    "--hexbin",
+    type=click.Choice(["count", "sum", "mean"]),
+    default=None,
+    help="Draw the points as hexagonal cells colored by an aggregate, "
+    "instead of --raster. sum and mean need --hexbin-column. Default: no "
+    "hexbin.",
+)
+@click.option(
+    "--hexbin-column",
+    type=str,
+    default=None,
+    help="The column to aggregate for the sum and mean hexbins.",
+)
+@click.option(
+    "--hexbin-size",
+    type=float,
+    default=None,
+    help="The radius of the hexagons in pixels. Default: the plot width "
+    "divided by 50.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="The number of processes parsing and projecting the rows. With "
+    "more than one, every file is split into byte ranges the processes read "
+    "on their own. Default: 1.",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=100000,
+    help="The number of csv rows parsed at a time, which bounds the memory "
+    "used for reading. Default: 100,000.",
+)
+@click.option(
+    "--column",
+    "-c",
+    type=str,
+    multiple=True,
+    help="A tooltip column to read from Parquet and Arrow files, along with "
+    "the shape and style columns. Stackable. Default: every column.",
+)
+@click.option(
+    "--bbox",
+    type=float,
+    nargs=4,
+    default=None,
+    help="Only map the shapes intersecting this MIN_LON MIN_LAT MAX_LON "
+    "MAX_LAT box. Parquet row groups outside it are skipped unread. Only for "
+    "Parquet and Arrow files. Default: everything.",
+)
+@click.option(
+    "--verbose",
+    "-v",
+    is_flag=True,
+    default=False,
+    help="Report what the map maker is doing, such as the number of "
+    "vertices simplification removed.",
+)
+def map_command(
     map_data_files,
     plot_height,
     plot_width,
@@ -105,14 +260,34 @@ def cli(
     output_file,
     tooltip,
     backend,
+    shape_format,
+    webgl,
+    cluster,
+    simplify,
+    preserve_topology,
+    coordinate_precision,
+    raster,
+    raster_column,
+    raster_shade,
+    hexbin,
+    hexbin_column,
+    hexbin_size,
+    jobs,
+    chunk_size,
+    column,
+    bbox,
+    verbose,
 ):
     """
     Creates a map from the input files
 
     Arguments: \n
-    MAP_DATA_FILES - The csv input file(s), requires the following columns:\n
+    MAP_DATA_FILES - The csv, Parquet (GeoParquet), Arrow (Feather), GeoJSON
+    or newline-delimited GeoJSON input file(s), requires the following
+    columns (GeoJSON feature properties):\n
 
-        shape - The shape in WKT format, in EPSG:4326 lat/lon coordinates.\n
+        shape - The shape in WKT, GeoJSON or hex WKB format, in EPSG:4326
+            lat/lon coordinates, or the GeoParquet or GeoJSON geometry.\n
         color [optional] - The color as a string.\n
         alpha [optional] - The alpha as a float.\n
         size [optional] - For points, the size of the point. For linestrings
@@ -123,11 +298,16 @@ def cli(
     different.
     """
 
-    map_data = []
-    for map_data_file in map_data_files:
-        with open(map_data_file, "r") as map_file:
-            reader = DictReader(map_file)
-            map_data.extend([line for line in reader])
+    if raster and hexbin:
+        raise click.UsageError("--raster and --hexbin can't be combined.")
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # The rows are streamed from the files in chunks, never all at once.
+    map_data = _read_files(
+        map_data_files, column, bbox, raster_column, hexbin_column
+    )
 
     if backend == "bokeh":
         map_plot = make_map_plot_bokeh(
@@ -138,6 +318,22 @@ def cli(
             polygon_line_width=polygon_line_width,
             linestring_width=linestring_width,
             tooltips=tooltip,
+            shape_format=shape_format,
+            cluster=cluster,
+            simplify=simplify,
+            preserve_topology=preserve_topology,
+            coordinate_precision=coordinate_precision,
+            raster=raster,
+            raster_column=raster_column,
+            raster_shade=raster_shade,
+            hexbin=hexbin,
+            hexbin_column=hexbin_column,
+            hexbin_size=hexbin_size,
+            output_backend={True: "webgl", False: "canvas"}.get(webgl),
+            chunk_size=chunk_size,
+            workers=jobs,
+            # Only the shapes in the --bbox are read, so it bounds them.
+            aggregate_bounds=bbox or None,
         )
 
         bp.output_file(output_file)
@@ -151,9 +347,454 @@ def cli(
             polygon_line_width=polygon_line_width,
             linestring_width=linestring_width,
             tooltips=tooltip,
+            shape_format=shape_format,
+            cluster=cluster,
+            simplify=simplify,
+            preserve_topology=preserve_topology,
+            coordinate_precision=coordinate_precision,
+            raster=raster,
+            raster_column=raster_column,
+            raster_shade=raster_shade,
+            hexbin=hexbin,
+            hexbin_column=hexbin_column,
+            hexbin_size=hexbin_size,
+            chunk_size=chunk_size,
+            workers=jobs,
+            # Only the shapes in the --bbox are read, so it bounds them.
+            aggregate_bounds=bbox or None,
         )
 
         map_plot.save(output_file)
         webbrowser.open(
             "file://{}".format(os.path.realpath(output_file)), new=2
         )
+
+
+@cli.command("tiles")
+@click.argument("map_data_files", type=str, nargs=-1)
+@click.option(
+    "--output-dir",
+    "-o",
+    type=str,
+    default="tiles",
+    help="The directory to write the tiles to. Default: tiles.",
+)
+@click.option(
+    "--min-zoom",
+    type=int,
+    default=0,
+    help="The lowest zoom level to write tiles for. Default: 0.",
+)
+@click.option(
+    "--max-zoom",
+    type=int,
+    default=8,
+    help="The highest zoom level to write tiles for. Default: 8.",
+)
+@click.option(
+    "--thin-zoom",
+    type=int,
+    default=None,
+    help="The lowest zoom level with every point in the tiles, below it the "
+    "points are thinned to one per pixel. Default: the max zoom.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=None,
+    help="The number of processes parsing the rows and encoding the tiles. "
+    "Default: the number of CPUs.",
+)
+@click.option(
+    "--backend",
+    "-b",
+    type=click.Choice(["folium", "bokeh"]),
+    default="folium",
+    help="The backend to draw the tiles with. folium writes a map.html to "
+    "the output directory, bokeh maps are served with map_maker serve-tiles. "
+    "Default: folium",
+)
+@click.option(
+    "--shape-format",
+    "-f",
+    type=click.Choice(["wkt", "geojson", "hexwkb"]),
+    default=None,
+    help="The format of the shape column. Default: detected from the data.",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=100000,
+    help="The number of csv rows parsed at a time, which bounds the memory "
+    "used for reading. Default: 100,000.",
+)
+@click.option(
+    "--column",
+    "-c",
+    type=str,
+    multiple=True,
+    help="A tooltip column to read from Parquet and Arrow files, along with "
+    "the shape and style columns. Stackable. Default: every column.",
+)
+@click.option(
+    "--bbox",
+    type=float,
+    nargs=4,
+    default=None,
+    help="Only map the shapes intersecting this MIN_LON MIN_LAT MAX_LON "
+    "MAX_LAT box. Parquet row groups outside it are skipped unread. Only for "
+    "Parquet and Arrow files. Default: everything.",
+)
+@click.option(
+    "--verbose",
+    "-v",
+    is_flag=True,
+    default=False,
+    help="Report what the map maker is doing, such as the number of tiles "
+    "written.",
+)
+def tiles_command(
+    map_data_files,
+    output_dir,
+    min_zoom,
+    max_zoom,
+    thin_zoom,
+    jobs,
+    backend,
+    shape_format,
+    chunk_size,
+    column,
+    bbox,
+    verbose,
+):
+    """
+    Creates a Mapbox Vector Tile pyramid from the input files
+
+    Arguments: \n
+    MAP_DATA_FILES - The input file(s), with the same formats and columns as
+    for the map command.\n
+
+    Writes OUTPUT_DIR/z/x/y.pbf tiles for every zoom level, a metadata.json
+    and, with the folium backend, a map.html that loads the tiles. The map
+    has to be served over HTTP, for example with python -m http.server
+    --directory OUTPUT_DIR. With the bokeh backend the tiles are drawn by
+    map_maker serve-tiles OUTPUT_DIR.
+    """
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    metadata = write_tiles(
+        _read_files(map_data_files, column, bbox),
+        output_dir,
+        min_zoom=min_zoom,
+        max_zoom=max_zoom,
+        jobs=jobs,
+        shape_format=shape_format,
+        chunk_size=chunk_size,
+        thin_zoom=thin_zoom,
+    )
+
+    if backend == "bokeh":
+        click.echo(
+            "Wrote the tiles to {0}. Serve them with\n"
+            "    map_maker serve-tiles {0}".format(output_dir)
+        )
+        return
+
+    # The map loads the tiles with Leaflet.VectorGrid.
+    make_vector_tile_plot(metadata).save(
+        os.path.join(output_dir, "map.html")
+    )
+    click.echo(
+        "Wrote the tiles and map.html to {0}. Serve them with\n"
+        "    python -m http.server --directory {0}\n"
+        "and open http://localhost:8000/map.html.".format(output_dir)
+    )
+
+
+@cli.command("serve")
+@click.argument("map_data_files", type=str, nargs=-1)
+@click.option(
+    "--port",
+    type=int,
+    default=5006,
+    help="The port to serve the map on. Default: 5006.",
+)
+@click.option(
+    "--show/--no-show",
+    default=True,
+    help="Whether to open the map in a browser. Default: show.",
+)
+@click.option(
+    "--plot-height",
+    "-h",
+    type=int,
+    help="The height of the plot. Default: 800",
+    default=800,
+)
+@click.option(
+    "--plot-width",
+    "-w",
+    type=int,
+    help="The width of the plot. Default: 800",
+    default=800,
+)
+@click.option(
+    "--point-size",
+    "-s",
+    type=float,
+    help="The size of the points. Default: 2.0.",
+    default=2.0,
+)
+@click.option(
+    "--polygon-line-width",
+    "-l",
+    type=float,
+    help="Line width of the polygon outline.  Default 2.0. "
+    "Set to 0 to disable polygon outlines.",
+    default=2.0,
+)
+@click.option(
+    "--linestring-width",
+    "-L",
+    type=float,
+    help="Width of the linestrings. Default 2.0. ",
+    default=2.0,
+)
+@click.option(
+    "--tooltip",
+    "-t",
+    type=click.Choice(["points", "linestrings", "polygons"]),
+    multiple=True,
+    default={"points"},
+    help="Whether to display tooltips for the points, linestrings, "
+    "or polygons. Stackable. Default: points.",
+)
+@click.option(
+    "--shape-format",
+    "-f",
+    type=click.Choice(["wkt", "geojson", "hexwkb"]),
+    default=None,
+    help="The format of the shape column. Default: detected from the data.",
+)
+@click.option(
+    "--webgl/--no-webgl",
+    default=False,
+    help="Whether to draw the map with WebGL. Default: no WebGL.",
+)
+@click.option(
+    "--preserve-topology/--no-preserve-topology",
+    default=True,
+    help="Whether simplification keeps the shapes valid. Default: "
+    "preserve topology.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="The number of processes parsing and projecting the rows. With "
+    "more than one, every file is split into byte ranges the processes read "
+    "on their own. Default: 1.",
+)
+@click.option(
+    "--chunk-size",
+    type=int,
+    default=100000,
+    help="The number of csv rows parsed at a time, which bounds the memory "
+    "used for reading. Default: 100,000.",
+)
+@click.option(
+    "--column",
+    "-c",
+    type=str,
+    multiple=True,
+    help="A tooltip column to read from Parquet and Arrow files, along with "
+    "the shape and style columns. Stackable. Default: every column.",
+)
+@click.option(
+    "--bbox",
+    type=float,
+    nargs=4,
+    default=None,
+    help="Only map the shapes intersecting this MIN_LON MIN_LAT MAX_LON "
+    "MAX_LAT box. Parquet row groups outside it are skipped unread. Only for "
+    "Parquet and Arrow files. Default: everything.",
+)
+@click.option(
+    "--verbose",
+    "-v",
+    is_flag=True,
+    default=False,
+    help="Report what the map maker is doing, such as the number of shapes "
+    "loaded for every view.",
+)
+def serve_command(
+    map_data_files,
+    port,
+    show,
+    plot_height,
+    plot_width,
+    point_size,
+    polygon_line_width,
+    linestring_width,
+    tooltip,
+    shape_format,
+    webgl,
+    preserve_topology,
+    jobs,
+    chunk_size,
+    column,
+    bbox,
+    verbose,
+):
+    """
+    Serves a map of the input files from a local Bokeh server
+
+    Arguments: \n
+    MAP_DATA_FILES - The input file(s), with the same formats and columns as
+    for the map command.\n
+
+    The shapes are kept in memory behind a spatial index, and the map only
+    loads the shapes in view, reduced to screen resolution, as it's panned
+    and zoomed. Runs until interrupted.
+    """
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # The Bokeh server needs a newer Bokeh than the map command.
+    from map_maker.bokeh.server import serve_map_plot
+
+    serve_map_plot(
+        _read_files(map_data_files, column, bbox),
+        port=port,
+        show=show,
+        shape_format=shape_format,
+        chunk_size=chunk_size,
+        workers=jobs,
+        plot_height=plot_height,
+        plot_width=plot_width,
+        point_size=point_size,
+        polygon_line_width=polygon_line_width,
+        linestring_width=linestring_width,
+        tooltips=tooltip,
+        preserve_topology=preserve_topology,
+        output_backend="webgl" if webgl else "canvas",
+    )
+
+
+@cli.command("serve-tiles")
+@click.argument("tile_dir", type=str)
+@click.option(
+    "--port",
+    type=int,
+    default=5006,
+    help="The port to serve the map on. Default: 5006.",
+)
+@click.option(
+    "--show/--no-show",
+    default=True,
+    help="Whether to open the map in a browser. Default: show.",
+)
+@click.option(
+    "--plot-height",
+    "-h",
+    type=int,
+    help="The height of the plot. Default: 800",
+    default=800,
+)
+@click.option(
+    "--plot-width",
+    "-w",
+    type=int,
+    help="The width of the plot. Default: 800",
+    default=800,
+)
+@click.option(
+    "--point-size",
+    "-s",
+    type=float,
+    help="The size of the points. Default: 2.0.",
+    default=2.0,
+)
+@click.option(
+    "--polygon-line-width",
+    "-l",
+    type=float,
+    help="Line width of the polygon outline.  Default 2.0. "
+    "Set to 0 to disable polygon outlines.",
+    default=2.0,
+)
+@click.option(
+    "--linestring-width",
+    "-L",
+    type=float,
+    help="Width of the linestrings. Default 2.0. ",
+    default=2.0,
+)
+@click.option(
+    "--tooltip",
+    "-t",
+    type=click.Choice(["points", "linestrings", "polygons"]),
+    multiple=True,
+    default={"points"},
+    help="Whether to display tooltips for the points, linestrings, "
+    "or polygons. Stackable. Default: points.",
+)
+@click.option(
+    "--webgl/--no-webgl",
+    default=False,
+    help="Whether to draw the map with WebGL. Default: no WebGL.",
+)
+@click.option(
+    "--verbose",
+    "-v",
+    is_flag=True,
+    default=False,
+    help="Report what the map maker is doing, such as the number of shapes "
+    "loaded for every view.",
+)
+def serve_tiles_command(
+    tile_dir,
+    port,
+    show,
+    plot_height,
+    plot_width,
+    point_size,
+    polygon_line_width,
+    linestring_width,
+    tooltip,
+    webgl,
+    verbose,
+):
+    """
+    Serves a map of a vector tile pyramid from a local Bokeh server
+
+    Arguments: \n
+    TILE_DIR - A directory written by the tiles command.\n
+
+    The server reads the tiles in view, for the zoom level of the view, as
+    the map is panned and zoomed. Runs until interrupted.
+    """
+
+    if verbose:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # The Bokeh server needs a newer Bokeh than the map command.
+    from map_maker.bokeh.server import serve_vector_tiles
+
+    serve_vector_tiles(
+        tile_dir,
+        port=port,
+        show=show,
+        plot_height=plot_height,
+        plot_width=plot_width,
+        point_size=point_size,
+        polygon_line_width=polygon_line_width,
+        linestring_width=linestring_width,
+        tooltips=tooltip,
+        output_backend="webgl" if webgl else "canvas",
+    )
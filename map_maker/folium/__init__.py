@@ -15,5 +15,6 @@ limitations under the License.
 """
 
 from .map_maker import make_map_plot
+from .vector_tiles import make_vector_tile_plot
 
-__all__ = ["make_map_plot"]
+__all__ = ["make_map_plot", "make_vector_tile_plot"]
@@ -16,7 +16,23 @@ limitations under the License.
 
 import folium
 
-from map_maker.util import extract_geometries, get_bounds, to_geojson
+from branca.element import MacroElement
+from jinja2 import Template
+from map_maker.util import (
+    dumps,
+    dumps_geojson,
+    to_property_columns,
+    ClusterIndex,
+    cluster_columns,
+    extract_geometry_tables,
+    to_geojson,
+    BoundsAccumulator,
+    GeometryTable,
+    hexbin_geometry_tables,
+    pixel_tolerance,
+    rasterize_geometry_tables,
+    simplify_table,
+)
 from toolz import dissoc
 
 
@@ -28,13 +44,134 @@ def _get_tooltip_keys(shape_datum):
     )
 
 
-def _get_tooltip_values(shape_datum):
-    return [
-        f"{k}: {v}"
-        for k, v in dissoc(
-            shape_datum, "shape", "shape_obj", "color", "alpha", "size"
-        ).items()
-    ]
+class _CircleMarkerLayer(MacroElement):
+    """ A single GeoJSON layer that draws its point features as circle
+        markers client-side, styled from the color, alpha and size
+        properties. This replaces one CircleMarker element (and one JS
+        variable) per point.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson(
+            {{ this.data|safe }},
+            {
+                pointToLayer: function (feature, latlng) {
+                    var properties = feature.properties;
+                    return L.circleMarker(latlng, {
+                        // Divide by 2 to match what bokeh does with the size.
+                        radius: properties.size / 2,
+                        color: properties.color,
+                        fillColor: properties.color,
+                        opacity: properties.alpha,
+                        fill: true
+                    });
+                },
+                {% if this.tooltip_keys %}
+                onEachFeature: function (feature, layer) {
+                    var keys = {{ this.tooltip_keys|tojson }};
+                    layer.bindTooltip(keys.map(function (key) {
+                        return key + ": " + feature.properties[key];
+                    }).join("<br>"));
+                }
+                {% endif %}
+            }
+        ).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        points,
+        default_color,
+        default_alpha,
+        default_size,
+        tooltip_keys=None,
+    ):
+        super().__init__()
+        self._name = "CircleMarkerLayer"
+        # "</" is escaped so string properties can't close the script tag.
+        self.data = dumps_geojson(
+            points, default_color, default_alpha, default_size
+        ).replace("</", "<\\/")
+        self.tooltip_keys = tooltip_keys
+
+
+class _ClusterLayer(MacroElement):
+    """ Draws precomputed point clusters as circle markers, redrawing the
+        cluster level for the map's zoom level whenever it changes.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.layerGroup().addTo(
+            {{ this._parent.get_name() }}
+        );
+        (function (map, layer) {
+            var levels = {{ this.data|safe }};
+            var current = null;
+            function draw() {
+                var level = Math.max(0, Math.min(
+                    map.getZoom() - {{ this.min_zoom }},
+                    levels.offsets.length - 2
+                ));
+                if (level === current) {
+                    return;
+                }
+                current = level;
+                layer.clearLayers();
+                var stop = levels.offsets[level + 1];
+                for (var i = levels.offsets[level]; i < stop; i++) {
+                    var marker = L.circleMarker([levels.y[i], levels.x[i]], {
+                        // Divide by 2 to match what bokeh does with the size.
+                        radius: levels.size[i] / 2,
+                        color: levels.color[i],
+                        fillColor: levels.color[i],
+                        opacity: levels.alpha[i],
+                        fill: true
+                    });
+                    {% if this.tooltip %}
+                    marker.bindTooltip("count: " + levels.count[i]);
+                    {% endif %}
+                    layer.addLayer(marker);
+                }
+            }
+            map.on("zoomend", draw);
+            draw();
+        })({{ this._parent.get_name() }}, {{ this.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(
+        self,
+        points,
+        default_color,
+        default_alpha,
+        default_size,
+        tooltip=False,
+    ):
+        super().__init__()
+        self._name = "ClusterLayer"
+        # Folium maps are in lon / lat, the grid is in Web Mercator.
+        index = ClusterIndex(points.coords, project=True)
+        columns, offsets = cluster_columns(
+            index,
+            to_property_columns(
+                points, default_color, default_alpha, default_size
+            ),
+            default_color,
+            default_alpha,
+            default_size,
+        )
+        self.data = dumps({**columns, "offsets": offsets}).replace(
+            "</", "<\\/"
+        )
+        self.min_zoom = index.min_zoom
+        self.tooltip = tooltip
 
 
 def make_map_plot(
@@ -46,6 +183,23 @@ def make_map_plot(
     polygon_line_width=2,
     linestring_width=2,
     tooltips={"points"},
+    shape_format=None,
+    shape_cache=None,
+    cluster=False,
+    simplify=False,
+    preserve_topology=True,
+    coordinate_precision=None,
+    raster=None,
+    raster_column=None,
+    raster_cmap=None,
+    raster_shade="eq_hist",
+    hexbin=None,
+    hexbin_column=None,
+    hexbin_size=None,
+    hexbin_cmap=None,
+    chunk_size=100000,
+    workers=None,
+    aggregate_bounds=None,
 ):
     """ Creates a Folium map from a list of dicts with geometry / style info.
 
@@ -54,16 +208,17 @@ def make_map_plot(
     .. code-block :: python
 
         {
-            "shape": # WKT | GeoJSON String | Geo-Interface | Shapely Geometry
+            "shape": # WKT | GeoJSON String | (Hex) WKB | Geo-Interface
+                     # | Shapely Geometry
             "alpha": # Alpha value of the fill.
             "color": # Color of the shape
         }
 
     Parameters
     ----------
-    map_data : :obj:`list` of :obj:`dict`
-        A list of dictionaries defining the shape and style to map with the
-        fields defined above.
+    map_data : iterable of :obj:`dict`
+        The dictionaries defining the shape and style to map with the fields
+        defined above.
 
     plot_height : int
         The height of the plot in px.
@@ -88,14 +243,176 @@ def make_map_plot(
         The labels of tooltips to display, can be "points", "linestrings",
         "polygons" or any combination of those.
 
+    shape_format : str, optional
+        The serialization format of the shapes, one of "wkt", "geojson",
+        "wkb", "hexwkb", "mapping" or "shapely". Detected from the data if
+        not provided.
+
+    shape_cache : :obj:`map_maker.util.ShapeCache`, optional
+        A cache of parsed shapes, so that shapes repeated across rows (or
+        across calls) are only parsed and projected once.
+
+    cluster : bool, default False
+        Whether to draw the points as clusters. The cluster levels for
+        every zoom level are precomputed and embedded in the map, and only
+        the clusters for the current zoom level are drawn. The point
+        tooltips show the number of points in each cluster.
+
+    simplify : bool or float, default False
+        Whether to simplify the linestrings and polygons with
+        Douglas-Peucker before drawing them. True picks a tolerance of
+        about one pixel at the initial view, a float sets the tolerance in
+        lon / lat degrees.
+
+    preserve_topology : bool, default True
+        Whether simplification keeps the shapes valid, at some extra cost.
+
+    coordinate_precision : int, optional
+        The number of decimals to round the lon / lat coordinates to before
+        they're written as GeoJSON, 6 is about 0.1m. Fewer digits make
+        smaller files that the browser parses faster.
+
+    raster : str, optional
+        Draw the points as an image aggregated into a pixel grid instead of
+        as glyphs: "count", "sum" or "mean" of raster_column, or
+        "categorical" for counts of every value of raster_column. The
+        data is streamed through the grid in chunks, so memory is bounded
+        by the grid rather than the number of points.
+
+    raster_column : str, optional
+        The column to aggregate for the "sum", "mean" and "categorical"
+        rasters.
+
+    raster_cmap : :obj:`list` of str, optional
+        The "#rrggbb" colors to ramp through for the raster (or to give
+        the categories). Default is light blue to dark blue.
+
+    raster_shade : str, default "eq_hist"
+        How the raster values are scaled to the colors, "eq_hist"
+        (histogram equalization), "log" or "linear".
+
+    hexbin : str, optional
+        Draw the points as hexagonal cells instead of glyphs, colored by
+        the "count", or the "sum" or "mean" of hexbin_column, of the
+        points in each cell. The hexagons are drawn as one polygon layer,
+        with the points tooltips showing the aggregate. Like the raster,
+        the points are streamed through the cells in chunks. Can't be
+        combined with raster.
+
+    hexbin_column : str, optional
+        The column to aggregate for the "sum" and "mean" hexbins.
+
+    hexbin_size : float, optional
+        The radius of the hexagons in pixels. Default is a fiftieth of
+        plot_width.
+
+    hexbin_cmap : :obj:`list` of str, optional
+        The "#rrggbb" colors to ramp through for the hexagons. Default is
+        light blue to dark blue.
+
+    chunk_size : int, default 100000
+        The number of rows of map_data parsed at a time. Only the compact
+        per-layer tables are kept, so map_data can be a stream (a csv
+        reader, say) without ever being held in memory whole.
+
+    workers : int, optional
+        The number of processes to parse and project the chunks with.
+        Default is to parse them in this process.
+
+    aggregate_bounds : tuple of float, optional
+        The (min_lon, min_lat, max_lon, max_lat) box the raster or hexbin
+        covers, when it's known up front (the bbox the data was read with,
+        say). Default is the extent of the data, which means keeping the
+        point coordinates until all of it is read.
+
     Returns
     -------
     fig : :obj:`folium.Map`
         The Folium object for the map.
     """
     # Collect the points and polygons.
-    points, linestrings, polygons = extract_geometries(map_data, project=False)
-    min_x, min_y, max_x, max_y = get_bounds(points + polygons)
+    # The bounds are collected while the data streams through.
+    if raster and hexbin:
+        raise ValueError("Only one of raster and hexbin can be drawn.")
+    bounds = BoundsAccumulator()
+    aggregator = None
+    hexes = None
+    if raster:
+        # The points go into the raster grid as they stream through.
+        (
+            aggregator,
+            linestrings,
+            polygons,
+            raster_bounds,
+        ) = rasterize_geometry_tables(
+            map_data,
+            plot_width,
+            plot_height,
+            how=raster,
+            column=raster_column,
+            project=False,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            bounds=aggregate_bounds,
+            workers=workers,
+        )
+        points = GeometryTable.concat([])
+        bounds.update(raster_bounds)
+    elif hexbin:
+        # The points go into the hexagonal cells as they stream through.
+        (
+            hex_aggregator,
+            linestrings,
+            polygons,
+            hexbin_bounds,
+        ) = hexbin_geometry_tables(
+            map_data,
+            plot_width,
+            size=hexbin_size,
+            how=hexbin,
+            column=hexbin_column,
+            project=False,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            bounds=aggregate_bounds,
+            workers=workers,
+        )
+        hexes = hex_aggregator.to_table(cmap=hexbin_cmap)
+        points = GeometryTable.concat([])
+        bounds.update(hexbin_bounds)
+    else:
+        points, linestrings, polygons = extract_geometry_tables(
+            map_data,
+            project=False,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            workers=workers,
+            bounds=bounds,
+        )
+
+    if bounds.bounds is None:
+        raise ValueError("There are no shapes to map.")
+    min_x, min_y, max_x, max_y = bounds.bounds
+
+    if simplify:
+        tolerance = (
+            pixel_tolerance(bounds.bounds, plot_width, plot_height)
+            if simplify is True
+            else simplify
+        )
+        linestrings, _ = simplify_table(
+            linestrings, tolerance, preserve_topology
+        )
+        polygons, _ = simplify_table(polygons, tolerance, preserve_topology)
+
+    # The tables only hold x / y, so Z (and M) are already gone.
+    if coordinate_precision is not None:
+        points = points.round(coordinate_precision)
+        linestrings = linestrings.round(coordinate_precision)
+        polygons = polygons.round(coordinate_precision)
 
     m = folium.Map(
         location=[(min_y + max_y) / 2, (min_x + max_x) / 2],
@@ -106,7 +423,41 @@ def make_map_plot(
 
     m.fit_bounds([(min_y, min_x), (max_y, max_x)])
 
-    if polygons:
+    if aggregator is not None:
+        raster_min_x, raster_min_y, raster_max_x, raster_max_y = (
+            raster_bounds
+        )
+        # The grid is already in Web Mercator, so the image lines up with
+        # the tiles as is. Row 0 is the bottom of the image.
+        folium.raster_layers.ImageOverlay(
+            aggregator.shade(
+                cmap=raster_cmap,
+                how=raster_shade,
+                category_colors=raster_cmap,
+            ),
+            bounds=[
+                [raster_min_y, raster_min_x],
+                [raster_max_y, raster_max_x],
+            ],
+            origin="lower",
+        ).add_to(m)
+
+    if hexes is not None and len(hexes):
+        # No outlines, so the hexagons tile without gaps.
+        folium.GeoJson(
+            to_geojson(hexes, "lightblue", 0.7, 0),
+            style_function=lambda x: {
+                "fillColor": x["properties"]["color"],
+                "color": x["properties"]["color"],
+                "weight": x["properties"]["size"],
+                "fillOpacity": x["properties"]["alpha"],
+            },
+            tooltip=folium.GeoJsonTooltip(_get_tooltip_keys(hexes.properties))
+            if "points" in tooltips
+            else None,
+        ).add_to(m)
+
+    if len(polygons):
         polygon_geojson = to_geojson(
             polygons, "lightblue", 0.3, polygon_line_width
         )
@@ -125,7 +476,7 @@ def make_map_plot(
             else None,
         ).add_to(m)
 
-    if linestrings:
+    if len(linestrings):
         linestring_geojson = to_geojson(
             linestrings, "black", 0.3, linestring_width
         )
@@ -145,27 +496,26 @@ def make_map_plot(
             else None,
         ).add_to(m)
 
-    if points:
-        point_geojson = to_geojson(points, "black", 0.3, point_size)
-        # Sigh .. have to manually add the circle markers instead of using the
-        # geoJson function because geojson function doesn't allow custom
-        # markers for points.
-        # There's a PR that _should_ fix this:
-        # https://github.com/python-visualization/folium/pull/957
-        for point_feature in point_geojson["features"]:
-            folium.CircleMarker(
-                # Needs to be reversed because folium expects lat,lon.
-                location=point_feature["geometry"]["coordinates"][::-1],
-                # Divide by 2 to match what bokeh does with the size.
-                radius=point_feature["properties"]["size"] / 2,
-                color=point_feature["properties"]["color"],
-                fill_color=point_feature["properties"]["color"],
-                opacity=point_feature["properties"]["alpha"],
-                tooltip="\n".join(
-                    _get_tooltip_values(point_feature["properties"])
-                )
-                if "points" in tooltips
-                else None,
-            ).add_to(m)
+    if len(points) and cluster:
+        _ClusterLayer(
+            points,
+            "black",
+            0.3,
+            point_size,
+            tooltip="points" in tooltips,
+        ).add_to(m)
+    elif len(points):
+        # folium.GeoJson can't draw custom point markers in the versions we
+        # support, so the points go through a layer with its own
+        # pointToLayer instead of one CircleMarker per point.
+        _CircleMarkerLayer(
+            points,
+            "black",
+            0.3,
+            point_size,
+            tooltip_keys=_get_tooltip_keys(points.properties)
+            if "points" in tooltips
+            else None,
+        ).add_to(m)
 
     return m
@@ -0,0 +1,222 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import folium
+
+from branca.element import JavascriptLink, MacroElement
+from jinja2 import Template
+from map_maker.tiles import read_metadata
+
+from .map_maker import _get_tooltip_keys
+
+VECTORGRID_URL = (
+    "https://unpkg.com/leaflet.vectorgrid@1.3.0/dist/"
+    "Leaflet.VectorGrid.bundled.min.js"
+)
+
+
+class _VectorTileLayer(MacroElement):
+    """ Draws a vector tile pyramid with Leaflet.VectorGrid, styled from the
+        color, alpha and size properties of the features.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function (map) {
+            var defaults = {{ this.defaults|tojson }};
+            var tooltipKeys = {{ this.tooltip_keys|tojson }};
+            var tooltip = L.tooltip();
+            function property(properties, layer, key) {
+                var value = properties[key];
+                if (value === undefined) {
+                    return defaults[layer][key];
+                }
+                // CSV properties are strings.
+                return key === "color" ? value : Number(value);
+            }
+            var styles = {
+                points: function (properties) {
+                    var color = property(properties, "points", "color");
+                    return {
+                        // Divide by 2 to match what bokeh does with the size.
+                        radius: property(properties, "points", "size") / 2,
+                        color: color,
+                        fillColor: color,
+                        opacity: property(properties, "points", "alpha"),
+                        fill: true,
+                        weight: 0
+                    };
+                },
+                linestrings: function (properties) {
+                    return {
+                        color: property(properties, "linestrings", "color"),
+                        weight: property(properties, "linestrings", "size"),
+                        opacity: property(properties, "linestrings", "alpha")
+                    };
+                },
+                polygons: function (properties) {
+                    var color = property(properties, "polygons", "color");
+                    return {
+                        color: color,
+                        fillColor: color,
+                        fill: true,
+                        weight: property(properties, "polygons", "size"),
+                        fillOpacity: property(properties, "polygons", "alpha")
+                    };
+                }
+            };
+            var layer = L.vectorGrid.protobuf({{ this.url|tojson }}, {
+                rendererFactory: L.canvas.tile,
+                vectorTileLayerStyles: styles,
+                interactive: true,
+                minNativeZoom: {{ this.min_zoom }},
+                maxNativeZoom: {{ this.max_zoom }}
+            });
+            layer.on("mouseover", function (e) {
+                // VectorGrid's point, line and fill symbolizers extend
+                // these, which tells which layer the feature is in.
+                var name = e.layer instanceof L.CircleMarker ? "points"
+                    : e.layer instanceof L.Polygon ? "polygons"
+                    : "linestrings";
+                var keys = tooltipKeys[name];
+                if (!keys || !keys.length) {
+                    return;
+                }
+                var content = keys.map(function (key) {
+                    return key + ": " + e.layer.properties[key];
+                }).join("<br>");
+                tooltip.setLatLng(e.latlng).setContent(content);
+                map.openTooltip(tooltip);
+            });
+            layer.on("mouseout", function () {
+                map.closeTooltip(tooltip);
+            });
+            return layer.addTo(map);
+        })({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, url, metadata, defaults, tooltips):
+        super().__init__()
+        self._name = "VectorTileLayer"
+        self.url = url
+        self.min_zoom = metadata["minzoom"]
+        self.max_zoom = metadata["maxzoom"]
+        self.defaults = defaults
+        self.tooltip_keys = {
+            name: _get_tooltip_keys(dict.fromkeys(fields))
+            for name, fields in metadata["layers"].items()
+            if name in tooltips
+        }
+
+    def render(self, **kwargs):
+        super().render(**kwargs)
+        self.get_root().header.add_child(
+            JavascriptLink(VECTORGRID_URL), name="leaflet_vectorgrid"
+        )
+
+
+def make_vector_tile_plot(
+    tile_data,
+    url="{z}/{x}/{y}.pbf",
+    plot_height=800,
+    plot_width=800,
+    tiles="cartodbpositron",
+    point_size=2,
+    polygon_line_width=2,
+    linestring_width=2,
+    tooltips={"points"},
+):
+    """ Creates a Folium map that draws a vector tile pyramid.
+
+    The tiles are loaded by Leaflet.VectorGrid as the map is panned and
+    zoomed, so the pyramid can hold far more shapes than make_map_plot could
+    embed in the HTML. Browsers don't fetch from file:// URLs, so the map
+    and the tiles have to be served over HTTP.
+
+    Parameters
+    ----------
+    tile_data : str or dict
+        The directory written by map_maker.tiles.write_tiles, or its
+        metadata.
+
+    url : str, default "{z}/{x}/{y}.pbf"
+        The URL template of the tiles. The default is relative to the page,
+        for maps saved into the tile directory.
+
+    plot_height : int
+        The height of the plot in px.
+
+    plot_width : int
+        The width of the plot in px.
+
+    tiles : str
+        The tile source for the map. Default is CartoDB Positron.
+
+    point_size : float, default 2.
+        The default point size.
+
+    polygon_line_width: float, default 2.
+        The default polygon line width.
+
+    linestring_width : float, default 2.
+        The default linestring width.
+
+    tooltips : set
+        The labels of tooltips to display, can be "points", "linestrings",
+        "polygons" or any combination of those.
+
+    Returns
+    -------
+    fig : :obj:`folium.Map`
+        The Folium map.
+    """
+    metadata = (
+        read_metadata(tile_data) if isinstance(tile_data, str) else tile_data
+    )
+    min_x, min_y, max_x, max_y = metadata["bounds"]
+
+    m = folium.Map(
+        location=[(min_y + max_y) / 2, (min_x + max_x) / 2],
+        tiles=tiles,
+        height=plot_height,
+        width=plot_width,
+    )
+
+    m.fit_bounds([(min_y, min_x), (max_y, max_x)])
+
+    _VectorTileLayer(
+        url,
+        metadata,
+        {
+            "points": {"color": "black", "alpha": 0.3, "size": point_size},
+            "linestrings": {
+                "color": "black",
+                "alpha": 0.3,
+                "size": linestring_width,
+            },
+            "polygons": {
+                "color": "lightblue",
+                "alpha": 0.3,
+                "size": polygon_line_width,
+            },
+        },
+        tooltips,
+    ).add_to(m)
+
+    return m
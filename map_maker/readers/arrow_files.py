@@ -0,0 +1,350 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import numpy as np
+import os
+
+from shapely import box, intersects
+from toolz import curry
+
+from map_maker.util import GeometryTable
+from map_maker.util.util import (
+    lla_to_merc,
+    to_shapes,
+    _pool_map,
+    _split_layers,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = pq = None
+
+PARQUET_EXTENSIONS = (".parquet", ".geoparquet")
+ARROW_EXTENSIONS = PARQUET_EXTENSIONS + (".arrow", ".feather", ".ipc")
+
+# The columns styling the shapes, always read when they're there.
+_STYLE_COLUMNS = ("color", "alpha", "size")
+
+# The CRS identifiers of lat/lon coordinates, like the csv shapes.
+_LAT_LON_CRS = {("EPSG", "4326"), ("OGC", "CRS84")}
+
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in PARQUET_EXTENSIONS
+
+
+def _read_schema(path):
+    if _is_parquet(path):
+        return pq.read_schema(path, memory_map=True)
+    with pa.memory_map(path) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def _geo_metadata(path, schema):
+    """ Returns the geometry column of a file and its GeoParquet metadata
+        (an empty dict without any). Files without GeoParquet metadata need
+        a shape or geometry column.
+    """
+    metadata = schema.metadata or {}
+    if b"geo" in metadata:
+        geo = json.loads(metadata[b"geo"])
+        column = geo["primary_column"]
+        column_meta = geo["columns"][column]
+    else:
+        column = next(
+            (c for c in ("shape", "geometry") if c in schema.names), None
+        )
+        if column is None:
+            raise ValueError(
+                "{} has no GeoParquet metadata and no shape or geometry "
+                "column.".format(path)
+            )
+        return column, {}
+
+    encoding = column_meta.get("encoding", "WKB")
+    if encoding.upper() != "WKB":
+        raise ValueError(
+            "The {} geometries of {} are {} encoded, only WKB is "
+            "supported.".format(column, path, encoding)
+        )
+    crs = column_meta.get("crs")
+    crs_id = crs.get("id") if isinstance(crs, dict) else None
+    if crs_id and (crs_id["authority"], str(crs_id["code"])) not in (
+        _LAT_LON_CRS
+    ):
+        raise ValueError(
+            "The {} geometries of {} aren't lat/lon coordinates.".format(
+                column, path
+            )
+        )
+    return column, column_meta
+
+
+def _extent(bbox):
+    # GeoParquet bboxes of 3D geometries have the z range too.
+    half = len(bbox) // 2
+    return bbox[0], bbox[1], bbox[half], bbox[half + 1]
+
+
+def _intersects(extent, bbox):
+    min_x, min_y, max_x, max_y = extent
+    overlaps_x = min_x <= bbox[2] and max_x >= bbox[0]
+    overlaps_y = min_y <= bbox[3] and max_y >= bbox[1]
+    return overlaps_x and overlaps_y
+
+
+def _row_group_extent(row_group, covering_columns):
+    """ The extent of a row group from the statistics of its bbox covering
+        columns, or None if they're missing.
+    """
+    extent = []
+    for key, index in covering_columns.items():
+        stats = row_group.column(index).statistics
+        if stats is None or not stats.has_min_max:
+            return None
+        extent.append(stats.max if key.endswith("max") else stats.min)
+    return extent
+
+
+def _row_groups(path, column_meta, bbox):
+    """ The row groups of a Parquet file that can hold shapes in bbox. With
+        a bbox covering column (GeoParquet 1.1) the row groups whose
+        statistics say they're all outside it are skipped unread.
+    """
+    metadata = pq.ParquetFile(path, memory_map=True).metadata
+    row_groups = range(metadata.num_row_groups)
+    covering = column_meta.get("covering", {}).get("bbox")
+    if bbox is None or covering is None:
+        return list(row_groups)
+
+    paths = {
+        metadata.schema.column(ii).path: ii
+        for ii in range(metadata.num_columns)
+    }
+    covering_columns = {
+        key: paths[".".join(covering[key])]
+        for key in ("xmin", "ymin", "xmax", "ymax")
+    }
+    kept = []
+    for ii in row_groups:
+        extent = _row_group_extent(metadata.row_group(ii), covering_columns)
+        if extent is None or _intersects(extent, bbox):
+            kept.append(ii)
+    return kept
+
+
+def _read_batches(job, columns, chunk_size):
+    """ Reads a row group of a Parquet file, or a record batch of an Arrow
+        IPC (Feather) file, in record batches of up to chunk_size rows.
+        Only the given columns are read, memory mapped.
+    """
+    path, part = job
+    if _is_parquet(path):
+        table = pq.ParquetFile(path, memory_map=True).read_row_group(
+            part, columns=columns
+        )
+    else:
+        with pa.memory_map(path) as source:
+            batch = pa.ipc.open_file(source).get_batch(part)
+        table = pa.Table.from_batches([batch]).select(columns)
+    return table.to_batches(max_chunksize=chunk_size)
+
+
+def _read_shapes(batch, geometry, shape_format, bbox):
+    """ Decodes the geometry column of a record batch and drops the rows
+        outside bbox, returning the kept rows and their shapes.
+    """
+    shape_column = batch.column(geometry)
+    valid = shape_column.is_valid().to_numpy(zero_copy_only=False)
+    shape_sers = shape_column.to_numpy(zero_copy_only=False)
+
+    shapes = np.full(len(batch), None, dtype=object)
+    shapes[valid] = to_shapes(shape_sers[valid], shape_format=shape_format)
+    if bbox is not None:
+        keep = intersects(shapes, box(*bbox))
+        batch, shapes = batch.filter(pa.array(keep)), shapes[keep]
+    return batch, shapes
+
+
+def _extract_batch(batch, geometry, project, shape_format, bbox):
+    """ Turns a record batch into (points, linestrings, polygons)
+        GeometryTables, straight from its columns.
+    """
+    batch, shapes = _read_shapes(batch, geometry, shape_format, bbox)
+    if project:
+        shapes = lla_to_merc(shapes)
+
+    columns = {}
+    present = {}
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name == geometry:
+            continue
+        # Zero copy for numeric columns without nulls.
+        columns[name] = column.to_numpy(zero_copy_only=False)
+        present[name] = column.is_valid().to_numpy(zero_copy_only=False)
+    return _split_layers(shapes, columns, present)
+
+
+def _extract_part(job, columns, project, chunk_size):
+    """ Reads and extracts a whole row group or record batch, for the
+        workers.
+    """
+    (path, part), geometry, shape_format, bbox = job
+    tables = [
+        _extract_batch(batch, geometry, project, shape_format, bbox)
+        for batch in _read_batches((path, part), columns[path], chunk_size)
+    ]
+    if not tables:
+        return _split_layers(np.empty(0, dtype=object), {}, {})
+    return tuple(GeometryTable.concat(layer) for layer in zip(*tables))
+
+
+class ArrowFiles:
+    """ The shapes of one or more Parquet (GeoParquet) or Arrow IPC
+    (Feather) files.
+
+    The shapes are read from the GeoParquet primary geometry column, which
+    must be WKB encoded lat/lon coordinates, or from a shape or geometry
+    column (WKB, WKT, GeoJSON or hex WKB) in files without GeoParquet
+    metadata. The other columns work like the csv columns: color, alpha
+    and size style the shapes and the rest turn into tooltips.
+
+    The map makers read the files column by column, straight into the
+    geometry tables without building a dict per row, and only the
+    requested columns are read. Iterating yields dicts like a csv reader,
+    the shape under "shape".
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The files, read in order. Files ending in .parquet or .geoparquet
+        are read as Parquet, the others as Arrow IPC (Feather v2).
+
+    columns : iterable of str, optional
+        The tooltip columns to read, along with the geometry and any style
+        columns. Default is every column.
+
+    bbox : tuple of float, optional
+        The (min_lon, min_lat, max_lon, max_lat) box to keep shapes
+        intersecting. Parquet row groups with bbox covering statistics
+        outside it, and files whose GeoParquet bbox is outside it, are
+        skipped without being read.
+    """
+
+    def __init__(self, paths, columns=None, bbox=None):
+        if pa is None:
+            raise ImportError(
+                "Reading Parquet and Arrow files requires pyarrow, install "
+                "it with pip install map_maker[parquet]."
+            )
+        self.paths = list(paths)
+        self.columns = list(columns) if columns is not None else None
+        self.bbox = tuple(bbox) if bbox is not None else None
+
+    def __repr__(self):
+        return "ArrowFiles({!r})".format(self.paths)
+
+    def _read_columns(self, schema, geometry, column_meta):
+        covering = column_meta.get("covering", {}).get("bbox", {})
+        skipped = {path[0] for path in covering.values()}
+        if self.columns is None:
+            return [
+                name
+                for name in schema.names
+                if name == geometry or name not in skipped
+            ]
+
+        missing = set(self.columns) - set(schema.names)
+        if missing:
+            raise ValueError(
+                "Unknown columns {}.".format(", ".join(sorted(missing)))
+            )
+        wanted = {geometry, *_STYLE_COLUMNS, *self.columns}
+        return [name for name in schema.names if name in wanted]
+
+    def _jobs(self, shape_format):
+        """ Lists the row groups or record batches to read as (job,
+            geometry column, shape format, bbox) tuples, along with the
+            columns to read from every file.
+        """
+        jobs = []
+        columns = {}
+        for path in self.paths:
+            schema = _read_schema(path)
+            geometry, column_meta = _geo_metadata(path, schema)
+            columns[path] = self._read_columns(schema, geometry, column_meta)
+            file_bbox = column_meta.get("bbox")
+            if self.bbox is not None and file_bbox is not None:
+                if not _intersects(_extent(file_bbox), self.bbox):
+                    continue
+
+            if _is_parquet(path):
+                parts = _row_groups(path, column_meta, self.bbox)
+            else:
+                with pa.memory_map(path) as source:
+                    parts = range(pa.ipc.open_file(source).num_record_batches)
+            # WKB is the only GeoParquet encoding.
+            part_format = "wkb" if column_meta else shape_format
+            jobs.extend(
+                ((path, part), geometry, part_format, self.bbox)
+                for part in parts
+            )
+        return jobs, columns
+
+    def __iter__(self):
+        jobs, columns = self._jobs(None)
+        for job, geometry, shape_format, bbox in jobs:
+            for batch in _read_batches(job, columns[job[0]], 65536):
+                batch, _ = _read_shapes(batch, geometry, shape_format, bbox)
+                for row in batch.to_pylist():
+                    row["shape"] = row.pop(geometry)
+                    yield row
+
+    def iter_geometry_tables(
+        self,
+        project=True,
+        shape_format=None,
+        shape_cache=None,
+        chunk_size=100000,
+        workers=None,
+    ):
+        """ Reads the files into (points, linestrings, polygons) tuples of
+            GeometryTables, in file order, for
+            map_maker.util.iter_geometry_tables. Serially a tuple comes out
+            of every chunk_size rows. With more than one worker the row
+            groups (or record batches) are read in a pool of workers
+            processes, a tuple per row group. WKB is quick to decode, so
+            the shape cache isn't used.
+        """
+        jobs, columns = self._jobs(shape_format)
+        if workers is not None and workers > 1:
+            extract = curry(
+                _extract_part,
+                columns=columns,
+                project=project,
+                chunk_size=chunk_size,
+            )
+            yield from _pool_map(extract, jobs, workers)
+            return
+
+        for job, geometry, part_format, bbox in jobs:
+            for batch in _read_batches(job, columns[job[0]], chunk_size):
+                yield _extract_batch(
+                    batch, geometry, project, part_format, bbox
+                )
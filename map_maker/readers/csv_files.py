@@ -0,0 +1,233 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import csv
+import io
+import locale
+import numpy as np
+import os
+import sys
+
+from csv import DictReader
+from toolz import curry, partition_all
+
+from map_maker.util import GeometryTable
+from map_maker.util.util import _extract_chunk, _pool_map
+
+# Shapes in WKT or GeoJSON easily outgrow the default field size limit.
+csv.field_size_limit(sys.maxsize)
+
+# The largest byte range a worker parses at once.
+RANGE_SIZE = 64 * 2 ** 20
+# The size of the blocks files are scanned in.
+_BLOCK_SIZE = 2 ** 22
+
+_QUOTE = ord('"')
+_NEWLINE = ord("\n")
+
+
+def _count_quotes(path, byte_range):
+    """ Counts the quote characters in a byte range of a file.
+    """
+    start, end = byte_range
+    count = 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        while start < end:
+            block = f.read(min(_BLOCK_SIZE, end - start))
+            if not block:
+                break
+            count += block.count(b'"')
+            start += len(block)
+    return count
+
+
+def _next_record(f, position, quotes):
+    """ Returns the offset just after the first line break at or after
+        position that ends a record, that is with an even number of quotes
+        before it. quotes is the number of quotes before position. Returns
+        None if the file ends first.
+    """
+    f.seek(position)
+    while True:
+        block = f.read(_BLOCK_SIZE)
+        if not block:
+            return None
+        data = np.frombuffer(block, dtype=np.uint8)
+        # The number of quotes before every byte, and so whether it's inside
+        # a quoted field.
+        quoted = (quotes + np.cumsum(data == _QUOTE)) % 2 == 1
+        ends = np.flatnonzero((data == _NEWLINE) & ~quoted)
+        if len(ends):
+            return position + int(ends[0]) + 1
+        quotes += int((data == _QUOTE).sum())
+        position += len(block)
+
+
+def csv_record_ranges(path, range_size=RANGE_SIZE, workers=None):
+    """ Splits a csv file into byte ranges that each hold whole records.
+
+        A line break inside a quoted field (a multi-line WKT string, say)
+        doesn't end a record, and a line break ends a record exactly when
+        the number of quotes before it is even, escaped quotes being
+        doubled. So the quotes of every range_size block are counted (by a
+        pool of workers processes, if given), a prefix sum gives the number
+        of quotes before every block, and each block boundary is moved to
+        the first line break after it with an even count.
+
+        Returns the header record's bytes and the list of (start, end) byte
+        ranges of the records after it.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header_end = _next_record(f, 0, 0) or size
+        f.seek(0)
+        header = f.read(header_end)
+
+    blocks = [
+        (start, min(start + range_size, size))
+        for start in range(0, size, range_size)
+    ]
+    count = curry(_count_quotes, path)
+    if workers is not None and workers > 1 and len(blocks) > 1:
+        counts = list(_pool_map(count, blocks, workers))
+    else:
+        counts = [count(block) for block in blocks]
+    quotes_before = np.concatenate([[0], np.cumsum(counts)])
+
+    boundaries = [header_end]
+    with open(path, "rb") as f:
+        for (start, _), quotes in zip(blocks[1:], quotes_before[1:]):
+            if start <= boundaries[-1]:
+                continue
+            boundary = _next_record(f, start, int(quotes))
+            if boundary is None:
+                break
+            if boundary > boundaries[-1]:
+                boundaries.append(boundary)
+    boundaries.append(size)
+
+    return header, [
+        (start, end)
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+        if end > start
+    ]
+
+
+def _extract_csv_range(job, project, shape_format, chunk_size, encoding):
+    """ Reads and parses the records in a byte range of a csv file, in
+        chunks of chunk_size rows, into (points, linestrings, polygons)
+        GeometryTables.
+    """
+    path, (start, end), fieldnames = job
+    with open(path, "rb") as f:
+        f.seek(start)
+        text = f.read(end - start).decode(encoding)
+    rows = DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames)
+
+    chunks = [
+        _extract_chunk(chunk, project, shape_format, None)
+        for chunk in partition_all(chunk_size, rows)
+    ]
+    if not chunks:
+        chunks = [_extract_chunk([], project, shape_format, None)]
+    return tuple(GeometryTable.concat(layer) for layer in zip(*chunks))
+
+
+class CSVFiles:
+    """ The rows of one or more csv files, as dicts.
+
+    The files are read lazily: every iteration reopens them and streams the
+    rows, so only the rows being worked on are in memory. Unlike a
+    DictReader it can be iterated more than once, which the raster and
+    hexbin modes need (they read the data once for the bounds).
+
+    When the map makers parse with several workers, the files are split
+    into byte ranges of whole records instead, and every worker reads and
+    parses its own ranges (see csv_record_ranges), so one large file isn't
+    read serially.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The csv files, read in order. Every file has its own header, so the
+        columns can differ between files.
+
+    encoding : str, optional
+        The encoding of the files. Default is the locale's, like open.
+
+    range_size : int, default 64 MiB
+        The largest byte range a worker parses at once.
+    """
+
+    def __init__(self, paths, encoding=None, range_size=RANGE_SIZE):
+        self.paths = list(paths)
+        self.encoding = encoding
+        self.range_size = range_size
+
+    def __iter__(self):
+        for path in self.paths:
+            # newline="" keeps line breaks inside quoted fields intact.
+            with open(
+                path, "r", newline="", encoding=self.encoding
+            ) as csv_file:
+                yield from DictReader(csv_file)
+
+    def __repr__(self):
+        return "CSVFiles({!r})".format(self.paths)
+
+    def iter_geometry_tables(
+        self,
+        project=True,
+        shape_format=None,
+        shape_cache=None,
+        chunk_size=100000,
+        workers=None,
+    ):
+        """ Parses the files into (points, linestrings, polygons) tuples of
+            GeometryTables, in file order, for
+            map_maker.util.iter_geometry_tables. With more than one worker
+            the files are parsed in byte ranges in a pool of workers
+            processes, a tuple per range, otherwise the rows are parsed in
+            chunks of chunk_size.
+        """
+        if workers is None or workers <= 1:
+            for chunk in partition_all(chunk_size, self):
+                yield _extract_chunk(
+                    chunk, project, shape_format, shape_cache
+                )
+            return
+
+        encoding = self.encoding or locale.getpreferredencoding(False)
+        jobs = []
+        for path in self.paths:
+            header, ranges = csv_record_ranges(
+                path, self.range_size, workers
+            )
+            fieldnames = next(
+                csv.reader(io.StringIO(header.decode(encoding), newline="")),
+                None,
+            )
+            jobs.extend((path, r, fieldnames) for r in ranges)
+
+        extract = curry(
+            _extract_csv_range,
+            project=project,
+            shape_format=shape_format,
+            chunk_size=chunk_size,
+            encoding=encoding,
+        )
+        yield from _pool_map(extract, jobs, workers)
@@ -0,0 +1,254 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import re
+
+from map_maker.util.util import iter_geometry_tables
+
+GEOJSON_EXTENSIONS = (".geojson", ".json")
+GEOJSON_SEQ_EXTENSIONS = (
+    ".ndjson",
+    ".jsonl",
+    ".geojsonl",
+    ".geojsons",
+    ".geojsonseq",
+)
+
+# The record separator starting every text of a GeoJSON text sequence.
+_RS = "\x1e"
+# How much of a file is read at a time while parsing it incrementally.
+_BLOCK_SIZE = 2 ** 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+def _is_sequence(path):
+    return os.path.splitext(path)[1].lower() in GEOJSON_SEQ_EXTENSIONS
+
+
+class _Buffer:
+    """ The unparsed text of a file, read in blocks as the parser needs
+        more of it.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """ Reads another block, at least doubling the unparsed text so a
+            large value isn't reparsed too often. Returns False at the end
+            of the file.
+        """
+        if self.eof:
+            return False
+        # Drop what's been parsed.
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        block = self.f.read(max(_BLOCK_SIZE, len(self.text)))
+        self.eof = not block
+        self.text += block
+        return not self.eof
+
+    def peek(self):
+        """ Skips whitespace and returns the next character, "" at the end
+            of the file.
+        """
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.more():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                "Expected one of {!r} at {!r} in {}.".format(
+                    characters,
+                    self.text[self.pos:self.pos + 20],
+                    self.f.name,
+                )
+            )
+        self.pos += 1
+        return character
+
+    def decode(self):
+        """ Decodes the next JSON value, reading more of the file until it's
+            complete.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise
+                continue
+            # A number at the end of the text might go on in the next block.
+            if end < len(self.text) or not self.more():
+                self.pos = end
+                return value
+
+
+def _iter_collection(f):
+    """ Streams the features of a GeoJSON object one at a time, so only a
+        feature at a time is in memory rather than the whole collection.
+        Anything but a FeatureCollection (a single Feature or geometry) is
+        yielded whole.
+    """
+    buffer = _Buffer(f)
+    buffer.expect("{")
+    members = {}
+    has_features = False
+    if buffer.peek() == "}":
+        buffer.expect("}")
+    else:
+        while True:
+            key = buffer.decode()
+            buffer.expect(":")
+            if key == "features":
+                has_features = True
+                buffer.expect("[")
+                if buffer.peek() == "]":
+                    buffer.expect("]")
+                else:
+                    while True:
+                        yield buffer.decode()
+                        if buffer.expect(",]") == "]":
+                            break
+            else:
+                members[key] = buffer.decode()
+            if buffer.expect(",}") == "}":
+                break
+
+    if not has_features:
+        yield members
+
+
+def _iter_sequence(f):
+    """ Streams the texts of newline-delimited GeoJSON, or of a GeoJSON
+        text sequence (RFC 8142) where every text starts with a record
+        separator and can span lines.
+    """
+    lines = []
+    for line in f:
+        if line.startswith(_RS) and lines:
+            yield "".join(lines)
+            lines = []
+        lines.append(line)
+        if not lines[0].startswith(_RS):
+            yield "".join(lines)
+            lines = []
+    if lines:
+        yield "".join(lines)
+
+
+def _iter_features(value):
+    """ Flattens a GeoJSON object into its features.
+    """
+    if value.get("type") == "FeatureCollection":
+        for feature in value.get("features", []):
+            yield from _iter_features(feature)
+    elif value.get("type") == "Feature":
+        yield value
+    else:
+        # A bare geometry.
+        yield {"type": "Feature", "geometry": value, "properties": {}}
+
+
+def _feature_row(feature):
+    """ Turns a GeoJSON feature into a shape data dict, like a csv row: the
+        properties, with the geometry mapping as the shape. Returns None
+        for features without a geometry, which can't be drawn.
+    """
+    if feature.get("geometry") is None:
+        return None
+    row = dict(feature.get("properties") or {})
+    row["shape"] = feature["geometry"]
+    return row
+
+
+class GeoJSONFiles:
+    """ The features of one or more GeoJSON files, as dicts.
+
+    Every feature is a row like a csv row: its properties are the columns,
+    so color, alpha and size style the shapes and the rest turn into
+    tooltips, and its geometry is the shape. Features without a geometry
+    are dropped.
+
+    FeatureCollections are parsed incrementally, a feature at a time, so a
+    large file is never in memory whole. Newline-delimited GeoJSON and
+    GeoJSON text sequences are parsed a line (or text) at a time. Like
+    CSVFiles it can be iterated more than once.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The GeoJSON files, read in order. Files ending in .ndjson, .jsonl,
+        .geojsonl, .geojsons or .geojsonseq are read as sequences, the
+        others as a single GeoJSON object.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+
+    def __iter__(self):
+        for path in self.paths:
+            # GeoJSON is always UTF-8, sometimes with a byte order mark.
+            with open(path, "r", encoding="utf-8-sig") as geojson_file:
+                if _is_sequence(path):
+                    texts = (
+                        text.strip(_RS + " \t\r\n")
+                        for text in _iter_sequence(geojson_file)
+                    )
+                    values = (json.loads(text) for text in texts if text)
+                else:
+                    values = _iter_collection(geojson_file)
+                for value in values:
+                    for feature in _iter_features(value):
+                        row = _feature_row(feature)
+                        if row is not None:
+                            yield row
+
+    def __repr__(self):
+        return "GeoJSONFiles({!r})".format(self.paths)
+
+    def iter_geometry_tables(
+        self,
+        project=True,
+        shape_format=None,
+        shape_cache=None,
+        chunk_size=100000,
+        workers=None,
+    ):
+        """ Parses the features into (points, linestrings, polygons) tuples
+            of GeometryTables for map_maker.util.iter_geometry_tables. The
+            shapes are always GeoJSON mappings, whatever shape_format the
+            other files have.
+        """
+        return iter_geometry_tables(
+            iter(self),
+            project=project,
+            shape_format="mapping",
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            workers=workers,
+        )
@@ -0,0 +1,88 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import os
+
+from itertools import groupby
+
+from .arrow_files import ARROW_EXTENSIONS, ArrowFiles
+from .csv_files import CSVFiles
+from .geojson_files import (
+    GEOJSON_EXTENSIONS,
+    GEOJSON_SEQ_EXTENSIONS,
+    GeoJSONFiles,
+)
+
+
+def _reader_type(path):
+    """ Picks the reader for a file from its extension, csv by default.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ARROW_EXTENSIONS:
+        return ArrowFiles
+    if extension in GEOJSON_EXTENSIONS + GEOJSON_SEQ_EXTENSIONS:
+        return GeoJSONFiles
+    return CSVFiles
+
+
+class ShapeFiles:
+    """ The shapes of input files of any supported format, read by the
+    reader for every file's extension: Parquet and Arrow files by
+    ArrowFiles, GeoJSON files by GeoJSONFiles and everything else as csv by
+    CSVFiles.
+
+    Parameters
+    ----------
+    paths : iterable of str
+        The files, read in order.
+
+    columns : iterable of str, optional
+        The tooltip columns to read from the columnar files. Default is
+        every column.
+
+    bbox : tuple of float, optional
+        The (min_lon, min_lat, max_lon, max_lat) box to keep shapes
+        intersecting. Only the columnar files can be filtered.
+    """
+
+    def __init__(self, paths, columns=None, bbox=None):
+        self.paths = list(paths)
+        self.readers = []
+        # Runs of files of the same format share a reader.
+        for reader_type, group in groupby(self.paths, _reader_type):
+            if reader_type is ArrowFiles:
+                self.readers.append(ArrowFiles(group, columns, bbox))
+            elif bbox is not None:
+                raise ValueError(
+                    "Only Parquet and Arrow files can be read within a bbox."
+                )
+            else:
+                self.readers.append(reader_type(group))
+
+    def __iter__(self):
+        for reader in self.readers:
+            yield from reader
+
+    def __repr__(self):
+        return "ShapeFiles({!r})".format(self.paths)
+
+    def iter_geometry_tables(self, **kwargs):
+        """ Yields the (points, linestrings, polygons) tuples of
+            GeometryTables of every reader in turn, for
+            map_maker.util.iter_geometry_tables.
+        """
+        for reader in self.readers:
+            yield from reader.iter_geometry_tables(**kwargs)
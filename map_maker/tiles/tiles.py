@@ -0,0 +1,465 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import logging
+import numpy as np
+import os
+
+from shapely import (
+    bounds as shape_bounds,
+    clip_by_rect,
+    get_coordinates,
+    is_empty,
+    simplify,
+    transform,
+)
+from shapely.geometry import shape as to_shape
+from toolz import curry
+
+from map_maker.util import (
+    LAYERS,
+    extract_geometry_tables,
+    BoundsAccumulator,
+    GeometryTable,
+)
+from map_maker.util.cluster import MERC_HALF_WORLD, TILE_SIZE
+from map_maker.util.util import merc_to_lla_coords, _pool_map
+
+try:
+    import mapbox_vector_tile
+except ImportError:  # pragma: no cover
+    mapbox_vector_tile = None
+
+logger = logging.getLogger(__name__)
+
+# The MVT coordinate grid, and how far past the tile edge shapes are kept
+# (in grid units) so lines and outlines don't stop short at tile seams.
+EXTENT = 4096
+BUFFER = 64
+
+METADATA_FILE = "metadata.json"
+
+
+def tile_bounds(z, x, y):
+    """ Returns the Web Mercator (minx, miny, maxx, maxy) of the XYZ tile.
+    """
+    size = 2 * MERC_HALF_WORLD / 2 ** z
+    min_x = x * size - MERC_HALF_WORLD
+    max_y = MERC_HALF_WORLD - y * size
+    return (min_x, max_y - size, min_x + size, max_y)
+
+
+def _tile_index(coords, z):
+    """ Returns the XYZ tile column and row of Web Mercator coordinates,
+        clipped to the tiles of the zoom level.
+    """
+    size = 2 * MERC_HALF_WORLD / 2 ** z
+    x = np.floor((coords[..., 0] + MERC_HALF_WORLD) / size)
+    y = np.floor((MERC_HALF_WORLD - coords[..., 1]) / size)
+    return (
+        np.clip(x, 0, 2 ** z - 1).astype(np.int64),
+        np.clip(y, 0, 2 ** z - 1).astype(np.int64),
+    )
+
+
+def assign_tiles(shapes, z):
+    """ Returns (x, y, shape index) arrays with one entry for every tile
+        that the bounding box of every shape touches at zoom level z.
+    """
+    shapes_bounds = shape_bounds(shapes)
+    x0, y1 = _tile_index(shapes_bounds[:, :2], z)
+    x1, y0 = _tile_index(shapes_bounds[:, 2:], z)
+    widths = x1 - x0 + 1
+    counts = widths * (y1 - y0 + 1)
+
+    rows = np.repeat(np.arange(len(shapes)), counts)
+    # The position of every entry within its shape's block of tiles.
+    within = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    x = x0[rows] + within % widths[rows]
+    y = y0[rows] + within // widths[rows]
+    return x, y, rows
+
+
+def tile_properties(table):
+    """ Returns the MVT properties of every row of a table: dicts of plain
+        Python values, without the missing ones.
+    """
+    names = list(table.properties)
+    columns = [table.properties[name].tolist() for name in names]
+    records = []
+    for values in zip(*columns) if names else [()] * len(table):
+        properties = {}
+        for name, value in zip(names, values):
+            # None and NaN are missing.
+            if value is None or value != value:
+                continue
+            if not isinstance(value, (str, int, float, bool)):
+                value = str(value)
+            properties[name] = value
+        records.append(properties)
+    return records
+
+
+def _encode_tile(job, extent, buffer):
+    """ Clips the shapes of a tile and encodes them as an MVT. Returns the
+        (z, x, y) of the tile and the encoded bytes, or None if everything
+        was clipped away.
+    """
+    (z, x, y), layers = job
+    min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+    pad = buffer / extent * (max_x - min_x)
+
+    encoded_layers = []
+    for name, shapes, properties in layers:
+        clipped = clip_by_rect(
+            shapes, min_x - pad, min_y - pad, max_x + pad, max_y + pad
+        )
+        features = [
+            {"geometry": shape, "properties": props}
+            for shape, props in zip(clipped, properties)
+            if not shape.is_empty
+        ]
+        if features:
+            encoded_layers.append({"name": name, "features": features})
+
+    if not encoded_layers:
+        return (z, x, y), None
+    return (
+        (z, x, y),
+        mapbox_vector_tile.encode(
+            encoded_layers,
+            default_options={
+                "quantize_bounds": (min_x, min_y, max_x, max_y),
+                "extents": extent,
+            },
+        ),
+    )
+
+
+def thin_points(shapes, z):
+    """ Returns the indices of the points to keep at zoom level z: the
+        first point in every pixel of the zoom level's tiles.
+    """
+    if not len(shapes):
+        return np.arange(0)
+    pixel = 2 * MERC_HALF_WORLD / 2 ** z / TILE_SIZE
+    coords = shape_bounds(shapes)[:, :2]
+    pixels = np.floor((coords + MERC_HALF_WORLD) / pixel).astype(np.int64)
+    _, keep = np.unique(pixels, axis=0, return_index=True)
+    return np.sort(keep)
+
+
+def iter_tile_jobs(tables, z, properties=None, thin=False):
+    """ Simplifies the layer tables for zoom level z (to about one pixel)
+        and splits them into per tile jobs: the tile and a list of
+        (layer name, shapes, properties) for every layer with shapes in it.
+        properties are the tile_properties of every table, which can be
+        passed in to reuse them across zoom levels. With thin the points
+        are thinned to one per pixel.
+
+        Only the tile assignments are computed up front, every job is built
+        as it's yielded.
+    """
+    if properties is None:
+        properties = [tile_properties(table) for table in tables]
+    tolerance = 2 * MERC_HALF_WORLD / 2 ** z / TILE_SIZE
+
+    layer_shapes = []
+    assignments = []
+    for layer, table in enumerate(tables):
+        shapes = table.to_shapes()
+        if LAYERS[layer] != "points":
+            shapes = simplify(shapes, tolerance, preserve_topology=True)
+            keep = np.flatnonzero(~is_empty(shapes))
+        elif thin:
+            keep = thin_points(shapes, z)
+        else:
+            keep = np.arange(len(shapes))
+        x, y, rows = assign_tiles(shapes[keep], z)
+        layer_shapes.append(shapes)
+        assignments.append(
+            (x, y, np.full(len(rows), layer, dtype=np.int64), keep[rows])
+        )
+
+    # Group the shapes by tile, then by layer.
+    x, y, layers, rows = (np.concatenate(a) for a in zip(*assignments))
+    order = np.lexsort([rows, layers, y, x])
+    x, y, layers, rows = x[order], y[order], layers[order], rows[order]
+    new_tile = (np.diff(x, prepend=-1) != 0) | (np.diff(y, prepend=-1) != 0)
+    starts = np.flatnonzero(new_tile | (np.diff(layers, prepend=-1) != 0))
+    stops = np.append(starts[1:], len(rows))
+
+    tile, job = None, []
+    for start, stop in zip(starts, stops):
+        if new_tile[start] and job:
+            yield tile, job
+            job = []
+        tile = (z, int(x[start]), int(y[start]))
+        tile_rows = rows[start:stop]
+        job.append(
+            (
+                LAYERS[layers[start]],
+                layer_shapes[layers[start]][tile_rows],
+                [properties[layers[start]][row] for row in tile_rows],
+            )
+        )
+    if job:
+        yield tile, job
+
+
+def write_tiles(
+    shape_data,
+    output_dir,
+    min_zoom=0,
+    max_zoom=8,
+    jobs=None,
+    shape_format=None,
+    shape_cache=None,
+    extent=EXTENT,
+    buffer=BUFFER,
+    chunk_size=100000,
+    thin_zoom=None,
+):
+    """ Writes the shape data as an XYZ pyramid of Mapbox Vector Tiles.
+
+    Every zoom level is simplified to about one pixel, and below thin_zoom
+    the points are thinned to one per pixel, then every tile's
+    shapes are clipped to the tile (plus a buffer), quantized to the tile's
+    extent x extent grid and encoded, with one MVT layer for each of the
+    points, linestrings and polygons. The tiles are encoded by a pool of
+    processes and written to output_dir/z/x/y.pbf, along with a
+    metadata.json describing the pyramid for the map makers to load.
+
+    Parameters
+    ----------
+    shape_data : iterable of :obj:`dict`
+        The shape data dictionaries, as for make_map_plot.
+
+    output_dir : str
+        The directory to write the tiles to.
+
+    min_zoom : int, default 0
+        The lowest zoom level to write tiles for.
+
+    max_zoom : int, default 8
+        The highest zoom level to write tiles for.
+
+    jobs : int, optional
+        The number of processes to parse the rows and encode the tiles
+        with. Default is the number of CPUs, 1 does everything in this
+        process.
+
+    shape_format : str, optional
+        The serialization format of the shapes, detected from the data if
+        not provided.
+
+    shape_cache : :obj:`map_maker.util.ShapeCache`, optional
+        A cache of parsed shapes.
+
+    extent : int, default 4096
+        The size of the tile coordinate grid.
+
+    buffer : int, default 64
+        How far past the tile edges shapes are kept, in grid units.
+
+    chunk_size : int, default 100000
+        The number of rows of shape_data parsed at a time.
+
+    thin_zoom : int, optional
+        The lowest zoom level with every point in the tiles, below it the
+        points are thinned to one per pixel. Default is max_zoom, so maps
+        zoomed in past the tiles still show every point.
+
+    Returns
+    -------
+    metadata : dict
+        The contents of metadata.json: the zoom levels, the lon / lat
+        bounds and the property names of every layer.
+    """
+    if mapbox_vector_tile is None:
+        raise ImportError(
+            "Writing vector tiles requires mapbox-vector-tile, install it "
+            "with pip install map_maker[tiles]."
+        )
+    if min_zoom > max_zoom:
+        raise ValueError("min_zoom must not be larger than max_zoom.")
+
+    bounds = BoundsAccumulator()
+    tables = extract_geometry_tables(
+        shape_data,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        workers=jobs if jobs is not None else os.cpu_count(),
+        bounds=bounds,
+    )
+    if bounds.bounds is None:
+        raise ValueError("There are no shapes to map.")
+
+    encode = curry(_encode_tile, extent=extent, buffer=buffer)
+    properties = [tile_properties(table) for table in tables]
+    if thin_zoom is None:
+        thin_zoom = max_zoom
+    tile_jobs = (
+        job
+        for z in range(min_zoom, max_zoom + 1)
+        for job in iter_tile_jobs(tables, z, properties, thin=z < thin_zoom)
+    )
+    workers = jobs if jobs is not None else os.cpu_count()
+    if workers > 1:
+        # Only a few jobs per worker are built ahead of the encoding.
+        encoded = _pool_map(encode, tile_jobs, workers)
+    else:
+        encoded = map(encode, tile_jobs)
+
+    n_tiles = 0
+    for (z, x, y), tile in encoded:
+        if tile is None:
+            continue
+        tile_dir = os.path.join(output_dir, str(z), str(x))
+        os.makedirs(tile_dir, exist_ok=True)
+        tile_file = os.path.join(tile_dir, "{}.pbf".format(y))
+        with open(tile_file, "wb") as f:
+            f.write(tile)
+        n_tiles += 1
+
+    lla_bounds = merc_to_lla_coords(
+        np.array(bounds.bounds, dtype=float).reshape(2, 2)
+    )
+    metadata = {
+        "minzoom": min_zoom,
+        "maxzoom": max_zoom,
+        "bounds": lla_bounds.ravel().tolist(),
+        "extent": extent,
+        "layers": {
+            name: list(table.properties)
+            for name, table in zip(LAYERS, tables)
+            if len(table)
+        },
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    logger.info(
+        "Wrote %d tiles for zoom levels %d to %d to %s.",
+        n_tiles,
+        min_zoom,
+        max_zoom,
+        output_dir,
+    )
+    return metadata
+
+
+def read_metadata(tile_dir):
+    """ Reads the metadata.json of a tile pyramid written by write_tiles.
+    """
+    with open(os.path.join(tile_dir, METADATA_FILE)) as f:
+        return json.load(f)
+
+
+def _decode_layer(layer, z, x, y):
+    """ Turns the features of a decoded MVT layer back into Web Mercator
+        shapes, along with their properties.
+    """
+    min_x, min_y, max_x, max_y = tile_bounds(z, x, y)
+    scale = (max_x - min_x) / layer.get("extent", EXTENT)
+    shapes = np.empty(len(layer["features"]), dtype=object)
+    shapes[:] = [to_shape(f["geometry"]) for f in layer["features"]]
+    # The decoded tile coordinates count up from the bottom left corner.
+    shapes = transform(shapes, lambda coords: coords * scale + (min_x, min_y))
+    return shapes, [f["properties"] for f in layer["features"]]
+
+
+def read_tiles(tile_dir, z, bounds, metadata=None):
+    """ Reads the tiles of a pyramid written by write_tiles back into
+    (points, linestrings, polygons) GeometryTables.
+
+    Only the zoom level z tiles covering bounds are read, and the tiles
+    that weren't written (with nothing in them) are skipped. The points in
+    a tile's buffer are left to the tile they're in, so every point comes
+    back once. The linestrings and polygons come back whole from every
+    tile they're in.
+
+    Parameters
+    ----------
+    tile_dir : str
+        The directory with the tiles and metadata.json.
+
+    z : int
+        The zoom level to read.
+
+    bounds : tuple of float
+        The Web Mercator (minx, miny, maxx, maxy) extent to read the tiles
+        of.
+
+    metadata : dict, optional
+        The metadata of the pyramid, read from metadata.json if not given.
+
+    Returns
+    -------
+    tables : tuple of :obj:`map_maker.util.GeometryTable`
+        The points, linestrings and polygons in Web Mercator, with a
+        property column for every property of the layer in the metadata.
+    """
+    if mapbox_vector_tile is None:
+        raise ImportError(
+            "Reading vector tiles requires mapbox-vector-tile, install it "
+            "with pip install map_maker[tiles]."
+        )
+    if metadata is None:
+        metadata = read_metadata(tile_dir)
+
+    min_x, max_y = _tile_index(np.array(bounds[:2], dtype=float), z)
+    max_x, min_y = _tile_index(np.array(bounds[2:], dtype=float), z)
+    layers = {name: ([], []) for name in LAYERS}
+    for x in range(int(min_x), int(max_x) + 1):
+        for y in range(int(min_y), int(max_y) + 1):
+            path = os.path.join(tile_dir, str(z), str(x), "{}.pbf".format(y))
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                tile = mapbox_vector_tile.decode(f.read())
+            for name, layer in tile.items():
+                shapes, properties = _decode_layer(layer, z, x, y)
+                if name == "points":
+                    tile_x, tile_y = _tile_index(get_coordinates(shapes), z)
+                    keep = np.flatnonzero((tile_x == x) & (tile_y == y))
+                    shapes = shapes[keep]
+                    properties = [properties[ii] for ii in keep]
+                layers[name][0].append(shapes)
+                layers[name][1].extend(properties)
+
+    tables = []
+    for name in LAYERS:
+        shapes, records = layers[name]
+        names = metadata["layers"].get(name, [])
+        tables.append(
+            GeometryTable.from_shapes(
+                np.concatenate(shapes) if shapes else np.empty(0, object),
+                {
+                    column: np.array(
+                        [record.get(column) for record in records],
+                        dtype=object,
+                    )
+                    for column in names
+                },
+            )
+        )
+    return tuple(tables)
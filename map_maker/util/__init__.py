@@ -14,6 +14,86 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from .util import to_shape, extract_geometries, get_bounds, to_geojson
+from .cache import ShapeCache, CacheInfo
+from .cluster import (
+    ClusterIndex,
+    ClusterLevel,
+    cluster_columns,
+    zoom_for_extent,
+)
+from .geometry_table import GeometryTable
+from .hexbin import (
+    HEXBIN_AGGREGATIONS,
+    HexbinAggregator,
+    hexbin_geometry_tables,
+)
+from .raster import (
+    AGGREGATIONS,
+    RasterAggregator,
+    rasterize_geometry_tables,
+    shade,
+)
+from .simplify import pixel_tolerance, simplify_table
+from .serialize import JSON_ENCODERS, JSONEncoder, dumps
+from .util import (
+    LAYERS,
+    BoundsAccumulator,
+    SHAPE_FORMATS,
+    sniff_shape_format,
+    detect_shape_format,
+    lla_to_merc,
+    to_shape,
+    to_shapes,
+    extract_geometries,
+    extract_geometry_tables,
+    iter_geometries,
+    iter_geometry_tables,
+    get_bounds,
+    to_property_columns,
+    to_geojson,
+    iter_geojson_features,
+    write_geojson,
+    dumps_geojson,
+)
+from .viewport import ViewportIndex
 
-__all__ = ["to_shape", "extract_geometries", "get_bounds", "to_geojson"]
+__all__ = [
+    "ShapeCache",
+    "CacheInfo",
+    "ClusterIndex",
+    "ClusterLevel",
+    "cluster_columns",
+    "zoom_for_extent",
+    "GeometryTable",
+    "HEXBIN_AGGREGATIONS",
+    "HexbinAggregator",
+    "hexbin_geometry_tables",
+    "AGGREGATIONS",
+    "RasterAggregator",
+    "rasterize_geometry_tables",
+    "shade",
+    "pixel_tolerance",
+    "simplify_table",
+    "ViewportIndex",
+    "JSON_ENCODERS",
+    "JSONEncoder",
+    "dumps",
+    "LAYERS",
+    "BoundsAccumulator",
+    "SHAPE_FORMATS",
+    "sniff_shape_format",
+    "detect_shape_format",
+    "lla_to_merc",
+    "to_shape",
+    "to_shapes",
+    "extract_geometries",
+    "extract_geometry_tables",
+    "iter_geometries",
+    "iter_geometry_tables",
+    "get_bounds",
+    "to_property_columns",
+    "to_geojson",
+    "iter_geojson_features",
+    "write_geojson",
+    "dumps_geojson",
+]
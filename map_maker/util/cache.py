@@ -0,0 +1,186 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import numpy as np
+
+from collections import OrderedDict, namedtuple
+from collections.abc import Mapping
+from hashlib import blake2b
+
+from shapely import get_num_coordinates
+from shapely.geometry.base import BaseGeometry
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "entries", "nbytes", "max_bytes"]
+)
+
+# Rough per-entry overhead of the key, the OrderedDict slot and the Python /
+# GEOS geometry objects, on top of 16 bytes per coordinate.
+_ENTRY_OVERHEAD = 256
+
+
+def _shape_bytes(shape_ser):
+    """ Turns a raw shape value into tagged bytes for hashing, so that e.g.
+        a WKT string and the same characters as WKB never collide. Returns
+        None for values that can't be hashed by content.
+    """
+    if isinstance(shape_ser, str):
+        return b"s" + shape_ser.encode("utf-8")
+    elif isinstance(shape_ser, (bytes, bytearray, memoryview)):
+        return b"b" + bytes(shape_ser)
+    elif isinstance(shape_ser, Mapping):
+        try:
+            return b"m" + json.dumps(shape_ser, sort_keys=True).encode("utf-8")
+        except (TypeError, ValueError):
+            return None
+    elif isinstance(shape_ser, BaseGeometry):
+        return b"g" + shape_ser.wkb
+    return None
+
+
+def _estimate_nbytes(shape_obj):
+    return 16 * int(get_num_coordinates(shape_obj)) + _ENTRY_OVERHEAD
+
+
+class ShapeCache:
+    """ A bounded LRU cache of parsed (and optionally projected) shapes.
+
+    Entries are keyed by a hash of the raw shape value, the shape format it
+    was decoded as and the projection flag, so repeated WKT / GeoJSON / WKB
+    values are only parsed and projected once. The least recently used
+    shapes are evicted once the estimated size of the cached geometries
+    passes max_bytes.
+
+    Parameters
+    ----------
+    max_bytes : int, default 256MB
+        The (estimated) maximum memory the cached shapes can take.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._shapes = OrderedDict()
+
+    def __len__(self):
+        return len(self._shapes)
+
+    def info(self):
+        """ Returns the hit / miss counters and the size of the cache.
+        """
+        return CacheInfo(
+            self.hits, self.misses, len(self), self.nbytes, self.max_bytes
+        )
+
+    def clear(self):
+        """ Empties the cache and resets the counters.
+        """
+        self._shapes.clear()
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+
+    def key(self, shape_ser, project, shape_format=None):
+        """ Returns the cache key for a raw shape value decoded as
+            shape_format (None for a sniffed format), or None if the value
+            can't be hashed by content.
+        """
+        shape_bytes = _shape_bytes(shape_ser)
+        if shape_bytes is None:
+            return None
+        digest = blake2b(shape_bytes, digest_size=16)
+        digest.update(b"p" if project else b"u")
+        digest.update(b"f" + (shape_format or "").encode("utf-8"))
+        return digest.digest()
+
+    def put(self, key, shape_obj):
+        """ Adds a shape to the cache, evicting the least recently used shapes
+            if the cache is over max_bytes.
+        """
+        if key in self._shapes:
+            return
+        nbytes = _estimate_nbytes(shape_obj)
+        if nbytes > self.max_bytes:
+            return
+        self._shapes[key] = (shape_obj, nbytes)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_nbytes) = self._shapes.popitem(last=False)
+            self.nbytes -= evicted_nbytes
+
+    def get_many(self, shape_sers, project, load, shape_format=None):
+        """ Looks up a column of raw shape values.
+
+        Each distinct missing value is passed to load exactly once, in a
+        single call, and the result is cached. A value that repeats inside
+        the column counts as a hit after its first occurrence.
+
+        Parameters
+        ----------
+        shape_sers : :obj:`list`
+            The raw shape values.
+
+        project : bool
+            Whether load projects the shapes, which is part of the key.
+
+        load : callable
+            Takes a list of raw shape values and returns the parsed shapes.
+
+        shape_format : str, optional
+            The format load decodes the values as, which is part of the key.
+            None means load sniffs the format.
+
+        Returns
+        -------
+        shapes : :obj:`numpy.ndarray`
+            An object array with the parsed shapes.
+        """
+        shapes = np.empty(len(shape_sers), dtype=object)
+        missing = OrderedDict()
+        uncacheable = []
+        for ii, shape_ser in enumerate(shape_sers):
+            key = self.key(shape_ser, project, shape_format)
+            if key is None:
+                uncacheable.append(ii)
+            elif key in self._shapes:
+                self.hits += 1
+                self._shapes.move_to_end(key)
+                shapes[ii] = self._shapes[key][0]
+            elif key in missing:
+                self.hits += 1
+                missing[key].append(ii)
+            else:
+                self.misses += 1
+                missing[key] = [ii]
+
+        load_indices = [
+            positions[0] for positions in missing.values()
+        ] + uncacheable
+        if not load_indices:
+            return shapes
+
+        loaded = load([shape_sers[ii] for ii in load_indices])
+        for (key, positions), shape_obj in zip(missing.items(), loaded):
+            for ii in positions:
+                shapes[ii] = shape_obj
+            self.put(key, shape_obj)
+        for ii, shape_obj in zip(uncacheable, loaded[len(missing) :]):
+            shapes[ii] = shape_obj
+
+        return shapes
@@ -0,0 +1,221 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from collections import namedtuple
+
+from .util import lla_to_merc_coords
+
+# The Web Mercator extent, and the tile size the zoom levels are defined by.
+MERC_HALF_WORLD = 20037508.342789244
+TILE_SIZE = 256
+
+ClusterLevel = namedtuple("ClusterLevel", ["zoom", "coords", "counts"])
+
+
+def _spread_bits(values):
+    """ Spreads the low 32 bits of every value out to the even bits of a
+        64-bit integer.
+    """
+    values = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in [
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ]:
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _morton_keys(cells):
+    """ Interleaves the x and y cell indices into Z-order keys, so that the
+        key of a cell's parent (the 2 x 2 block one zoom level up) is its
+        key shifted right by two bits.
+    """
+    return _spread_bits(cells[:, 0]) | (_spread_bits(cells[:, 1]) << 1)
+
+
+def zoom_for_extent(extent, plot_size):
+    """ Returns the (fractional) web map zoom level at which extent Web
+        Mercator meters fill plot_size pixels.
+    """
+    if extent <= 0:
+        return np.inf
+    return np.log2(plot_size * 2 * MERC_HALF_WORLD / (TILE_SIZE * extent))
+
+
+class ClusterIndex:
+    """ A zoom level hierarchy of point clusters.
+
+    The points are binned into a grid of cells radius pixels wide at
+    max_zoom, and every zoom level above it merges the cells of the level
+    below in 2 x 2 blocks. The cells are sorted once by their Z-order key,
+    which keeps every level sorted as well, so the whole hierarchy costs
+    one sort of the points and then shrinks level by level. Each cluster
+    sits at the centroid of its points.
+
+    Levels where clustering barely shrinks the points aren't kept: from
+    the first zoom level with at least max_ratio times as many clusters as
+    points (raw_zoom) up, get_level returns the individual points.
+
+    Parameters
+    ----------
+    coords : :obj:`numpy.ndarray` of float
+        An (N, 2) array with the point coordinates.
+
+    project : bool, default False
+        Whether the coordinates are lon / lat and have to be projected to
+        Web Mercator for the grid. The cluster centroids stay in the input
+        coordinates.
+
+    min_zoom : int, default 0
+        The lowest zoom level to cluster for.
+
+    max_zoom : int, default 12
+        The highest zoom level to cluster for. Above it the points are
+        shown individually.
+
+    radius : float, default 40
+        The width of the grid cells in pixels.
+
+    max_ratio : float, default 0.5
+        The fraction of the point count at which a level stops being worth
+        clustering.
+    """
+
+    def __init__(
+        self,
+        coords,
+        project=False,
+        min_zoom=0,
+        max_zoom=12,
+        radius=40,
+        max_ratio=0.5,
+    ):
+        if min_zoom > max_zoom:
+            raise ValueError("min_zoom must not be larger than max_zoom.")
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        merc = lla_to_merc_coords(coords) if project else coords
+
+        self.coords = coords
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius = radius
+        self.max_ratio = max_ratio
+
+        # Cell indices at max_zoom, clipped to the valid Mercator extent.
+        cell_size = (
+            radius * 2 * MERC_HALF_WORLD / (TILE_SIZE * 2 ** max_zoom)
+        )
+        n_cells = int(np.ceil(2 * MERC_HALF_WORLD / cell_size))
+        cells = np.floor((merc + MERC_HALF_WORLD) / cell_size)
+        cells = np.clip(np.nan_to_num(cells), 0, n_cells - 1).astype(np.int64)
+
+        keys = _morton_keys(cells)
+        order = np.argsort(keys)
+
+        # Weighted sums carry the centroids from level to level.
+        keys = keys[order]
+        sums_x = coords[order, 0]
+        sums_y = coords[order, 1]
+        counts = np.ones(len(coords), dtype=np.int64)
+        centroids = coords[order]
+
+        self.levels = {}
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            starts = np.flatnonzero(
+                np.concatenate([[True], keys[1:] != keys[:-1]])
+            )
+            # Nothing merges at the highest zoom levels of sparse data, and
+            # those levels share the centroids of the level below.
+            if len(starts) < len(keys):
+                keys = keys[starts]
+                counts = np.add.reduceat(counts, starts)
+                sums_x = np.add.reduceat(sums_x, starts)
+                sums_y = np.add.reduceat(sums_y, starts)
+                centroids = np.stack([sums_x, sums_y], axis=1)
+                centroids /= counts[:, None]
+            # The levels only shrink going down, so every level above one
+            # that's too big is too big as well.
+            if len(counts) < max_ratio * len(coords):
+                self.levels[zoom] = ClusterLevel(zoom, centroids, counts)
+            keys = keys >> np.uint64(2)
+
+        self.raw_zoom = max(self.levels, default=min_zoom - 1) + 1
+        self.points = ClusterLevel(
+            self.raw_zoom, coords, np.ones(len(coords), dtype=np.int64)
+        )
+
+    def __len__(self):
+        return len(self.coords)
+
+    def get_level(self, zoom):
+        """ Returns the ClusterLevel for zoom, clamped to the indexed zoom
+            levels. From raw_zoom up every point is its own cluster.
+        """
+        zoom = int(np.floor(max(zoom, self.min_zoom)))
+        if zoom >= self.raw_zoom:
+            return self.points
+        return self.levels[zoom]
+
+
+def cluster_columns(
+    index, point_columns, default_color, default_alpha, default_size
+):
+    """ Stacks every level of a ClusterIndex (and the individual points
+        from raw_zoom up) into one set of columns for a backend to embed.
+
+        Returns the columns, with x, y, count, color, alpha and size, and
+        the offsets of each level from min_zoom to raw_zoom. The
+        individual points keep their color, alpha and size from
+        point_columns, clusters use the defaults and grow with the log of
+        their count.
+    """
+    zooms = range(index.min_zoom, index.raw_zoom + 1)
+    levels = [index.get_level(zoom) for zoom in zooms]
+    coords = np.concatenate([level.coords for level in levels])
+    counts = np.concatenate([level.counts for level in levels])
+    # The individual points are the last level.
+    n_clusters = len(counts) - len(index)
+    cluster_sizes = default_size * (1 + np.log2(counts[:n_clusters]))
+
+    columns = {
+        "x": coords[:, 0],
+        "y": coords[:, 1],
+        "count": counts,
+        "color": np.concatenate(
+            [
+                np.full(n_clusters, default_color, dtype=object),
+                np.asarray(point_columns["color"], dtype=object),
+            ]
+        ),
+        "alpha": np.concatenate(
+            [
+                np.full(n_clusters, default_alpha, dtype=float),
+                np.asarray(point_columns["alpha"], dtype=float),
+            ]
+        ),
+        "size": np.concatenate(
+            [cluster_sizes, np.asarray(point_columns["size"], dtype=float)]
+        ),
+    }
+    offsets = np.concatenate(
+        [[0], np.cumsum([len(level.counts) for level in levels])]
+    )
+    return columns, offsets
@@ -0,0 +1,392 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from shapely import (
+    get_coordinates,
+    get_parts,
+    get_rings,
+    get_type_id,
+    linearrings,
+    linestrings,
+    multilinestrings,
+    multipoints,
+    multipolygons,
+    points,
+    polygons,
+    GeometryType,
+)
+
+_POINT_TYPES = [GeometryType.POINT, GeometryType.MULTIPOINT]
+_LINESTRING_TYPES = [GeometryType.LINESTRING, GeometryType.MULTILINESTRING]
+_POLYGON_TYPES = [GeometryType.POLYGON, GeometryType.MULTIPOLYGON]
+_MULTI_TYPES = [
+    GeometryType.MULTIPOINT,
+    GeometryType.MULTILINESTRING,
+    GeometryType.MULTIPOLYGON,
+]
+
+_GEOJSON_TYPES = {
+    GeometryType.POINT: "Point",
+    GeometryType.MULTIPOINT: "MultiPoint",
+    GeometryType.LINESTRING: "LineString",
+    GeometryType.MULTILINESTRING: "MultiLineString",
+    GeometryType.POLYGON: "Polygon",
+    GeometryType.MULTIPOLYGON: "MultiPolygon",
+}
+
+
+def _offsets(index, n):
+    """ Turns a sorted parent index (one entry per child) into an offsets
+        array of length n + 1.
+    """
+    counts = np.bincount(index, minlength=n) if len(index) else np.zeros(n)
+    return np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+
+def _ranges(starts, stops):
+    """ Concatenates np.arange(start, stop) for every start / stop pair,
+        without a Python loop.
+    """
+    lengths = stops - starts
+    shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return shifts + np.arange(lengths.sum(), dtype=np.int64)
+
+
+def _renumber(index):
+    """ Renumbers a sorted index so its distinct values become 0, 1, 2...
+    """
+    if not len(index):
+        return index
+    return np.concatenate([[0], np.cumsum(np.diff(index) != 0)])
+
+
+def _group_index(offsets):
+    """ Inverse of _offsets: the parent of every child.
+    """
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+class GeometryTable:
+    """ A columnar (struct of arrays) container for shapes and their
+    properties.
+
+    The shapes are stored as flat coordinates with three levels of offsets,
+    the same for every geometry type: rows are made of parts (the single
+    geometry, or each member of a multi-geometry), parts are made of rings
+    (the exterior and interior rings of a polygon, or the linestring / point
+    itself) and rings are made of coordinates.
+
+    Parameters
+    ----------
+    type_ids : :obj:`numpy.ndarray` of int
+        The Shapely geometry type of every row.
+
+    coords : :obj:`numpy.ndarray` of float
+        An (N, 2) array with the coordinates of every ring.
+
+    geom_offsets : :obj:`numpy.ndarray` of int
+        Offsets from rows into parts.
+
+    part_offsets : :obj:`numpy.ndarray` of int
+        Offsets from parts into rings.
+
+    ring_offsets : :obj:`numpy.ndarray` of int
+        Offsets from rings into coords.
+
+    properties : :obj:`dict` of :obj:`numpy.ndarray`, optional
+        The property columns, one value per row.
+    """
+
+    def __init__(
+        self,
+        type_ids,
+        coords,
+        geom_offsets,
+        part_offsets,
+        ring_offsets,
+        properties=None,
+    ):
+        self.type_ids = type_ids
+        self.coords = coords
+        self.geom_offsets = geom_offsets
+        self.part_offsets = part_offsets
+        self.ring_offsets = ring_offsets
+        self.properties = properties if properties is not None else {}
+
+    @classmethod
+    def from_shapes(cls, shapes, properties=None):
+        """ Builds a table from an array of non-empty Shapely objects with
+            vectorized Shapely calls.
+        """
+        shapes = np.asarray(shapes, dtype=object)
+        type_ids = get_type_id(shapes).astype(np.int8)
+
+        parts, part_rows = get_parts(shapes, return_index=True)
+        geom_offsets = _offsets(part_rows, len(shapes))
+
+        # Polygons contribute their rings, everything else is its own ring.
+        is_polygon = get_type_id(parts) == GeometryType.POLYGON
+        polygon_rings, polygon_ring_parts = get_rings(
+            parts[is_polygon], return_index=True
+        )
+        ring_counts = np.ones(len(parts), dtype=np.int64)
+        ring_counts[is_polygon] = np.diff(
+            _offsets(polygon_ring_parts, is_polygon.sum())
+        )
+        part_offsets = np.concatenate([[0], np.cumsum(ring_counts)])
+
+        rings = np.empty(part_offsets[-1], dtype=object)
+        rings[part_offsets[:-1][~is_polygon]] = parts[~is_polygon]
+        rings[
+            _ranges(
+                part_offsets[:-1][is_polygon], part_offsets[1:][is_polygon]
+            )
+        ] = polygon_rings
+
+        coords, coord_rings = get_coordinates(rings, return_index=True)
+        ring_offsets = _offsets(coord_rings, len(rings))
+
+        return cls(
+            type_ids,
+            coords,
+            geom_offsets,
+            part_offsets.astype(np.int64),
+            ring_offsets,
+            properties,
+        )
+
+    @classmethod
+    def concat(cls, tables):
+        """ Concatenates tables row-wise. Property columns missing from some
+            of the tables are filled with None.
+        """
+        tables = list(tables)
+        if not tables:
+            return cls.from_shapes([])
+
+        def _concat_offsets(offsets):
+            shifts = np.cumsum([0] + [o[-1] for o in offsets[:-1]])
+            shifted = [o[1:] + shift for o, shift in zip(offsets, shifts)]
+            return np.concatenate([offsets[0][:1], *shifted])
+
+        names = []
+        for table in tables:
+            names.extend(k for k in table.properties if k not in names)
+
+        properties = {}
+        for name in names:
+            columns = []
+            for table in tables:
+                if name in table.properties:
+                    columns.append(table.properties[name])
+                else:
+                    columns.append(np.full(len(table), None, dtype=object))
+            properties[name] = np.concatenate(columns)
+
+        return cls(
+            np.concatenate([t.type_ids for t in tables]),
+            np.concatenate([t.coords for t in tables]),
+            _concat_offsets([t.geom_offsets for t in tables]),
+            _concat_offsets([t.part_offsets for t in tables]),
+            _concat_offsets([t.ring_offsets for t in tables]),
+            properties,
+        )
+
+    def __len__(self):
+        return len(self.type_ids)
+
+    def take(self, rows):
+        """ Returns a table with only the given rows (and their properties),
+            in the order given.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        parts = _ranges(self.geom_offsets[rows], self.geom_offsets[rows + 1])
+        rings = _ranges(
+            self.part_offsets[parts], self.part_offsets[parts + 1]
+        )
+        coords = _ranges(
+            self.ring_offsets[rings], self.ring_offsets[rings + 1]
+        )
+
+        def _lengths_to_offsets(offsets, index):
+            lengths = offsets[index + 1] - offsets[index]
+            return np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+        return type(self)(
+            self.type_ids[rows],
+            self.coords[coords],
+            _lengths_to_offsets(self.geom_offsets, rows),
+            _lengths_to_offsets(self.part_offsets, parts),
+            _lengths_to_offsets(self.ring_offsets, rings),
+            {name: column[rows] for name, column in self.properties.items()},
+        )
+
+    def bounds(self):
+        """ Returns the (minx, miny, maxx, maxy) bounds of the coordinates,
+            or None if the table is empty.
+        """
+        if not len(self.coords):
+            return None
+        minx, miny = self.coords.min(axis=0)
+        maxx, maxy = self.coords.max(axis=0)
+        return (minx, miny, maxx, maxy)
+
+    def round(self, decimals):
+        """ Returns a copy of the table with the coordinates rounded to
+            decimals places in one vectorized call, so they serialize to
+            shorter strings. The offsets and properties are shared.
+        """
+        return type(self)(
+            self.type_ids,
+            np.round(self.coords, decimals),
+            self.geom_offsets,
+            self.part_offsets,
+            self.ring_offsets,
+            self.properties,
+        )
+
+    def to_shapes(self):
+        """ Rebuilds the Shapely objects for every row.
+        """
+        part_rows = _group_index(self.geom_offsets)
+        ring_parts = _group_index(self.part_offsets)
+        coord_rings = _group_index(self.ring_offsets)
+
+        part_types = self.type_ids[part_rows]
+        parts = np.empty(len(part_rows), dtype=object)
+
+        is_point = np.isin(part_types, _POINT_TYPES)
+        if is_point.any():
+            point_rings = self.part_offsets[:-1][is_point]
+            parts[is_point] = points(
+                self.coords[self.ring_offsets[:-1][point_rings]]
+            )
+
+        is_linestring = np.isin(part_types, _LINESTRING_TYPES)
+        if is_linestring.any():
+            coord_mask = is_linestring[ring_parts[coord_rings]]
+            parts[is_linestring] = linestrings(
+                self.coords[coord_mask],
+                indices=_renumber(coord_rings[coord_mask]),
+            )
+
+        is_polygon = np.isin(part_types, _POLYGON_TYPES)
+        if is_polygon.any():
+            coord_mask = is_polygon[ring_parts[coord_rings]]
+            ring_mask = is_polygon[ring_parts]
+            rings = linearrings(
+                self.coords[coord_mask],
+                indices=_renumber(coord_rings[coord_mask]),
+            )
+            parts[is_polygon] = polygons(
+                rings, indices=_renumber(ring_parts[ring_mask])
+            )
+
+        # Single geometries are their only part, multi-geometries collect
+        # their parts.
+        shapes = parts[self.geom_offsets[:-1]].copy()
+        for multi_type, collect in zip(
+            _MULTI_TYPES, [multipoints, multilinestrings, multipolygons]
+        ):
+            is_multi = self.type_ids == multi_type
+            if is_multi.any():
+                part_mask = is_multi[part_rows]
+                shapes[is_multi] = collect(
+                    parts[part_mask], indices=_renumber(part_rows[part_mask])
+                )
+
+        return shapes
+
+    def geometry_mappings(self):
+        """ Generates GeoJSON-like geometry dicts for every row straight from
+            the coordinates, without building Shapely objects.
+        """
+        coords = self.coords.tolist()
+        ring_offsets = self.ring_offsets.tolist()
+        part_offsets = self.part_offsets.tolist()
+        geom_offsets = self.geom_offsets.tolist()
+
+        def _ring(ring):
+            return coords[ring_offsets[ring] : ring_offsets[ring + 1]]
+
+        def _part(type_id, part):
+            if type_id in _POINT_TYPES:
+                return coords[ring_offsets[part_offsets[part]]]
+            rings = range(part_offsets[part], part_offsets[part + 1])
+            if type_id in _LINESTRING_TYPES:
+                return _ring(rings[0])
+            return [_ring(ring) for ring in rings]
+
+        for row, type_id in enumerate(self.type_ids.tolist()):
+            row_parts = range(geom_offsets[row], geom_offsets[row + 1])
+            if type_id in _MULTI_TYPES:
+                coordinates = [_part(type_id, part) for part in row_parts]
+            else:
+                coordinates = _part(type_id, row_parts[0])
+            yield {
+                "type": _GEOJSON_TYPES[type_id],
+                "coordinates": coordinates,
+            }
+
+    def ragged_xy(self, exteriors_only=False):
+        """ Splits the coordinates into one x array and one y array per row,
+            with NaN separating the parts (and rings) of a row. This is the
+            layout Bokeh's multi_line and patches glyphs take for their xs /
+            ys columns. With exteriors_only, polygon holes are left out.
+        """
+        rings = np.arange(len(self.ring_offsets) - 1)
+        ring_rows = _group_index(self.geom_offsets)[
+            _group_index(self.part_offsets)
+        ]
+        if exteriors_only:
+            is_polygon = np.isin(self.type_ids, _POLYGON_TYPES)[ring_rows]
+            is_exterior = np.zeros(len(rings), dtype=bool)
+            is_exterior[self.part_offsets[:-1]] = True
+            keep = ~is_polygon | is_exterior
+            rings = rings[keep]
+            ring_rows = ring_rows[keep]
+
+        if not len(rings):
+            return [], []
+
+        starts = self.ring_offsets[rings]
+        lengths = self.ring_offsets[rings + 1] - starts
+        # Every ring but the last one of each row is followed by a NaN.
+        is_first = np.concatenate([[True], ring_rows[1:] != ring_rows[:-1]])
+        is_last = np.concatenate([is_first[1:], [True]])
+        out_lengths = lengths + ~is_last
+        out_starts = np.concatenate([[0], np.cumsum(out_lengths)[:-1]])
+
+        out = np.full((out_lengths.sum(), 2), np.nan)
+        out[_ranges(out_starts, out_starts + lengths)] = self.coords[
+            _ranges(starts, starts + lengths)
+        ]
+
+        splits = out_starts[is_first][1:]
+        return np.split(out[:, 0], splits), np.split(out[:, 1], splits)
+
+    def to_records(self):
+        """ Turns the table into a list of dicts, one per row, with the
+            properties and a 'shape_obj' field holding the Shapely object.
+        """
+        names = list(self.properties)
+        columns = [self.properties[name].tolist() for name in names]
+        return [
+            {**dict(zip(names, values)), "shape_obj": shape_obj}
+            for shape_obj, *values in zip(self.to_shapes(), *columns)
+        ]
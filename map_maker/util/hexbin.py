@@ -0,0 +1,262 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from shapely import GeometryType
+
+from .geometry_table import GeometryTable
+from .raster import (
+    DEFAULT_CMAP,
+    _hex_to_rgb,
+    _normalize,
+    _numeric_column,
+)
+from .util import (
+    aggregate_geometry_tables,
+    lla_to_merc_coords,
+    merc_to_lla_coords,
+)
+
+HEXBIN_AGGREGATIONS = ("count", "sum", "mean")
+
+# The default hexagon size, as a fraction of the plot width.
+HEXBIN_PLOT_FRACTION = 1 / 50
+
+_SQRT_3 = np.sqrt(3)
+
+# Corner offsets of a unit pointy-top hexagon, closed.
+_CORNERS = np.array(
+    [
+        [np.cos(angle), np.sin(angle)]
+        for angle in np.radians(np.arange(30, 360, 60))
+    ]
+)
+_CORNERS = np.concatenate([_CORNERS, _CORNERS[:1]])
+
+
+def hex_axial(coords, size):
+    """ Returns the axial (q, r) coordinates of the pointy-top hexagons of
+        circumradius size that the coordinates fall in.
+    """
+    q = (_SQRT_3 / 3 * coords[:, 0] - coords[:, 1] / 3) / size
+    r = (2 / 3 * coords[:, 1]) / size
+
+    # Round in cube coordinates, fixing up the component that moved the
+    # most so the three still sum to zero.
+    x, z = q, r
+    y = -x - z
+    rx, ry, rz = np.round(x), np.round(y), np.round(z)
+    dx, dy, dz = np.abs(rx - x), np.abs(ry - y), np.abs(rz - z)
+    fix_x = (dx > dy) & (dx > dz)
+    fix_z = ~fix_x & ~(dy > dz)
+    rx = np.where(fix_x, -ry - rz, rx)
+    rz = np.where(fix_z, -rx - ry, rz)
+    return rx.astype(np.int64), rz.astype(np.int64)
+
+
+def hex_centers(q, r, size):
+    """ Returns the (N, 2) centers of the hexagons with axial coordinates
+        q, r.
+    """
+    return np.column_stack(
+        [size * _SQRT_3 * (q + r / 2), size * 1.5 * r]
+    ).astype(float)
+
+
+class HexbinAggregator:
+    """ Aggregates points into hexagonal cells in Web Mercator.
+
+    Only the occupied cells are kept, merged after every update, so points
+    can be streamed through in chunks of any size.
+
+    Parameters
+    ----------
+    size : float
+        The circumradius of the hexagons in Web Mercator meters.
+
+    how : str, default "count"
+        The aggregation, one of "count", "sum" or "mean" of column.
+
+    column : str, optional
+        The property column to aggregate. Required for "sum" and "mean".
+
+    project : bool, default False
+        Whether the points are lon / lat and have to be projected to Web
+        Mercator. The hexagons come back in lon / lat too.
+    """
+
+    def __init__(self, size, how="count", column=None, project=False):
+        if how not in HEXBIN_AGGREGATIONS:
+            raise ValueError(
+                "Unknown aggregation {}, must be one of {}.".format(
+                    how, ", ".join(HEXBIN_AGGREGATIONS)
+                )
+            )
+        if how != "count" and column is None:
+            raise ValueError("The {} aggregation needs a column.".format(how))
+        if size <= 0:
+            raise ValueError("The hexagon size must be positive.")
+
+        self.size = size
+        self.how = how
+        self.column = column
+        self.project = project
+
+        self.q = np.empty(0, dtype=np.int64)
+        self.r = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self.sums = np.empty(0)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def update(self, points):
+        """ Adds the points of a GeometryTable to the cells.
+        """
+        if not len(points):
+            return
+        coords = points.coords
+        if self.project:
+            coords = lla_to_merc_coords(coords)
+        if self.how == "count":
+            values = np.zeros(len(coords))
+        else:
+            values = _numeric_column(points.properties[self.column])
+            coords = coords[~np.isnan(values)]
+            values = values[~np.isnan(values)]
+
+        q, r = hex_axial(coords, self.size)
+        cells, inverse = np.unique(
+            np.column_stack(
+                [np.concatenate([self.q, q]), np.concatenate([self.r, r])]
+            ),
+            axis=0,
+            return_inverse=True,
+        )
+        inverse = inverse.ravel()
+        self.counts = np.bincount(
+            inverse,
+            weights=np.concatenate([self.counts, np.ones(len(q))]),
+            minlength=len(cells),
+        ).astype(np.int64)
+        self.sums = np.bincount(
+            inverse,
+            weights=np.concatenate([self.sums, values]),
+            minlength=len(cells),
+        )
+        self.q, self.r = cells[:, 0], cells[:, 1]
+
+    def values(self):
+        """ Returns the aggregate of every cell.
+        """
+        if self.how == "sum":
+            return self.sums
+        elif self.how == "mean":
+            return self.sums / self.counts
+        return self.counts
+
+    def to_table(self, cmap=None, how="linear", alpha=0.7):
+        """ Builds a polygon GeometryTable with a hexagon per cell, with
+            "count" (and "value" for sum and mean) property columns and a
+            "color" column ramped along cmap (a list of "#rrggbb" colors)
+            after scaling the values with how ("linear", "log" or
+            "eq_hist").
+        """
+        centers = hex_centers(self.q, self.r, self.size)
+        coords = (
+            centers[:, None, :] + self.size * _CORNERS[None, :, :]
+        ).reshape(-1, 2)
+        if self.project:
+            coords = merc_to_lla_coords(coords)
+
+        values = self.values()
+        colors = _hex_to_rgb(cmap or DEFAULT_CMAP)
+        scaled = _normalize(values, how)
+        stops = np.linspace(0, 1, len(colors))
+        rgb = np.stack(
+            [np.interp(scaled, stops, colors[:, i]) for i in range(3)], axis=1
+        ).round()
+
+        n = len(values)
+        n_corners = len(_CORNERS)
+        properties = {"count": self.counts}
+        if self.how != "count":
+            properties["value"] = values
+        properties["color"] = np.array(
+            ["#{:02x}{:02x}{:02x}".format(*c) for c in rgb.astype(int)],
+            dtype=object,
+        )
+        properties["alpha"] = np.full(n, alpha)
+
+        return GeometryTable(
+            np.full(n, GeometryType.POLYGON, dtype=np.int8),
+            coords,
+            np.arange(n + 1),
+            np.arange(n + 1),
+            np.arange(0, n_corners * n + 1, n_corners),
+            properties,
+        )
+
+
+def hexbin_geometry_tables(
+    shape_data,
+    plot_width,
+    size=None,
+    how="count",
+    column=None,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+):
+    """ Streams the shape data's points into a HexbinAggregator, while
+        collecting the linestrings and polygons as GeometryTables. size is
+        the hexagon circumradius in pixels of a plot_width wide plot of the
+        bounds, by default plot_width * HEXBIN_PLOT_FRACTION. See
+        aggregate_geometry_tables, the data is read once whether or not
+        the bounds are given.
+
+        Returns the aggregator, the linestrings and polygons tables and
+        the bounds of everything.
+    """
+    if size is None:
+        size = plot_width * HEXBIN_PLOT_FRACTION
+
+    def _make_aggregator(bounds):
+        min_x, min_y, max_x, max_y = bounds
+        corners = np.array([[min_x, min_y], [max_x, max_y]], dtype=float)
+        if not project:
+            corners = lla_to_merc_coords(corners)
+        # A single point still gets a hexagon.
+        extent = max(corners[1, 0] - corners[0, 0], 1.0)
+        return HexbinAggregator(
+            size * extent / plot_width, how, column, project=not project
+        )
+
+    return aggregate_geometry_tables(
+        shape_data,
+        _make_aggregator,
+        project=project,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        bounds=bounds,
+        workers=workers,
+        columns=() if column is None else (column,),
+    )
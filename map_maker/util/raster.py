@@ -0,0 +1,352 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from .util import lla_to_merc_coords, aggregate_geometry_tables
+
+AGGREGATIONS = ("count", "sum", "mean", "categorical")
+# The category the values past max_categories are counted under.
+OTHER_CATEGORY = "other"
+SHADE_HOWS = ("eq_hist", "log", "linear")
+
+# Light blue to dark blue, which reads well over the light map tiles.
+DEFAULT_CMAP = ["#add8e6", "#00008b"]
+# The Category10 palette, for categorical aggregations.
+DEFAULT_CATEGORY_COLORS = [
+    "#1f77b4",
+    "#ff7f0e",
+    "#2ca02c",
+    "#d62728",
+    "#9467bd",
+    "#8c564b",
+    "#e377c2",
+    "#7f7f7f",
+    "#bcbd22",
+    "#17becf",
+]
+
+
+def _hex_to_rgb(colors):
+    """ Turns a list of "#rrggbb" strings into an (N, 3) float array.
+    """
+    return np.array(
+        [
+            [int(color.lstrip("#")[i : i + 2], 16) for i in (0, 2, 4)]
+            for color in colors
+        ],
+        dtype=float,
+    )
+
+
+def _numeric_column(column):
+    """ Converts a property column to floats, with None and empty strings
+        (missing CSV values) as NaN.
+    """
+    if column.dtype != object:
+        return column.astype(float)
+    missing = np.equal(column, None) | np.equal(column, "")
+    return np.where(missing, np.nan, column).astype(float)
+
+
+class RasterAggregator:
+    """ Bins points into a fixed pixel grid, datashader style.
+
+    The grid covers bounds in Web Mercator, so the image lines up with the
+    map tiles, and only the grid is kept in memory: points can be streamed
+    through update in chunks of any size.
+
+    Parameters
+    ----------
+    bounds : tuple of float
+        The (minx, miny, maxx, maxy) extent of the grid, in the coordinates
+        of the points. Points outside of it are ignored.
+
+    width : int
+        The width of the grid in pixels.
+
+    height : int
+        The height of the grid in pixels.
+
+    how : str, default "count"
+        The aggregation, one of "count", "sum" or "mean" of column, or
+        "categorical" for a count of every value of column.
+
+    column : str, optional
+        The property column to aggregate. Required for everything but
+        "count".
+
+    project : bool, default False
+        Whether the points (and bounds) are lon / lat and have to be
+        projected to Web Mercator.
+
+    max_categories : int, default 10
+        The most values of column a categorical aggregation counts
+        separately, each with a grid of its own. The values after them
+        are all counted as OTHER_CATEGORY, so a high-cardinality column
+        can't grow the grids without bound.
+    """
+
+    def __init__(
+        self,
+        bounds,
+        width,
+        height,
+        how="count",
+        column=None,
+        project=False,
+        max_categories=10,
+    ):
+        if how not in AGGREGATIONS:
+            raise ValueError(
+                "Unknown aggregation {}, must be one of {}.".format(
+                    how, ", ".join(AGGREGATIONS)
+                )
+            )
+        if how != "count" and column is None:
+            raise ValueError("The {} aggregation needs a column.".format(how))
+
+        min_x, min_y, max_x, max_y = bounds
+        corners = np.array([[min_x, min_y], [max_x, max_y]], dtype=float)
+        if project:
+            corners = lla_to_merc_coords(corners)
+        # A zero size extent (a single point) still needs a pixel.
+        for axis in (0, 1):
+            if corners[0, axis] == corners[1, axis]:
+                corners[:, axis] += [-0.5, 0.5]
+
+        self.bounds = tuple(corners.ravel())
+        self.width = width
+        self.height = height
+        self.how = how
+        self.column = column
+        self.project = project
+        self.max_categories = max_categories
+
+        self.counts = np.zeros(height * width)
+        self.sums = np.zeros(height * width)
+        self.categories = []
+        # The code of every category, and grids for them that grow by
+        # doubling rather than a copy per new category.
+        self._codes = {}
+        self._category_counts = np.zeros((0, height * width))
+
+    def _pixels(self, coords):
+        """ Returns the flat pixel index of every coordinate inside the
+            grid, and a mask of which coordinates those are.
+        """
+        if self.project:
+            coords = lla_to_merc_coords(coords)
+        min_x, min_y, max_x, max_y = self.bounds
+        x = (coords[:, 0] - min_x) / (max_x - min_x) * self.width
+        y = (coords[:, 1] - min_y) / (max_y - min_y) * self.height
+        inside = (x >= 0) & (x <= self.width) & (y >= 0) & (y <= self.height)
+        # The max edge belongs to the last pixel.
+        ix = np.minimum(x[inside].astype(np.int64), self.width - 1)
+        iy = np.minimum(y[inside].astype(np.int64), self.height - 1)
+        return iy * self.width + ix, inside
+
+    def _category_code(self, value):
+        """ Returns the code of a category value, adding a grid for it if
+            it's new.
+        """
+        code = self._codes.get(value)
+        if code is not None:
+            return code
+        if len(self.categories) >= self.max_categories:
+            value = OTHER_CATEGORY
+            code = self._codes.get(value)
+            if code is not None:
+                return code
+        code = len(self.categories)
+        if code == len(self._category_counts):
+            grown = np.zeros(
+                (
+                    min(max(2 * code, 1), self.max_categories + 1),
+                    self.width * self.height,
+                )
+            )
+            grown[:code] = self._category_counts
+            self._category_counts = grown
+        self.categories.append(value)
+        self._codes[value] = code
+        return code
+
+    def update(self, points):
+        """ Adds the points of a GeometryTable to the grid.
+        """
+        if not len(points):
+            return
+        pixels, inside = self._pixels(points.coords)
+        size = self.width * self.height
+
+        if self.how in ("sum", "mean"):
+            values = _numeric_column(points.properties[self.column])[inside]
+            valid = ~np.isnan(values)
+            self.counts += np.bincount(pixels[valid], minlength=size)
+            self.sums += np.bincount(
+                pixels[valid], weights=values[valid], minlength=size
+            )
+        elif self.how == "categorical":
+            values = points.properties[self.column][inside].astype(str)
+            distinct, inverse = np.unique(values, return_inverse=True)
+            codes = np.array(
+                [self._category_code(value) for value in distinct],
+                dtype=np.int64,
+            )[inverse.ravel()]
+            n_categories = len(self.categories)
+            self._category_counts[:n_categories] += np.bincount(
+                codes * size + pixels, minlength=n_categories * size
+            ).reshape(n_categories, size)
+            self.counts += np.bincount(pixels, minlength=size)
+        else:
+            self.counts += np.bincount(pixels, minlength=size)
+
+    def aggregate(self):
+        """ Returns the aggregate as a (height, width) array, with row 0 at
+            the bottom (min y). Mean is NaN where there are no points. For
+            categorical, returns a (categories, height, width) array of the
+            counts of every value in self.categories.
+        """
+        shape = (self.height, self.width)
+        if self.how == "sum":
+            return self.sums.reshape(shape)
+        elif self.how == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return (self.sums / self.counts).reshape(shape)
+        elif self.how == "categorical":
+            n_categories = len(self.categories)
+            return self._category_counts[:n_categories].reshape(-1, *shape)
+        return self.counts.reshape(shape)
+
+    def shade(self, cmap=None, how="eq_hist", category_colors=None):
+        """ Colors the aggregate, see shade.
+        """
+        return shade(
+            self.aggregate(),
+            mask=self.counts.reshape(self.height, self.width) > 0,
+            cmap=cmap,
+            how=how,
+            category_colors=category_colors,
+        )
+
+
+def _normalize(values, how):
+    """ Scales values to [0, 1], linearly, by log or by histogram
+        equalization (the rank of each value among all of them).
+    """
+    if not len(values):
+        return values
+    if how == "eq_hist":
+        distinct, counts = np.unique(values, return_counts=True)
+        cdf = np.cumsum(counts) / counts.sum()
+        scaled = cdf[np.searchsorted(distinct, values)]
+    elif how == "log":
+        scaled = np.log1p(values - values.min())
+    else:
+        scaled = values.astype(float)
+    low, high = scaled.min(), scaled.max()
+    if high == low:
+        return np.ones(len(values))
+    return (scaled - low) / (high - low)
+
+
+def shade(agg, mask=None, cmap=None, how="eq_hist", category_colors=None):
+    """ Turns an aggregate into an RGBA image.
+
+        agg is a (height, width) array, colored along cmap (a list of
+        "#rrggbb" colors, interpolated), or a (categories, height, width)
+        array of counts, colored by mixing the category_colors by count with
+        the opacity following the total. how scales the values first, with
+        "eq_hist" (histogram equalization, which shows the structure of
+        heavily skewed counts), "log" or "linear". Pixels outside mask (by
+        default, those with no value) are transparent.
+
+        Returns a (height, width, 4) uint8 array.
+    """
+    if how not in SHADE_HOWS:
+        raise ValueError(
+            "Unknown shading {}, must be one of {}.".format(
+                how, ", ".join(SHADE_HOWS)
+            )
+        )
+    categorical = agg.ndim == 3
+    totals = agg.sum(axis=0) if categorical else agg
+    if mask is None:
+        mask = totals > 0 if categorical else ~np.isnan(agg) & (agg != 0)
+    mask = mask & ~np.isnan(totals)
+
+    image = np.zeros(totals.shape + (4,), dtype=np.uint8)
+    scaled = _normalize(totals[mask], how)
+
+    if categorical:
+        colors = _hex_to_rgb(category_colors or DEFAULT_CATEGORY_COLORS)
+        colors = colors[np.arange(len(agg)) % len(colors)]
+        weights = agg[:, mask] / totals[mask]
+        image[mask, :3] = (weights.T @ colors).round()
+        # Keep sparse pixels visible.
+        image[mask, 3] = (64 + 191 * scaled).round()
+    else:
+        colors = _hex_to_rgb(cmap or DEFAULT_CMAP)
+        stops = np.linspace(0, 1, len(colors))
+        image[mask, :3] = np.stack(
+            [np.interp(scaled, stops, colors[:, i]) for i in range(3)], axis=1
+        ).round()
+        image[mask, 3] = 255
+    return image
+
+
+def rasterize_geometry_tables(
+    shape_data,
+    width,
+    height,
+    how="count",
+    column=None,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+    max_categories=10,
+):
+    """ Streams the shape data's points into a width x height
+        RasterAggregator over the bounds, while collecting the linestrings
+        and polygons as GeometryTables. See aggregate_geometry_tables, the
+        data is read once whether or not the bounds are given.
+
+        Returns the aggregator, the linestrings and polygons tables and
+        the bounds of everything.
+    """
+    return aggregate_geometry_tables(
+        shape_data,
+        lambda bounds: RasterAggregator(
+            bounds,
+            width,
+            height,
+            how,
+            column,
+            project=not project,
+            max_categories=max_categories,
+        ),
+        project=project,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        bounds=bounds,
+        workers=workers,
+        columns=() if column is None else (column,),
+    )
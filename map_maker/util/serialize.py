@@ -0,0 +1,174 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import numpy as np
+
+from collections.abc import Mapping
+from toolz import compose
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+JSON_ENCODERS = ("auto", "orjson", "json")
+
+
+def _round_floats(obj, float_precision):
+    """ Rounds every float in a (nested) structure. NumPy float arrays are
+        rounded in one vectorized call.
+    """
+    if isinstance(obj, float):
+        return round(obj, float_precision)
+    elif isinstance(obj, np.ndarray):
+        if np.issubdtype(obj.dtype, np.floating):
+            return np.round(obj, float_precision)
+        elif obj.dtype == object:
+            return [_round_floats(o, float_precision) for o in obj.tolist()]
+        return obj
+    elif isinstance(obj, np.floating):
+        return round(float(obj), float_precision)
+    elif isinstance(obj, Mapping):
+        return {k: _round_floats(v, float_precision) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_round_floats(o, float_precision) for o in obj]
+    return obj
+
+
+def _finite_floats(obj):
+    """ Replaces every NaN and infinite float in a (nested) structure with
+        None, which is what orjson writes for them. The standard library
+        would write NaN and Infinity, which aren't valid JSON.
+    """
+    if isinstance(obj, float):
+        return obj if np.isfinite(obj) else None
+    elif isinstance(obj, np.ndarray):
+        if np.issubdtype(obj.dtype, np.floating):
+            finite = np.isfinite(obj)
+            if finite.all():
+                return obj
+            return np.where(finite, obj, None).tolist()
+        elif obj.dtype == object:
+            return [_finite_floats(o) for o in obj.tolist()]
+        return obj
+    elif isinstance(obj, np.floating):
+        return _finite_floats(float(obj))
+    elif isinstance(obj, Mapping):
+        return {k: _finite_floats(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [_finite_floats(o) for o in obj]
+    return obj
+
+
+def _numpy_default(obj):
+    """ Fallback for the types neither encoder handles natively.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(
+        "Object of type {} is not JSON serializable".format(
+            type(obj).__name__
+        )
+    )
+
+
+class JSONEncoder:
+    """ Encodes Python and NumPy values as compact JSON strings.
+
+    Uses orjson when it's installed (or requested), which writes NumPy
+    arrays natively, and the standard library otherwise. Floats are written
+    with their shortest round-trip representation, and can be rounded to
+    float_precision decimals first to make them shorter. Both write NaN and
+    infinite floats as null.
+
+    Parameters
+    ----------
+    encoder : str, default "auto"
+        "orjson", "json" or "auto" to pick orjson when it's available.
+
+    float_precision : int, optional
+        The number of decimals to round floats to before encoding.
+    """
+
+    def __init__(self, encoder="auto", float_precision=None):
+        if encoder not in JSON_ENCODERS:
+            raise ValueError(
+                "Unknown JSON encoder {}, must be one of {}.".format(
+                    encoder, ", ".join(JSON_ENCODERS)
+                )
+            )
+        if encoder == "auto":
+            encoder = "orjson" if orjson is not None else "json"
+        elif encoder == "orjson" and orjson is None:
+            raise ImportError(
+                "The orjson encoder requires orjson, "
+                "install it with pip install orjson."
+            )
+
+        self.name = encoder
+        self.float_precision = float_precision
+        if encoder == "orjson":
+            self._encode = self._encode_orjson
+        else:
+            self._encode = compose(
+                json.JSONEncoder(
+                    separators=(",", ":"),
+                    default=_numpy_default,
+                    allow_nan=False,
+                ).encode,
+                _finite_floats,
+            )
+
+    @staticmethod
+    def _encode_orjson(obj):
+        return orjson.dumps(
+            obj,
+            default=_numpy_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        ).decode("utf-8")
+
+    def encode(self, obj):
+        """ Encodes obj as a JSON string.
+        """
+        if self.float_precision is not None:
+            obj = _round_floats(obj, self.float_precision)
+        return self._encode(obj)
+
+    def encode_many(self, values):
+        """ Encodes every value of a list or 1-D array, returning a list of
+            JSON strings. Numeric arrays are encoded in a single call and
+            split, which is safe because there are no strings in them.
+        """
+        if isinstance(values, np.ndarray) and values.dtype.kind in "biuf":
+            if not len(values):
+                return []
+            return self.encode(values)[1:-1].split(",")
+        if isinstance(values, np.ndarray):
+            values = values.tolist()
+        if self.float_precision is not None:
+            values = _round_floats(values, self.float_precision)
+        encode = self._encode
+        return [encode(value) for value in values]
+
+
+def dumps(obj, encoder="auto", float_precision=None):
+    """ Encodes obj as a compact JSON string with the fastest available
+        encoder. See JSONEncoder.
+    """
+    return JSONEncoder(encoder, float_precision=float_precision).encode(obj)
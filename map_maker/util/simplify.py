@@ -0,0 +1,64 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import logging
+
+from shapely import is_empty, simplify
+
+from .geometry_table import GeometryTable
+
+logger = logging.getLogger(__name__)
+
+
+def pixel_tolerance(bounds, plot_width, plot_height):
+    """ Returns the size of one pixel, in the units of bounds, when bounds
+        fill a plot_width x plot_height plot. This is the largest
+        simplification tolerance that doesn't change the initial view.
+    """
+    min_x, min_y, max_x, max_y = bounds
+    return max((max_x - min_x) / plot_width, (max_y - min_y) / plot_height)
+
+
+def simplify_table(table, tolerance, preserve_topology=True):
+    """ Simplifies every shape of a GeometryTable with Douglas-Peucker.
+
+        With preserve_topology the simplified shapes stay valid (rings
+        don't collapse or cross), which is slower. Shapes that simplify
+        away entirely are dropped along with their properties.
+
+        Returns the simplified table and the number of vertices removed.
+    """
+    if not len(table) or tolerance <= 0:
+        return table, 0
+
+    shapes = simplify(
+        table.to_shapes(), tolerance, preserve_topology=preserve_topology
+    )
+    keep = ~is_empty(shapes)
+    simplified = GeometryTable.from_shapes(
+        shapes[keep],
+        {name: column[keep] for name, column in table.properties.items()},
+    )
+
+    removed = len(table.coords) - len(simplified.coords)
+    logger.info(
+        "Simplified %d shapes with tolerance %g, removed %d of %d vertices.",
+        len(table),
+        tolerance,
+        removed,
+        len(table.coords),
+    )
+    return simplified, removed
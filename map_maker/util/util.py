@@ -18,12 +18,27 @@ import json
 import pyproj
 import numpy as np
 
-from contextlib import redirect_stderr
-from collections import Mapping
+from collections import Counter, deque
+from collections.abc import Mapping
+from itertools import islice, repeat
+from multiprocessing import Pool
 
-from toolz import assoc, curry, dissoc, get
+from toolz import curry, dissoc, get, identity, partition_all
+from shapely import (
+    to_geojson as geometries_to_geojson,
+    bounds as shape_bounds,
+    from_geojson,
+    from_wkb,
+    from_wkt,
+    get_parts,
+    get_type_id,
+    is_empty,
+    is_missing,
+    transform,
+    GeometryType,
+)
+from shapely.wkb import loads as wkb_loads
 from shapely.wkt import loads as wkt_loads
-from shapely.errors import WKTReadingError
 from shapely.geometry import (
     shape,
     Point,
@@ -34,104 +49,729 @@ from shapely.geometry import (
     MultiPolygon,
     mapping,
 )
-from shapely.ops import transform
+
+from .geometry_table import GeometryTable
+from .serialize import JSONEncoder
 
 
-lla_proj = pyproj.Proj(init="epsg:4326")
-merc_proj = pyproj.Proj(init="epsg:3857")
-lla_to_merc_proj = curry(pyproj.transform)(lla_proj, merc_proj)
-lla_to_merc = curry(transform)(lla_to_merc_proj)
+lla_to_merc_transformer = pyproj.Transformer.from_crs(
+    "EPSG:4326", "EPSG:3857", always_xy=True
+)
+merc_to_lla_transformer = pyproj.Transformer.from_crs(
+    "EPSG:3857", "EPSG:4326", always_xy=True
+)
 
 
-def to_shape(shape_ser):
-    """ Deserializes a shape into a Shapely object - can handle WKT, GeoJSON,
-        Python dictionaries and Shapely types.
+def lla_to_merc_coords(coords):
+    """ Projects an (N, 2) array of lon/lat coordinates to web mercator in a
+        single call to the transformer.
+    """
+    x, y = lla_to_merc_transformer.transform(coords[:, 0], coords[:, 1])
+    return np.column_stack([x, y])
+
+
+def merc_to_lla_coords(coords):
+    """ Unprojects an (N, 2) array of web mercator coordinates to lon/lat in
+        a single call to the transformer.
+    """
+    x, y = merc_to_lla_transformer.transform(coords[:, 0], coords[:, 1])
+    return np.column_stack([x, y])
+
+
+def lla_to_merc(shapes):
+    """ Projects a shape, or an array of shapes, from lon/lat to web mercator.
+        The coordinates of every shape are pulled into one array, projected
+        together and put back into new shapes.
+    """
+    return transform(shapes, lla_to_merc_coords)
+
+
+LAYERS = ("points", "linestrings", "polygons")
+
+SHAPE_TYPES = (
+    Point,
+    MultiPoint,
+    LineString,
+    MultiLineString,
+    Polygon,
+    MultiPolygon,
+)
+
+
+def _not_serializable(shape_ser):
+    return TypeError(
+        "{} is not serializable to a shape.".format(str(shape_ser))
+    )
+
+
+def _is_shapely(shape_ser):
+    return isinstance(shape_ser, SHAPE_TYPES)
+
+
+def _is_str(shape_ser):
+    return isinstance(shape_ser, str)
+
+
+def _is_bytes(shape_ser):
+    return isinstance(shape_ser, (bytes, bytearray, memoryview))
+
+
+def _is_mapping(shape_ser):
+    return isinstance(shape_ser, Mapping)
+
+
+def _from_geojson_str(shape_ser):
+    return shape(json.loads(shape_ser))
+
+
+def _from_wkb_bytes(shape_ser):
+    return wkb_loads(bytes(shape_ser))
+
+
+def _from_hex_wkb_str(shape_ser):
+    return wkb_loads(shape_ser, hex=True)
+
+
+def _from_wkb_array(shape_arr):
+    # GEOS only takes bytes, not bytearrays or memoryviews.
+    return from_wkb(
+        np.array([bytes(s) for s in shape_arr], dtype=object),
+        on_invalid="ignore",
+    )
+
+
+def _from_hex_wkb_array(shape_arr):
+    return from_wkb(shape_arr, on_invalid="ignore")
+
+
+def _from_wkt_array(shape_arr):
+    return from_wkt(shape_arr, on_invalid="ignore")
+
+
+def _from_geojson_array(shape_arr):
+    return from_geojson(shape_arr, on_invalid="ignore")
+
+
+def _from_mapping_array(shape_arr):
+    return np.array([shape(s) for s in shape_arr], dtype=object)
+
+
+def _from_shapely_array(shape_arr):
+    return shape_arr
+
+
+# Each format has a cheap type check, a scalar decoder and a bulk decoder that
+# returns None for anything it can't parse.
+_SHAPE_FORMATS = {
+    "wkt": (_is_str, wkt_loads, _from_wkt_array),
+    "geojson": (_is_str, _from_geojson_str, _from_geojson_array),
+    "wkb": (_is_bytes, _from_wkb_bytes, _from_wkb_array),
+    "hexwkb": (_is_str, _from_hex_wkb_str, _from_hex_wkb_array),
+    "mapping": (_is_mapping, shape, _from_mapping_array),
+    "shapely": (_is_shapely, identity, _from_shapely_array),
+}
+
+SHAPE_FORMATS = tuple(_SHAPE_FORMATS)
+
+
+def _check_shape_format(shape_format):
+    if shape_format not in _SHAPE_FORMATS:
+        raise ValueError(
+            "Unknown shape format {}, must be one of {}.".format(
+                shape_format, ", ".join(SHAPE_FORMATS)
+            )
+        )
+
+
+def sniff_shape_format(shape_ser):
+    """ Guesses the serialization format of a single shape from its type and
+        first character, without parsing it. Returns None if the format
+        can't be determined.
     """
     if isinstance(shape_ser, str):
-        try:
-            # Redirecting stdout because there's a low level exception that
-            # prints.
-            with redirect_stderr("/dev/null"):
-                shape_obj = wkt_loads(shape_ser)
-        except WKTReadingError:
-            try:
-                shape_obj = shape(json.loads(shape_ser))
-            except Exception:
-                raise TypeError(
-                    "{} is not serializable to a shape.".format(str(shape_ser))
-                )
+        head = shape_ser.lstrip()[:1]
+        if head == "{":
+            return "geojson"
+        elif head.isalpha():
+            return "wkt"
+        # Hex WKB always starts with the byte order flag, 00 or 01.
+        elif shape_ser[:2] in ("00", "01"):
+            return "hexwkb"
+    elif _is_bytes(shape_ser):
+        return "wkb"
     elif isinstance(shape_ser, Mapping):
-        shape_obj = shape(shape_ser)
-    elif isinstance(
-        shape_ser,
-        (
-            Point,
-            MultiPoint,
-            LineString,
-            MultiLineString,
-            Polygon,
-            MultiPolygon,
-        ),
-    ):
-        shape_obj = shape_ser
+        return "mapping"
+    elif _is_shapely(shape_ser):
+        return "shapely"
+    return None
+
+
+def detect_shape_format(shape_sers, sample_size=100):
+    """ Detects the serialization format of a column of shapes by sniffing
+        the first sample_size rows. Returns the most common format, or None
+        if none of the sampled rows are recognizable.
+    """
+    formats = Counter(
+        sniff_shape_format(s) for s in islice(shape_sers, sample_size)
+    )
+    formats.pop(None, None)
+    return formats.most_common(1)[0][0] if formats else None
+
+
+def to_shape(shape_ser, shape_format=None):
+    """ Deserializes a shape into a Shapely object - can handle WKT, GeoJSON,
+        WKB (binary or hex), Python dictionaries and Shapely types. The format
+        is sniffed unless shape_format is provided.
+    """
+    if shape_format is None:
+        shape_format = sniff_shape_format(shape_ser)
+        if shape_format is None:
+            raise _not_serializable(shape_ser)
+    else:
+        _check_shape_format(shape_format)
+
+    matches, decode, _ = _SHAPE_FORMATS[shape_format]
+    if not matches(shape_ser):
+        raise _not_serializable(shape_ser)
+
+    try:
+        return decode(shape_ser)
+    except Exception:
+        raise _not_serializable(shape_ser)
+
+
+def to_shapes(shape_sers, shape_format=None):
+    """ Deserializes a column of shapes into an array of Shapely objects.
+
+        The format is detected from the first rows (or taken from
+        shape_format) and every matching row is decoded in one vectorized
+        call. When the format was detected, rows that don't match it are
+        sniffed and decoded individually. When it was provided, they raise a
+        TypeError.
+    """
+    shape_arr = np.empty(len(shape_sers), dtype=object)
+    shape_arr[:] = shape_sers
+
+    if shape_format is None:
+        strict = False
+        shape_format = detect_shape_format(shape_arr)
     else:
-        raise TypeError(
-            "{} is not serializable to a shape.".format(str(shape_ser))
+        strict = True
+        _check_shape_format(shape_format)
+
+    shapes = np.empty(len(shape_arr), dtype=object)
+    if shape_format is not None:
+        matches, _, decode_array = _SHAPE_FORMATS[shape_format]
+        matching = np.fromiter(
+            (matches(s) for s in shape_arr),
+            dtype=bool,
+            count=len(shape_arr),
+        )
+        if matching.any():
+            shapes[matching] = decode_array(shape_arr[matching])
+
+    # Whatever didn't come out of the bulk decoder goes through the scalar
+    # path, which also raises the TypeError for unparseable values.
+    for ii in np.flatnonzero(is_missing(shapes)):
+        shapes[ii] = to_shape(
+            shape_arr[ii], shape_format=shape_format if strict else None
         )
 
-    return shape_obj
+    return shapes
 
 
 @curry
-def _add_shape(sd, shape_obj):
-    return assoc(sd, "shape_obj", shape_obj)
+def _load_shapes(project, shape_format, shape_sers):
+    shapes = to_shapes(shape_sers, shape_format=shape_format)
+    # Project to web mercator if required.
+    return lla_to_merc(shapes) if project else shapes
 
 
-def extract_geometries(shape_data, project=True):
-    """ Enhances the shape data by adding a 'shape_obj' field with the shapely
-        object, and splits data into points and polygons.
-    """
-    points = []
-    linestrings = []
-    polygons = []
-    for sd in shape_data:
-        add_shape = _add_shape(sd)
-        # Deserialize the shape.
-        shape_obj = to_shape(sd["shape"])
-        # Project to web mercator if required.
-        if project:
-            shape_obj = lla_to_merc(shape_obj)
-        if isinstance(shape_obj, Point):
-            points.append(add_shape(shape_obj))
-        elif isinstance(shape_obj, MultiPoint):
-            # Multipoints aren't supported in Bokeh so we have to convert.
-            for point in shape_obj:
-                points.append(add_shape(point))
-        elif isinstance(shape_obj, (Polygon, MultiPolygon)):
-            polygons.append(add_shape(shape_obj))
-        elif isinstance(shape_obj, (MultiLineString, LineString)):
-            linestrings.append(add_shape(shape_obj))
+def _records_to_columns(records):
+    """ Turns a list of dicts into object array columns, along with a mask
+        per column saying which rows actually had the key.
+    """
+    columns = {}
+    present = {}
+    for ii, record in enumerate(records):
+        for key, value in record.items():
+            if key not in columns:
+                columns[key] = np.full(len(records), None, dtype=object)
+                present[key] = np.zeros(len(records), dtype=bool)
+            columns[key][ii] = value
+            present[key][ii] = True
+    return columns, present
+
+
+def _layer_table(shapes, rows, columns, present):
+    # Only keep the columns that at least one row of the layer had.
+    properties = {
+        name: column[rows]
+        for name, column in columns.items()
+        if present[name][rows].any()
+    }
+    return GeometryTable.from_shapes(shapes, properties)
+
+
+class BoundsAccumulator:
+    """ Keeps a running (minx, miny, maxx, maxy) over everything it's updated
+        with, so bounds can be collected while streaming.
+    """
+
+    def __init__(self):
+        self.minx = self.miny = np.inf
+        self.maxx = self.maxy = -np.inf
+
+    def update(self, bounds):
+        """ Merges a (minx, miny, maxx, maxy) tuple into the running bounds.
+            None is ignored.
+        """
+        if bounds is None:
+            return
+        minx, miny, maxx, maxy = bounds
+        self.minx = min(self.minx, minx)
+        self.miny = min(self.miny, miny)
+        self.maxx = max(self.maxx, maxx)
+        self.maxy = max(self.maxy, maxy)
+
+    @property
+    def bounds(self):
+        """ The bounds so far, or None if nothing has been seen.
+        """
+        if self.minx > self.maxx:
+            return None
+        return (self.minx, self.miny, self.maxx, self.maxy)
+
+
+def _extract_chunk(shape_data, project, shape_format, shape_cache):
+    columns, present = _records_to_columns(shape_data)
+    shape_sers = columns.pop("shape", np.empty(0, dtype=object))
+    present.pop("shape", None)
+
+    load_shapes = _load_shapes(project, shape_format)
+    if shape_cache is None:
+        shapes = load_shapes(shape_sers)
+    else:
+        shapes = shape_cache.get_many(
+            shape_sers, project, load_shapes, shape_format
+        )
+
+    return _split_layers(shapes, columns, present)
+
+
+def _split_layers(shapes, columns, present):
+    """ Splits an array of shapes, with a property column and a mask of the
+        rows that have it for every property, into (points, linestrings,
+        polygons) GeometryTables.
+    """
+    # Empty shapes can't be drawn, so they're dropped.
+    type_ids = np.where(is_empty(shapes), -1, get_type_id(shapes))
+
+    # Multipoints aren't supported in Bokeh so we have to split them. Plain
+    # points come back from get_parts as themselves, so order is preserved.
+    point_rows = np.flatnonzero(
+        np.isin(type_ids, [GeometryType.POINT, GeometryType.MULTIPOINT])
+    )
+    point_shapes, point_parts = get_parts(
+        shapes[point_rows], return_index=True
+    )
+    points = _layer_table(
+        point_shapes, point_rows[point_parts], columns, present
+    )
+
+    linestring_rows = np.flatnonzero(
+        np.isin(
+            type_ids, [GeometryType.LINESTRING, GeometryType.MULTILINESTRING]
+        )
+    )
+    linestrings = _layer_table(
+        shapes[linestring_rows], linestring_rows, columns, present
+    )
+
+    polygon_rows = np.flatnonzero(
+        np.isin(type_ids, [GeometryType.POLYGON, GeometryType.MULTIPOLYGON])
+    )
+    polygons = _layer_table(
+        shapes[polygon_rows], polygon_rows, columns, present
+    )
 
     return points, linestrings, polygons
 
 
-def get_bounds(shape_data):
-    """ Gets the bounds of the shapes. Shapes are shape data dictionaries with
-        the actual shape in 'shape_obj'.
+def _pool_map(func, items, workers):
+    """ Maps func over items in a pool of worker processes, yielding the
+        results in input order. Unlike Pool.imap only a couple of items per
+        worker are taken from items ahead of the results, so a stream isn't
+        read into memory faster than it's processed.
+    """
+    with Pool(workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def iter_geometry_tables(
+    shape_data,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+):
+    """ Streams any iterable of shape data dicts (a list, a CSV reader...) in
+        chunks of chunk_size rows, yielding a (points, linestrings, polygons)
+        tuple of GeometryTables per chunk. If a BoundsAccumulator is
+        provided it's updated with every chunk, so the bounds are available
+        once the stream is exhausted.
+
+        With more than one worker the chunks are parsed and projected in a
+        pool of that many processes, which send back the compact tables
+        rather than Shapely objects, still in input order. The workers
+        don't share the shape cache, so it's only used without them.
+
+        Shape data that knows a faster way to its tables (like the readers
+        in map_maker.readers, which split files for the workers or read
+        columns without building dicts) does so through its own
+        iter_geometry_tables method, which takes the same arguments.
+    """
+    chunks = partition_all(chunk_size, shape_data)
+    if hasattr(shape_data, "iter_geometry_tables"):
+        chunk_tables = shape_data.iter_geometry_tables(
+            project=project,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            workers=workers,
+        )
+    elif workers is not None and workers > 1:
+        extract = curry(
+            _extract_chunk,
+            project=project,
+            shape_format=shape_format,
+            shape_cache=None,
+        )
+        chunk_tables = _pool_map(extract, chunks, workers)
+    else:
+        chunk_tables = (
+            _extract_chunk(chunk, project, shape_format, shape_cache)
+            for chunk in chunks
+        )
+
+    for tables in chunk_tables:
+        if bounds is not None:
+            for table in tables:
+                bounds.update(table.bounds())
+        yield tables
+
+
+def iter_geometries(
+    shape_data,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+):
+    """ Streams the shape data like iter_geometry_tables, but yields
+        ("points" | "linestrings" | "polygons", record) pairs, where each
+        record is a dict of the fields with a 'shape_obj' field holding the
+        Shapely object.
+    """
+    for tables in iter_geometry_tables(
+        shape_data,
+        project=project,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        bounds=bounds,
+        workers=workers,
+    ):
+        for layer, table in zip(LAYERS, tables):
+            for record in table.to_records():
+                yield layer, record
+
+
+def extract_geometry_tables(
+    shape_data,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+):
+    """ Parses (and projects) the shapes in the shape data and splits them
+        into point, linestring and polygon GeometryTables. Every field other
+        than 'shape' becomes a property column. The shape format is detected
+        from the data unless shape_format is provided. If a ShapeCache is
+        provided, repeated shapes are only parsed and projected once.
+
+        The shape data can be any iterable, it's consumed in chunks of
+        chunk_size rows so only the compact tables are kept. If a
+        BoundsAccumulator is provided it collects the bounds along the way.
+        With more than one worker the chunks are parsed in a pool of
+        processes, see iter_geometry_tables.
+    """
+    chunks = list(
+        iter_geometry_tables(
+            shape_data,
+            project=project,
+            shape_format=shape_format,
+            shape_cache=shape_cache,
+            chunk_size=chunk_size,
+            bounds=bounds,
+            workers=workers,
+        )
+    )
+    if not chunks:
+        chunks = [_extract_chunk([], project, shape_format, shape_cache)]
+
+    return tuple(GeometryTable.concat(layer) for layer in zip(*chunks))
+
+
+def _point_table(coords, properties):
+    """ Builds a table of single points straight from their coordinates.
+    """
+    offsets = np.arange(len(coords) + 1)
+    return GeometryTable(
+        np.full(len(coords), GeometryType.POINT, dtype=np.int8),
+        coords,
+        offsets,
+        offsets,
+        offsets,
+        properties,
+    )
+
+
+def aggregate_geometry_tables(
+    shape_data,
+    make_aggregator,
+    project=True,
+    shape_format=None,
+    shape_cache=None,
+    chunk_size=100000,
+    bounds=None,
+    workers=None,
+    columns=(),
+):
+    """ Streams the shape data's points into an aggregator, while collecting
+        the linestrings and polygons as GeometryTables. make_aggregator is
+        called with the bounds and returns an object with an update method
+        that takes each chunk's point table, so only the aggregate is kept
+        for the points.
+
+        The data is read once. Without bounds (a (minx, miny, maxx, maxy)
+        tuple in the coordinates of the tables) the aggregator can't be
+        made until the data is exhausted, so until then only the point
+        coordinates and the property columns the aggregator reads are
+        kept, rather than the points being parsed twice.
+
+        Returns the aggregator, the linestrings and polygons tables and
+        the bounds of everything.
+    """
+    accumulator = BoundsAccumulator()
+    linestrings, polygons = [], []
+    aggregator = None
+    pending = []
+    if bounds is not None:
+        aggregator = make_aggregator(bounds)
+        accumulator.update(bounds)
+
+    for points, chunk_linestrings, chunk_polygons in iter_geometry_tables(
+        shape_data,
+        project=project,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+        chunk_size=chunk_size,
+        bounds=accumulator,
+        workers=workers,
+    ):
+        linestrings.append(chunk_linestrings)
+        polygons.append(chunk_polygons)
+        if aggregator is not None:
+            aggregator.update(points)
+        elif len(points):
+            pending.append(
+                (
+                    points.coords,
+                    {
+                        name: points.properties[name]
+                        for name in columns
+                        if name in points.properties
+                    },
+                )
+            )
+
+    if aggregator is None:
+        if accumulator.bounds is None:
+            raise ValueError("There are no shapes to map.")
+        aggregator = make_aggregator(accumulator.bounds)
+        # The pending points are dropped as they're aggregated.
+        pending.reverse()
+        while pending:
+            aggregator.update(_point_table(*pending.pop()))
+
+    return (
+        aggregator,
+        GeometryTable.concat(linestrings),
+        GeometryTable.concat(polygons),
+        accumulator.bounds,
+    )
+
+
+# The property extract_geometries numbers the rows with.
+_ROW = "__row__"
+
+
+def extract_geometries(
+    shape_data, project=True, shape_format=None, shape_cache=None
+):
+    """ Enhances the shape data by adding a 'shape_obj' field with the shapely
+        object, and splits data into points and polygons. The shape format is
+        detected from the data unless shape_format is provided. If a
+        ShapeCache is provided, repeated shapes are only parsed and projected
+        once.
+
+        This is a dict adapter over extract_geometry_tables. Every record
+        has the keys of the row it came from, including the raw 'shape'
+        value (shared by the points of a multipoint), and none of the keys
+        only other rows had.
+    """
+    shape_data = list(shape_data)
+    # The row number rides along as a property, to find the source rows.
+    rows = ({**sd, _ROW: ii} for ii, sd in enumerate(shape_data))
+    layers = []
+    for table in extract_geometry_tables(
+        rows,
+        project=project,
+        shape_format=shape_format,
+        shape_cache=shape_cache,
+    ):
+        # Empty tables don't have the row column.
+        row_ids = table.properties[_ROW].tolist() if len(table) else []
+        layers.append(
+            [
+                {**shape_data[row], "shape_obj": shape_obj}
+                for row, shape_obj in zip(row_ids, table.to_shapes())
+            ]
+        )
+    return tuple(layers)
+
+
+def _layer_bounds(layer, chunk_size=65536):
+    if isinstance(layer, GeometryTable):
+        return layer.bounds()
+
+    # Dicts are reduced a chunk at a time to keep the temporary arrays small.
+    bounds = BoundsAccumulator()
+    for chunk in partition_all(chunk_size, layer):
+        chunk_bounds = shape_bounds(
+            np.array([sd["shape_obj"] for sd in chunk], dtype=object)
+        )
+        # Empty shapes have NaN bounds.
+        chunk_bounds = chunk_bounds[~np.isnan(chunk_bounds).any(axis=1)]
+        if len(chunk_bounds):
+            bounds.update(
+                (
+                    *chunk_bounds[:, :2].min(axis=0),
+                    *chunk_bounds[:, 2:].max(axis=0),
+                )
+            )
+    return bounds.bounds
+
+
+def get_bounds(*shape_data):
+    """ Gets the bounds of one or more layers of shapes (i.e. points,
+        linestrings and polygons). Each layer is either a GeometryTable or
+        shape data dictionaries with the actual shape in 'shape_obj'. The
+        layers are reduced one at a time and merged, without concatenating
+        them. Returns None if there are no shapes.
+    """
+    bounds = BoundsAccumulator()
+    for layer in shape_data:
+        bounds.update(_layer_bounds(layer))
+    return bounds.bounds
+
+
+def to_property_columns(table, default_color, default_alpha, default_size):
+    """ Returns the property columns of a GeometryTable with the "color",
+        "alpha" and "size" defaults filled in where they're missing, and
+        alpha and size converted to float arrays.
     """
 
-    bounds_arr = np.array([sd["shape_obj"].bounds for sd in shape_data])
-    minx = bounds_arr[:, 0].min()
-    miny = bounds_arr[:, 1].min()
-    maxx = bounds_arr[:, 2].max()
-    maxy = bounds_arr[:, 3].max()
-    return (minx, miny, maxx, maxy)
+    def _fill(name, default):
+        if name not in table.properties:
+            return np.full(len(table), default, dtype=object)
+        column = table.properties[name]
+        if column.dtype == object:
+            column = np.where(np.equal(column, None), default, column)
+        return column
+
+    return {
+        **table.properties,
+        "color": _fill("color", default_color),
+        "alpha": _fill("alpha", default_alpha).astype(float),
+        "size": _fill("size", default_size).astype(float),
+    }
+
+
+def _table_features(table, default_color, default_alpha, default_size):
+    n = len(table)
+
+    def _column(name, default):
+        if name not in table.properties:
+            return [default] * n
+        return [
+            default if value is None else value
+            for value in table.properties[name].tolist()
+        ]
+
+    colors = _column("color", default_color)
+    alphas = _column("alpha", default_alpha)
+    sizes = _column("size", default_size)
+    names = [
+        name
+        for name in table.properties
+        if name not in ("shape", "shape_obj", "color", "size", "alpha")
+    ]
+    columns = [table.properties[name].tolist() for name in names]
+
+    return [
+        {
+            "type": "Feature",
+            "properties": {
+                "color": color,
+                "alpha": float(alpha),
+                "size": float(size),
+                **dict(zip(names, values)),
+            },
+            "geometry": geometry,
+        }
+        for geometry, color, alpha, size, *values in zip(
+            table.geometry_mappings(), colors, alphas, sizes, *columns
+        )
+    ]
 
 
 def to_geojson(shape_data, default_color, default_alpha, default_size):
-    """ Turns the provided shape data dictionaries into GeoJSON strings. Adds
-        default "color", "alpha", and "size" properties if they aren't present.
+    """ Turns the provided shape data dictionaries (or GeometryTable) into
+        GeoJSON strings. Adds default "color", "alpha", and "size" properties
+        if they aren't present.
     """
+    if isinstance(shape_data, GeometryTable):
+        return {
+            "type": "FeatureCollection",
+            "features": _table_features(
+                shape_data, default_color, default_alpha, default_size
+            ),
+        }
+
     return {
         "type": "FeatureCollection",
         "features": [
@@ -153,3 +793,145 @@ def to_geojson(shape_data, default_color, default_alpha, default_size):
             for sd in shape_data
         ],
     }
+
+
+_FEATURE = '{{"type":"Feature","properties":{{{}}},"geometry":{}}}'
+
+# Fields that are either the geometry or handled as the special numeric
+# properties.
+_NON_PROPERTIES = ("shape", "shape_obj", "color", "size", "alpha")
+
+
+def _get_encoder(encoder):
+    if isinstance(encoder, JSONEncoder):
+        return encoder
+    return JSONEncoder(encoder)
+
+
+def _iter_table_features(
+    table, default_color, default_alpha, default_size, encoder
+):
+    n = len(table)
+
+    def _column(name, default, convert=identity):
+        if name not in table.properties:
+            return repeat(encoder.encode(convert(default)), n)
+        column = table.properties[name]
+        if column.dtype == object:
+            column = [
+                convert(default if value is None else value)
+                for value in column.tolist()
+            ]
+        elif convert is float:
+            column = column.astype(float)
+        return encoder.encode_many(column)
+
+    names = [name for name in table.properties if name not in _NON_PROPERTIES]
+    keys = [encoder.encode(name) + ":" for name in names]
+    columns = [encoder.encode_many(table.properties[name]) for name in names]
+
+    # The feature template for this table, with the property keys baked in.
+    feature = "".join(
+        [
+            '{"type":"Feature","properties":{"color":%s,"alpha":%s,"size":%s',
+            *("," + key.replace("%", "%%") + "%s" for key in keys),
+            '},"geometry":%s}',
+        ]
+    )
+    for values in zip(
+        _column("color", default_color),
+        _column("alpha", default_alpha, float),
+        _column("size", default_size, float),
+        *columns,
+        geometries_to_geojson(table.to_shapes()),
+    ):
+        yield feature % values
+
+
+def _iter_record_features(
+    shape_data,
+    default_color,
+    default_alpha,
+    default_size,
+    encoder,
+    chunk_size=4096,
+):
+    encode = encoder.encode
+    for chunk in partition_all(chunk_size, shape_data):
+        geometries = geometries_to_geojson(
+            np.array([sd["shape_obj"] for sd in chunk], dtype=object)
+        )
+        for sd, geometry in zip(chunk, geometries):
+            alpha = float(get("alpha", sd, default_alpha))
+            size = float(get("size", sd, default_size))
+            properties = ",".join(
+                [
+                    '"color":' + encode(get("color", sd, default_color)),
+                    '"alpha":' + encode(alpha),
+                    '"size":' + encode(size),
+                    *(
+                        encode(k) + ":" + encode(v)
+                        for k, v in sd.items()
+                        if k not in _NON_PROPERTIES
+                    ),
+                ]
+            )
+            yield _FEATURE.format(properties, geometry)
+
+
+def iter_geojson_features(
+    shape_data, default_color, default_alpha, default_size, encoder="auto"
+):
+    """ Generates the GeoJSON features for the shape data dictionaries (or
+        GeometryTable) as JSON strings, with the same content as to_geojson
+        but without building a dict per feature. The geometries are written
+        by GEOS, the properties by the encoder (a JSONEncoder or the name of
+        one).
+    """
+    encoder = _get_encoder(encoder)
+    if isinstance(shape_data, GeometryTable):
+        return _iter_table_features(
+            shape_data, default_color, default_alpha, default_size, encoder
+        )
+    return _iter_record_features(
+        shape_data, default_color, default_alpha, default_size, encoder
+    )
+
+
+def write_geojson(
+    shape_data,
+    fp,
+    default_color,
+    default_alpha,
+    default_size,
+    encoder="auto",
+):
+    """ Writes the shape data dictionaries (or GeometryTable) to a file-like
+        object as a GeoJSON FeatureCollection, one feature at a time.
+    """
+    fp.write('{"type":"FeatureCollection","features":[')
+    for ii, feature in enumerate(
+        iter_geojson_features(
+            shape_data, default_color, default_alpha, default_size, encoder
+        )
+    ):
+        if ii:
+            fp.write(",")
+        fp.write(feature)
+    fp.write("]}")
+
+
+def dumps_geojson(
+    shape_data, default_color, default_alpha, default_size, encoder="auto"
+):
+    """ Serializes the shape data dictionaries (or GeometryTable) straight to
+        a GeoJSON FeatureCollection string. Equivalent to
+        json.dumps(to_geojson(...)) without the intermediate dicts.
+    """
+    return '{{"type":"FeatureCollection","features":[{}]}}'.format(
+        ",".join(
+            iter_geojson_features(
+                shape_data, default_color, default_alpha, default_size, encoder
+            )
+        )
+    )
@@ -0,0 +1,205 @@
+"""
+Copyright 2020 Expedia, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    https://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import numpy as np
+
+from shapely import STRtree, box, is_empty, simplify
+
+from .geometry_table import GeometryTable, _ranges
+from .simplify import pixel_tolerance
+
+# About how many points share a cell of the point grid, and the most cells
+# along a side.
+_POINTS_PER_CELL = 16
+_MAX_GRID_SIZE = 1024
+
+
+class ViewportIndex:
+    """ Keeps the full point, linestring and polygon tables behind spatial
+    indexes, and returns just what's visible in a viewport.
+
+    The points are bucketed into a uniform grid of cells over their extent
+    (the points attribute is sorted by cell), so a viewport only looks at
+    the points of the cells it overlaps, and the linestrings and polygons
+    are in STR trees. Queries cost about what's visible rather than the
+    whole dataset, however the view and the data are shaped.
+
+    Parameters
+    ----------
+    points : :obj:`map_maker.util.GeometryTable`
+        The points, one per row.
+
+    linestrings : :obj:`map_maker.util.GeometryTable`
+        The linestrings.
+
+    polygons : :obj:`map_maker.util.GeometryTable`
+        The polygons.
+    """
+
+    def __init__(self, points, linestrings, polygons):
+        self._grid_size = int(
+            np.clip(
+                np.sqrt(len(points) / _POINTS_PER_CELL), 1, _MAX_GRID_SIZE
+            )
+        )
+        self._grid_bounds = points.bounds() or (0.0, 0.0, 1.0, 1.0)
+        cells = self._cells(points.coords)
+        order = np.argsort(cells, kind="stable")
+        self.points = points.take(order)
+        # The points of cell i are rows _cell_offsets[i]:_cell_offsets[i+1].
+        self._cell_offsets = np.searchsorted(
+            cells[order], np.arange(self._grid_size ** 2 + 1)
+        )
+        self.linestrings = linestrings
+        self.polygons = polygons
+
+        self._shapes = {}
+        self._trees = {}
+        for name, table in (
+            ("linestrings", linestrings),
+            ("polygons", polygons),
+        ):
+            self._shapes[name] = table.to_shapes()
+            self._trees[name] = STRtree(self._shapes[name])
+
+    def _cell_index(self, values, axis):
+        """ The grid column (axis 0) or row (axis 1) of coordinates,
+            clipped to the grid.
+        """
+        low = self._grid_bounds[axis]
+        size = self._grid_bounds[axis + 2] - low
+        if size <= 0:
+            return np.zeros(np.shape(values), dtype=np.int64)
+        index = np.floor((values - low) / size * self._grid_size)
+        return np.clip(index, 0, self._grid_size - 1).astype(np.int64)
+
+    def _cells(self, coords):
+        ix = self._cell_index(coords[:, 0], 0)
+        iy = self._cell_index(coords[:, 1], 1)
+        return iy * self._grid_size + ix
+
+    def _candidate_rows(self, bounds):
+        """ The point rows in the grid cells bounds overlaps: a slice per
+            grid row.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        grid_min_x, grid_min_y, grid_max_x, grid_max_y = self._grid_bounds
+        outside_x = max_x < grid_min_x or min_x > grid_max_x
+        outside_y = max_y < grid_min_y or min_y > grid_max_y
+        if outside_x or outside_y:
+            return np.empty(0, dtype=np.int64)
+        ix0, ix1 = self._cell_index(np.array([min_x, max_x]), 0)
+        iy0, iy1 = self._cell_index(np.array([min_y, max_y]), 1)
+        first_cells = np.arange(iy0, iy1 + 1) * self._grid_size + ix0
+        return _ranges(
+            self._cell_offsets[first_cells],
+            self._cell_offsets[first_cells + (ix1 - ix0) + 1],
+        )
+
+    def bounds(self):
+        """ Returns the (minx, miny, maxx, maxy) bounds of everything, or
+            None if there's nothing.
+        """
+        corners = [
+            table.bounds()
+            for table in (self.points, self.linestrings, self.polygons)
+        ]
+        corners = np.array([c for c in corners if c is not None])
+        if not len(corners):
+            return None
+        return (
+            *corners[:, :2].min(axis=0).tolist(),
+            *corners[:, 2:].max(axis=0).tolist(),
+        )
+
+    def query_points(self, bounds, plot_width=None, plot_height=None):
+        """ Returns the points inside bounds as a GeometryTable. If the plot
+            size is given, only the first point in every pixel is kept,
+            which looks the same but caps the points at one per pixel.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        rows = self._candidate_rows(bounds)
+        x, y = self.points.coords[rows].T
+        rows = rows[
+            (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+        ]
+
+        if plot_width is not None and len(rows):
+            coords = self.points.coords[rows]
+            ix = (coords[:, 0] - min_x) / (max_x - min_x) * plot_width
+            iy = (coords[:, 1] - min_y) / (max_y - min_y) * plot_height
+            # The max edges get their own pixel, hence the + 1.
+            pixels = iy.astype(np.int64) * (plot_width + 1) + ix.astype(
+                np.int64
+            )
+            _, first = np.unique(pixels, return_index=True)
+            rows = rows[np.sort(first)]
+
+        return self.points.take(rows)
+
+    def query_shapes(
+        self,
+        name,
+        bounds,
+        plot_width=None,
+        plot_height=None,
+        preserve_topology=True,
+    ):
+        """ Returns the linestrings or polygons (by name) intersecting bounds
+            as a GeometryTable. If the plot size is given they're simplified
+            to about a pixel, dropping those that simplify away.
+        """
+        table = getattr(self, name)
+        rows = np.sort(
+            self._trees[name].query(box(*bounds), predicate="intersects")
+        )
+        shapes = self._shapes[name][rows]
+        if plot_width is not None and len(rows):
+            shapes = simplify(
+                shapes,
+                pixel_tolerance(bounds, plot_width, plot_height),
+                preserve_topology=preserve_topology,
+            )
+            keep = ~is_empty(shapes)
+            shapes, rows = shapes[keep], rows[keep]
+        return GeometryTable.from_shapes(
+            shapes,
+            {
+                column: values[rows]
+                for column, values in table.properties.items()
+            },
+        )
+
+    def query(
+        self, bounds, plot_width=None, plot_height=None, preserve_topology=True
+    ):
+        """ Returns the visible points, linestrings and polygons in bounds
+            as GeometryTables, reduced to screen resolution if the plot size
+            is given.
+        """
+        return (
+            self.query_points(bounds, plot_width, plot_height),
+            self.query_shapes(
+                "linestrings",
+                bounds,
+                plot_width,
+                plot_height,
+                preserve_topology,
+            ),
+            self.query_shapes(
+                "polygons", bounds, plot_width, plot_height, preserve_topology
+            ),
+        )
@@ -30,10 +30,16 @@ setup(
         "click>=7.0",
         "toolz>=0.9",
         "bokeh>=1.1.0",
-        "Shapely>=1.6.4.post2",
-        "pyproj>=1.9.5.1,<2",
+        "numpy>=1.17",
+        "Shapely>=2.0",
+        "pyproj>=2.1",
         "folium>=0.10.0,<1",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0"],
+        "tiles": ["mapbox-vector-tile>=2.0"],
+        "parquet": ["pyarrow>=8.0"],
+    },
     entry_points={"console_scripts": ["map_maker=map_maker.cli:cli"]},
     cmdclass=versioneer.get_cmdclass(),
     long_description=README,
@@ -44,7 +50,6 @@ setup(
         # From https://pypi.org/classifiers/
         "Development Status :: 4 - Beta",
         "License :: OSI Approved :: Apache Software License",
-        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
         "Programming Language :: Python :: 3.8",
     ],
@@ -0,0 +1,121 @@
+import numpy as np
+
+from shapely.geometry import Point, box
+
+from map_maker.util import ShapeCache, extract_geometries, to_shapes
+
+
+def test_shape_cache_get_many():
+    """ Tests that the get_many method only loads each distinct shape once
+        and counts hits and misses.
+    """
+    loaded = []
+
+    def load(shape_sers):
+        loaded.extend(shape_sers)
+        return to_shapes(shape_sers)
+
+    cache = ShapeCache()
+    shape_sers = ["POINT (0 0)", "POINT (1 1)", "POINT (0 0)"]
+
+    first = cache.get_many(shape_sers, False, load)
+    second = cache.get_many(shape_sers, False, load)
+
+    assert list(first) == [Point(0, 0), Point(1, 1), Point(0, 0)]
+    assert list(second) == list(first)
+    assert loaded == ["POINT (0 0)", "POINT (1 1)"]
+    assert cache.misses == 2
+    assert cache.hits == 4
+    assert len(cache) == 2
+
+
+def test_shape_cache_key_project():
+    """ Tests that the cache key depends on the projection flag and the type
+        of the raw value.
+    """
+    cache = ShapeCache()
+
+    assert cache.key("POINT (0 0)", True) != cache.key("POINT (0 0)", False)
+    assert cache.key("POINT (0 0)", True) == cache.key("POINT (0 0)", True)
+    assert cache.key("abc", True) != cache.key(b"abc", True)
+    assert cache.key({"coordinates": np.zeros(2)}, True) is None
+
+
+def test_shape_cache_key_shape_format():
+    """ Tests that the same raw value decoded as different shape formats
+        gets different cache entries.
+    """
+    cache = ShapeCache()
+    shape_ser = "0101000000000000000000F03F0000000000000040"
+
+    assert cache.key(shape_ser, True, "hexwkb") != cache.key(
+        shape_ser, True, "wkt"
+    )
+    assert cache.key(shape_ser, True, "hexwkb") != cache.key(shape_ser, True)
+    cache.get_many([shape_ser], False, to_shapes, "hexwkb")
+    cache.get_many([shape_ser], False, to_shapes, "hexwkb")
+    cache.get_many([shape_ser], False, to_shapes, "wkt")
+    assert cache.info().misses == 2
+
+
+def test_shape_cache_uncacheable():
+    """ Tests that values that can't be hashed by content are still loaded
+        but aren't cached.
+    """
+    cache = ShapeCache()
+    shape_sers = [
+        {"type": "Point", "coordinates": np.zeros(2)},
+        "POINT (1 1)",
+    ]
+
+    answer = cache.get_many(shape_sers, False, to_shapes)
+
+    assert list(answer) == [Point(0, 0), Point(1, 1)]
+    assert len(cache) == 1
+
+
+def test_shape_cache_max_bytes():
+    """ Tests that the least recently used shapes are evicted when the cache
+        is over max_bytes.
+    """
+    cache = ShapeCache(max_bytes=1000)
+    for ii in range(10):
+        cache.put(cache.key(str(ii), False), box(ii, ii, ii + 1, ii + 1))
+
+    assert cache.nbytes <= 1000
+    assert len(cache) < 10
+    assert cache.key("9", False) in cache._shapes
+    assert cache.key("0", False) not in cache._shapes
+
+
+def test_shape_cache_clear():
+    """ Tests that the clear method empties the cache and resets the
+        counters.
+    """
+    cache = ShapeCache()
+    cache.get_many(["POINT (0 0)", "POINT (0 0)"], False, to_shapes)
+    cache.clear()
+
+    assert cache.info() == (0, 0, 0, 0, cache.max_bytes)
+
+
+def test_extract_geometries_shape_cache():
+    """ Tests that the extract_geometries function returns the same result
+        with a cache, and parses the repeated shape once.
+    """
+    shape_data = [
+        {"shape": "POINT (1.0 1.0)", "x": 1},
+        {"shape": "POLYGON ((0 0, 1 0, 1 1, 0 0))", "x": 2},
+        {"shape": "POLYGON ((0 0, 1 0, 1 1, 0 0))", "x": 3},
+    ]
+    cache = ShapeCache()
+
+    truth = extract_geometries(shape_data)
+    answer = extract_geometries(shape_data, shape_cache=cache)
+
+    assert truth == answer
+    # The records are rebuilt from the geometry tables, so the repeated
+    # polygon is parsed once but comes back as equal, not shared, objects.
+    assert answer[2][0]["shape_obj"].equals(answer[2][1]["shape_obj"])
+    assert cache.misses == 2
+    assert cache.hits == 1
@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+
+from map_maker.util import (
+    ClusterIndex,
+    cluster_columns,
+    lla_to_merc,
+    zoom_for_extent,
+)
+from map_maker.util.cluster import MERC_HALF_WORLD
+from shapely import get_coordinates
+from shapely.geometry import Point
+
+
+@pytest.fixture()
+def coords():
+    """ Fixture with four Web Mercator points, two of which share a cell at
+        zoom level 1 and all but the first two share a cell at zoom level 0
+        (with 128 pixel cells).
+    """
+    coords = np.array([[-0.9, -0.9], [-0.8, -0.8], [0.1, 0.1], [0.6, 0.6]])
+    return coords * MERC_HALF_WORLD
+
+
+def test_cluster_index(coords):
+    """ Tests that the ClusterIndex merges the points sharing a grid cell
+        at each zoom level into clusters at their centroids.
+    """
+    index = ClusterIndex(coords, max_zoom=1, radius=128, max_ratio=1)
+
+    zoom_1 = index.get_level(1)
+    zoom_0 = index.get_level(0)
+
+    assert sorted(zoom_1.counts.tolist()) == [1, 1, 2]
+    assert zoom_0.counts.tolist() == [2, 2]
+    np.testing.assert_allclose(
+        zoom_0.coords / MERC_HALF_WORLD, [[-0.85, -0.85], [0.35, 0.35]]
+    )
+
+
+def test_cluster_index_get_level(coords):
+    """ Tests that the get_level method clamps to the indexed zoom levels and
+        returns the individual points above max_zoom.
+    """
+    index = ClusterIndex(coords, min_zoom=1, max_zoom=1, radius=128)
+
+    assert index.get_level(0) is index.get_level(1)
+    assert index.get_level(5).counts.tolist() == [1, 1, 1, 1]
+    np.testing.assert_array_equal(index.get_level(5).coords, coords)
+
+
+def test_cluster_index_counts():
+    """ Tests that every level accounts for all of the points, and that the
+        levels only shrink as the zoom level goes down.
+    """
+    rng = np.random.default_rng(0)
+    coords = rng.normal(0.0, 1e5, size=(10000, 2))
+
+    index = ClusterIndex(coords)
+    sizes = [len(index.get_level(zoom).counts) for zoom in range(18)]
+
+    assert all(
+        index.get_level(zoom).counts.sum() == 10000 for zoom in range(18)
+    )
+    assert sizes == sorted(sizes)
+
+
+def test_cluster_index_project():
+    """ Tests that lon / lat coordinates are binned in Web Mercator but the
+        clusters stay in lon / lat.
+    """
+    lla = np.array([[-97.0, 32.0], [-97.0001, 32.0001], [10.0, 50.0]])
+    merc = get_coordinates(lla_to_merc([Point(*c) for c in lla]))
+
+    answer = ClusterIndex(lla, project=True, max_ratio=1).get_level(10)
+    truth = ClusterIndex(merc, max_ratio=1).get_level(10)
+
+    assert answer.counts.tolist() == truth.counts.tolist()
+    np.testing.assert_allclose(answer.coords[:, 0], [-97.00005, 10.0])
+
+
+def test_cluster_index_raw_zoom():
+    """ Tests that the ClusterIndex stops at the first zoom level with at
+        least max_ratio times as many clusters as points, and returns the
+        individual points from there up.
+    """
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(-1e6, 1e6, size=(10000, 2))
+
+    index = ClusterIndex(coords, max_zoom=16)
+    sizes = [len(index.get_level(zoom).counts) for zoom in range(17)]
+
+    assert index.raw_zoom < 16
+    assert max(index.levels) == index.raw_zoom - 1
+    assert len(index.levels[index.raw_zoom - 1].counts) < 5000
+    assert index.get_level(index.raw_zoom) is index.get_level(16)
+    assert sizes[index.raw_zoom :] == [10000] * (17 - index.raw_zoom)
+
+    columns, offsets = cluster_columns(
+        index,
+        {
+            "color": np.full(10000, "red", dtype=object),
+            "alpha": np.ones(10000),
+            "size": np.ones(10000),
+        },
+        "black",
+        0.3,
+        2,
+    )
+
+    assert len(offsets) == index.raw_zoom + 2
+    assert len(columns["x"]) < 2 * 10000
+
+
+def test_cluster_index_empty():
+    """ Tests that the ClusterIndex can index no points.
+    """
+    index = ClusterIndex(np.empty((0, 2)))
+
+    assert len(index) == 0
+    assert len(index.get_level(3).counts) == 0
+
+
+def test_cluster_index_bad_zooms():
+    """ Tests that the ClusterIndex raises a ValueError when min_zoom is
+        larger than max_zoom.
+    """
+    with pytest.raises(ValueError):
+        ClusterIndex(np.zeros((1, 2)), min_zoom=5, max_zoom=4)
+
+
+def test_cluster_columns(coords):
+    """ Tests that the cluster_columns function stacks the levels with the
+        defaults for clusters and the point styles for the points.
+    """
+    index = ClusterIndex(coords, max_zoom=1, radius=128, max_ratio=1)
+    point_columns = {
+        "color": np.array(["red"] * 4, dtype=object),
+        "alpha": np.ones(4),
+        "size": np.full(4, 3.0),
+    }
+
+    columns, offsets = cluster_columns(index, point_columns, "black", 0.3, 2)
+
+    assert offsets.tolist() == [0, 2, 5, 9]
+    assert columns["count"].tolist() == [2, 2, 2, 1, 1, 1, 1, 1, 1]
+    assert columns["color"].tolist() == ["black"] * 5 + ["red"] * 4
+    assert columns["size"][:2].tolist() == [4.0, 4.0]
+    assert columns["size"][5:].tolist() == [3.0] * 4
+
+
+def test_zoom_for_extent():
+    """ Tests that the zoom_for_extent function returns the tile zoom level
+        for an extent.
+    """
+    assert zoom_for_extent(2 * MERC_HALF_WORLD, 256) == 0
+    assert zoom_for_extent(MERC_HALF_WORLD, 1024) == 3
+    assert zoom_for_extent(0, 800) == np.inf
@@ -0,0 +1,182 @@
+import pytest
+import json
+import numpy as np
+
+from shapely.geometry import (
+    Point,
+    box,
+    LineString,
+    MultiLineString,
+    Polygon,
+    MultiPolygon,
+    MultiPoint,
+    mapping,
+)
+
+from map_maker.util import GeometryTable
+
+
+@pytest.fixture()
+def shapes():
+    """ Fixture with one of every supported geometry type.
+    """
+    return np.array(
+        [
+            Point(0.0, 0.0),
+            MultiPoint([Point(1.0, 1.0), Point(2.0, 2.0)]),
+            LineString([[0.0, 0.0], [1.0, 1.0]]),
+            MultiLineString(
+                [[[0.0, 0.0], [1.0, 0.0]], [[0.0, 0.0], [0.0, 1.0]]]
+            ),
+            box(0.0, 0.0, 1.0, 1.0),
+            Polygon(
+                [[0, 0], [10, 0], [10, 10], [0, 10]],
+                [[[1, 1], [2, 1], [2, 2], [1, 1]]],
+            ),
+            MultiPolygon([box(0.0, 0.0, 0.5, 0.5), box(0.5, 0.5, 1.0, 1.0)]),
+        ],
+        dtype=object,
+    )
+
+
+def test_geometry_table_from_shapes(shapes):
+    """ Tests that the from_shapes method builds the offsets correctly.
+    """
+    table = GeometryTable.from_shapes(shapes[:3])
+
+    assert len(table) == 3
+    assert table.coords.tolist() == [
+        [0.0, 0.0],
+        [1.0, 1.0],
+        [2.0, 2.0],
+        [0.0, 0.0],
+        [1.0, 1.0],
+    ]
+    assert table.geom_offsets.tolist() == [0, 1, 3, 4]
+    assert table.part_offsets.tolist() == [0, 1, 2, 3, 4]
+    assert table.ring_offsets.tolist() == [0, 1, 2, 3, 5]
+
+
+def test_geometry_table_to_shapes(shapes):
+    """ Tests that the to_shapes method rebuilds the original shapes.
+    """
+    answer = GeometryTable.from_shapes(shapes).to_shapes()
+
+    assert len(answer) == len(shapes)
+    for truth, shape_obj in zip(shapes, answer):
+        assert truth.geom_type == shape_obj.geom_type
+        assert truth.equals_exact(shape_obj, 0.0)
+
+
+def test_geometry_table_geometry_mappings(shapes):
+    """ Tests that the geometry_mappings method matches shapely's mapping.
+    """
+    table = GeometryTable.from_shapes(shapes)
+
+    # Round trip through json so tuples and lists compare equal.
+    truth = [json.loads(json.dumps(mapping(s))) for s in shapes]
+    answer = list(table.geometry_mappings())
+
+    assert truth == answer
+
+
+def test_geometry_table_round():
+    """ Tests that the round method rounds the coordinates and keeps the
+        rest of the table.
+    """
+    table = GeometryTable.from_shapes(
+        [Point(0.123456, 1.987654), LineString([(0.5, 0.25), (1.0, 1.0)])],
+        {"x": np.array([1, 2])},
+    )
+
+    answer = table.round(1)
+
+    assert answer.coords.tolist() == [[0.1, 2.0], [0.5, 0.2], [1.0, 1.0]]
+    assert answer.properties is table.properties
+    assert table.coords[0, 0] == 0.123456
+
+
+def test_geometry_table_drops_z():
+    """ Tests that tables only keep the x / y coordinates of 3D shapes.
+    """
+    table = GeometryTable.from_shapes([Point(0.0, 1.0, 2.0)])
+
+    assert table.coords.shape == (1, 2)
+    assert not table.to_shapes()[0].has_z
+
+
+def test_geometry_table_bounds(shapes):
+    """ Tests that the bounds method returns the bounds of all coordinates.
+    """
+    assert GeometryTable.from_shapes(shapes).bounds() == (0, 0, 10, 10)
+    assert GeometryTable.from_shapes([]).bounds() is None
+
+
+def test_geometry_table_concat(shapes):
+    """ Tests that the concat method joins the rows and fills in missing
+        property columns.
+    """
+    first = GeometryTable.from_shapes(shapes[:4], {"x": np.arange(4)})
+    second = GeometryTable.from_shapes(
+        shapes[4:], {"y": np.array(["a", "b", "c"], dtype=object)}
+    )
+
+    answer = GeometryTable.concat([first, second])
+
+    assert len(answer) == 7
+    assert answer.properties["x"].tolist() == [0, 1, 2, 3] + [None] * 3
+    assert answer.properties["y"].tolist() == [None] * 4 + ["a", "b", "c"]
+    for truth, shape_obj in zip(shapes, answer.to_shapes()):
+        assert truth.equals_exact(shape_obj, 0.0)
+
+
+def test_geometry_table_take(shapes):
+    """ Tests that the take method selects rows and their properties in the
+        order given.
+    """
+    table = GeometryTable.from_shapes(shapes, {"x": np.arange(7)})
+    rows = [6, 1, 5, 1]
+
+    answer = table.take(rows)
+
+    assert answer.properties["x"].tolist() == rows
+    for truth, shape_obj in zip(shapes[rows], answer.to_shapes()):
+        assert truth.equals_exact(shape_obj, 0.0)
+    assert len(table.take([])) == 0
+
+
+def test_geometry_table_ragged_xy(shapes):
+    """ Tests that the ragged_xy method splits the coordinates per row with
+        NaN between parts and rings.
+    """
+    table = GeometryTable.from_shapes(shapes[2:])
+
+    xs, ys = table.ragged_xy()
+    exterior_xs, _ = table.ragged_xy(exteriors_only=True)
+
+    assert len(xs) == 5
+    np.testing.assert_array_equal(xs[0], [0.0, 1.0])
+    np.testing.assert_array_equal(xs[1], [0.0, 1.0, np.nan, 0.0, 0.0])
+    np.testing.assert_array_equal(ys[1], [0.0, 0.0, np.nan, 0.0, 1.0])
+    np.testing.assert_array_equal(
+        xs[3], [0.0, 10.0, 10.0, 0.0, 0.0, np.nan, 1.0, 2.0, 2.0, 1.0]
+    )
+    np.testing.assert_array_equal(exterior_xs[3], [0.0, 10.0, 10.0, 0.0, 0.0])
+    assert np.isnan(exterior_xs[4]).sum() == 1
+
+
+def test_geometry_table_to_records(shapes):
+    """ Tests that the to_records method returns a dict per row with the
+        properties and the shape.
+    """
+    table = GeometryTable.from_shapes(
+        shapes[:2], {"color": np.array(["red", "blue"], dtype=object)}
+    )
+
+    truth = [
+        {"color": "red", "shape_obj": shapes[0]},
+        {"color": "blue", "shape_obj": shapes[1]},
+    ]
+    answer = table.to_records()
+
+    assert truth == answer
@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from shapely.geometry import Point
+
+from map_maker.util import (
+    GeometryTable,
+    HexbinAggregator,
+    hexbin_geometry_tables,
+)
+from map_maker.util.hexbin import hex_axial, hex_centers
+
+
+def test_hex_axial():
+    """ Tests that hex_axial assigns every coordinate to the hexagon with
+        the nearest center.
+    """
+    rng = np.random.default_rng(0)
+    coords = rng.uniform(-50.0, 50.0, size=(10000, 2))
+
+    q, r = hex_axial(coords, 3.0)
+    distance = np.hypot(*(coords - hex_centers(q, r, 3.0)).T)
+
+    assert distance.max() <= 3.0
+    for dq, dr in [(1, 0), (-1, 0), (0, 1), (0, -1), (1, -1), (-1, 1)]:
+        neighbor = hex_centers(q + dq, r + dr, 3.0)
+        assert (distance <= np.hypot(*(coords - neighbor).T) + 1e-9).all()
+
+
+def test_hexbin_aggregator():
+    """ Tests that the HexbinAggregator counts and sums the points per cell
+        across updates.
+    """
+    points = GeometryTable.from_shapes(
+        [Point(0.0, 0.0), Point(0.1, 0.1), Point(10.0, 0.0)],
+        {"value": np.array(["1", "2", "4"], dtype=object)},
+    )
+
+    counts = HexbinAggregator(1.0)
+    means = HexbinAggregator(1.0, how="mean", column="value")
+    for aggregator in (counts, means):
+        aggregator.update(points)
+        aggregator.update(points)
+
+    assert len(counts) == 2
+    assert sorted(counts.values().tolist()) == [2, 4]
+    assert sorted(means.values().tolist()) == [1.5, 4.0]
+
+
+def test_hexbin_aggregator_bad_args():
+    """ Tests that the HexbinAggregator raises ValueErrors for unknown
+        aggregations, missing columns and bad sizes.
+    """
+    with pytest.raises(ValueError):
+        HexbinAggregator(1.0, how="categorical", column="value")
+    with pytest.raises(ValueError):
+        HexbinAggregator(1.0, how="sum")
+    with pytest.raises(ValueError):
+        HexbinAggregator(0.0)
+
+
+def test_hexbin_aggregator_to_table():
+    """ Tests that the to_table method builds a hexagon polygon per cell
+        with the aggregate and a color ramp.
+    """
+    aggregator = HexbinAggregator(1.0)
+    aggregator.update(
+        GeometryTable.from_shapes(
+            [Point(0.0, 0.0), Point(0.1, 0.1), Point(10.0, 0.0)]
+        )
+    )
+
+    table = aggregator.to_table(cmap=["#000000", "#ffffff"])
+    shapes = table.to_shapes()
+
+    assert [shape.geom_type for shape in shapes] == ["Polygon", "Polygon"]
+    assert [len(shape.exterior.coords) for shape in shapes] == [7, 7]
+    np.testing.assert_allclose(
+        [shape.area for shape in shapes], 1.5 * np.sqrt(3)
+    )
+    assert shapes[0].contains(Point(0.0, 0.0))
+    assert table.properties["count"].tolist() == [2, 1]
+    assert table.properties["color"].tolist() == ["#ffffff", "#000000"]
+
+
+def test_hexbin_aggregator_project():
+    """ Tests that lon / lat points are binned in Web Mercator and the
+        hexagons come back in lon / lat.
+    """
+    aggregator = HexbinAggregator(1000.0, project=True)
+    aggregator.update(GeometryTable.from_shapes([Point(-97.0, 32.0)]))
+
+    hexagon = aggregator.to_table().to_shapes()[0]
+
+    assert hexagon.contains(Point(-97.0, 32.0))
+    assert hexagon.bounds[2] - hexagon.bounds[0] < 0.02
+
+
+def test_hexbin_geometry_tables():
+    """ Tests that the hexbin_geometry_tables function sizes the hexagons in
+        pixels of the plot width.
+    """
+    shape_data = [
+        {"shape": "POINT (0 0)"},
+        {"shape": "POINT (1 1)"},
+        {"shape": "LINESTRING (0 0, 0.5 0.5)"},
+    ]
+
+    aggregator, linestrings, _, bounds = hexbin_geometry_tables(
+        shape_data, 100, size=5, project=False
+    )
+
+    # One degree of longitude is about 111km in Web Mercator.
+    assert aggregator.size == pytest.approx(5 * 111319.49 / 100)
+    assert len(aggregator) == 2
+    assert len(linestrings) == 1
+    assert bounds == (0, 0, 1, 1)
@@ -1,6 +1,7 @@
 import pytest
 import os
 import json
+import numpy as np
 
 from csv import DictReader
 from shapely.geometry import (
@@ -15,7 +16,23 @@ from shapely.geometry import (
 from shapely.wkt import loads as wkt_loads
 from toolz import assoc
 
-from map_maker.bokeh.map_maker import _get_tooltips, make_map_plot
+from map_maker.bokeh.map_maker import (
+    _get_tooltips,
+    _point_source,
+    _ragged_source,
+    base_map_plot,
+    make_map_plot,
+)
+import map_maker.bokeh.map_maker as bokeh_map_maker
+from bokeh.document import Document
+from bokeh.events import RangesUpdate
+from map_maker.bokeh import make_viewport_document
+from map_maker.util import (
+    GeometryTable,
+    ViewportIndex,
+    extract_geometry_tables,
+)
+from map_maker.util.util import lla_to_merc_coords
 
 
 @pytest.fixture()
@@ -110,6 +127,45 @@ def test_get_tooltips():
     assert truth == answer
 
 
+def test_point_source():
+    """ Tests that the _point_source function builds x / y arrays and fills
+        in the style defaults.
+    """
+    points = GeometryTable.from_shapes(
+        [Point(0.0, 1.0), Point(2.0, 3.0)],
+        {"alpha": np.array(["0.5", None], dtype=object)},
+    )
+
+    answer = _point_source(points, "black", 0.3, 2.0).data
+
+    assert answer["x"].tolist() == [0.0, 2.0]
+    assert answer["y"].tolist() == [1.0, 3.0]
+    assert answer["alpha"].tolist() == [0.5, 0.3]
+    assert answer["color"].tolist() == ["black", "black"]
+    assert answer["size"].tolist() == [2.0, 2.0]
+
+
+def test_ragged_source():
+    """ Tests that the _ragged_source function builds NaN separated xs / ys
+        arrays.
+    """
+    linestrings = GeometryTable.from_shapes(
+        [
+            LineString([[0.0, 0.0], [1.0, 1.0]]),
+            MultiLineString(
+                [[[0.0, 0.0], [1.0, 0.0]], [[2.0, 2.0], [3.0, 3.0]]]
+            ),
+        ]
+    )
+
+    answer = _ragged_source(linestrings, "black", 0.3, 2.0).data
+
+    assert answer["xs"][0].tolist() == [0.0, 1.0]
+    xs, ys = answer["xs"][1], answer["ys"][1]
+    np.testing.assert_array_equal(xs, [0.0, 1.0, np.nan, 2.0, 3.0])
+    np.testing.assert_array_equal(ys, [0.0, 0.0, np.nan, 2.0, 3.0])
+
+
 def test_make_map_plot_wkt(test_data):
     """ Tests that the make_map_plot function can run on sample data in WKT
         format.
@@ -178,3 +234,172 @@ def test_make_map_plot_no_linestrings(test_data_shape):
     ]
 
     make_map_plot(no_linestrings)
+
+
+def test_make_map_plot_only_linestrings(test_data_shape):
+    """ Tests that the make_map_plot function can run on data that only has
+        linestrings.
+    """
+    only_linestrings = [
+        s
+        for s in test_data_shape
+        if isinstance(s["shape"], (LineString, MultiLineString))
+    ]
+
+    make_map_plot(only_linestrings)
+
+
+def test_make_map_plot_empty():
+    """ Tests that the make_map_plot function raises a ValueError when there
+        are no shapes.
+    """
+    with pytest.raises(ValueError):
+        make_map_plot([])
+
+
+def test_base_map_plot_output_backend():
+    """ Tests that the base_map_plot function sets the output backend, and
+        rejects unknown ones.
+    """
+    canvas_plot = base_map_plot([0, 1], [0, 1])
+    webgl_plot = base_map_plot([0, 1], [0, 1], output_backend="webgl")
+
+    assert canvas_plot.output_backend == "canvas"
+    assert webgl_plot.output_backend == "webgl"
+
+    with pytest.raises(ValueError):
+        base_map_plot([0, 1], [0, 1], output_backend="opengl")
+
+
+def test_make_map_plot_webgl(test_data, monkeypatch):
+    """ Tests that the make_map_plot function picks the WebGL backend when
+        there are more points and linestrings than the threshold.
+    """
+    forced = make_map_plot(test_data, output_backend="webgl")
+
+    assert make_map_plot(test_data).output_backend == "canvas"
+    assert forced.output_backend == "webgl"
+
+    monkeypatch.setattr(bokeh_map_maker, "WEBGL_THRESHOLD", 1)
+    forced = make_map_plot(test_data, output_backend="canvas")
+
+    assert make_map_plot(test_data).output_backend == "webgl"
+    assert forced.output_backend == "canvas"
+
+
+def test_make_map_plot_cluster(test_data):
+    """ Tests that the make_map_plot function draws clustered points from the
+        level for the initial zoom, with a callback to swap levels.
+    """
+    map_plot = make_map_plot(test_data, cluster=True)
+    points = map_plot.select_one({"name": "points"})
+    shown = points.view.filters[0].indices
+
+    assert points.data_source.data["count"][shown].sum() == 203
+    assert map_plot.x_range.js_property_callbacks["change:start"]
+
+
+def test_make_map_plot_simplify(test_data):
+    """ Tests that the make_map_plot function can simplify the linestrings
+        and polygons.
+    """
+    map_plot = make_map_plot(test_data, simplify=True)
+    polygons = map_plot.select_one({"name": "polygons"})
+    unsimplified = make_map_plot(test_data).select_one({"name": "polygons"})
+
+    assert len(polygons.data_source.data["xs"][0]) < len(
+        unsimplified.data_source.data["xs"][0]
+    )
+
+
+def test_make_map_plot_coordinate_precision(test_data):
+    """ Tests that the make_map_plot function rounds the coordinates.
+    """
+    map_plot = make_map_plot(test_data, coordinate_precision=0)
+    points = map_plot.select_one({"name": "points"})
+
+    x = points.data_source.data["x"]
+    assert (x == np.round(x)).all()
+
+
+def test_make_map_plot_stream(test_data):
+    """ Tests that the make_map_plot function takes an iterator of rows
+        consumed in chunks.
+    """
+    map_plot = make_map_plot(iter(test_data), chunk_size=10)
+    points = map_plot.select_one({"name": "points"})
+
+    assert len(points.data_source.data["x"]) == 203
+
+
+def test_make_map_plot_raster(test_data):
+    """ Tests that the make_map_plot function draws the points as an image
+        in raster mode.
+    """
+    map_plot = make_map_plot(test_data, raster="count")
+    categorical = make_map_plot(
+        test_data, raster="categorical", raster_column="classification"
+    )
+    image = map_plot.select_one({"name": "raster"})
+
+    assert image.data_source.data["image"][0].shape == (800, 800)
+    assert map_plot.select_one({"name": "points"}) is None
+    assert categorical.select_one({"name": "raster"}) is not None
+
+
+def test_make_map_plot_raster_bounds(test_data):
+    """ Tests that the make_map_plot function covers aggregate_bounds with
+        the raster when they're given.
+    """
+    map_plot = make_map_plot(
+        test_data, raster="count", aggregate_bounds=(-110, 20, -90, 40)
+    )
+    image = map_plot.select_one({"name": "raster"})
+    corners = lla_to_merc_coords(np.array([[-110.0, 20.0], [-90.0, 40.0]]))
+
+    assert image.glyph.x == pytest.approx(corners[0, 0])
+    assert image.glyph.dw == pytest.approx(corners[1, 0] - corners[0, 0])
+
+
+def test_make_map_plot_hexbin(test_data):
+    """ Tests that the make_map_plot function draws the points as hexagons
+        in hexbin mode.
+    """
+    map_plot = make_map_plot(test_data, hexbin="count")
+    hexes = map_plot.select_one({"name": "hexbin"})
+
+    assert hexes.data_source.data["count"].sum() == 203
+    assert map_plot.select_one({"name": "points"}) is None
+
+
+def test_make_viewport_document(test_data):
+    """ Tests that the viewport document draws the shapes in view and
+        reloads them when the view changes.
+    """
+    index = ViewportIndex(*extract_geometry_tables(test_data))
+    doc = Document()
+    make_viewport_document(index)(doc)
+    map_plot = doc.roots[0]
+    points = map_plot.select_one({"name": "points"}).data_source
+
+    # Points sharing a pixel are drawn once.
+    assert 190 < len(points.data["x"]) <= 203
+    assert map_plot.select_one({"name": "polygons"}) is not None
+
+    # An empty corner of the map.
+    min_x, min_y, _, _ = index.bounds()
+    map_plot._trigger_event(
+        RangesUpdate(
+            map_plot, x0=min_x - 2.0, x1=min_x - 1.0, y0=min_y, y1=min_y + 1.0
+        )
+    )
+
+    assert len(points.data["x"]) == 0
+
+
+def test_make_map_plot_raster_hexbin(test_data):
+    """ Tests that the make_map_plot function refuses both a raster and a
+        hexbin.
+    """
+    with pytest.raises(ValueError):
+        make_map_plot(test_data, raster="count", hexbin="count")
@@ -1,8 +1,10 @@
+import folium
 import pytest
 import os
 import json
 
 from csv import DictReader
+from shapely import get_num_coordinates
 from shapely.geometry import (
     Point,
     MultiPoint,
@@ -11,6 +13,7 @@ from shapely.geometry import (
     Polygon,
     MultiPolygon,
     mapping,
+    shape,
 )
 from shapely.wkt import loads as wkt_loads
 from toolz import assoc
@@ -18,7 +21,6 @@ from toolz import assoc
 from map_maker.folium.map_maker import (
     make_map_plot,
     _get_tooltip_keys,
-    _get_tooltip_values,
 )
 
 
@@ -114,25 +116,6 @@ def test_get_tooltip_keys():
     assert sorted(truth) == sorted(answer)
 
 
-def test_get_tooltip_values():
-    """ Tests that the _get_tooltip_values function returns the correct value.
-    """
-    shape_datum = {
-        "shape": "a",
-        "shape_obj": "b",
-        "color": "blue",
-        "alpha": 1.0,
-        "size": 2.0,
-        "x": 1,
-        "y": 2,
-    }
-
-    truth = ["x: 1", "y: 2"]
-    answer = _get_tooltip_values(shape_datum)
-
-    assert sorted(truth) == sorted(answer)
-
-
 def test_make_map_plot_wkt(test_data):
     """ Tests that the make_map_plot function can run on sample data in WKT
         format.
@@ -201,3 +184,121 @@ def test_make_map_plot_no_linestrings(test_data_shape):
     ]
 
     make_map_plot(no_linestrings)
+
+
+def test_make_map_plot_only_linestrings(test_data_shape):
+    """ Tests that the make_map_plot function can run on data that only has
+        linestrings.
+    """
+    only_linestrings = [
+        s
+        for s in test_data_shape
+        if isinstance(s["shape"], (LineString, MultiLineString))
+    ]
+
+    make_map_plot(only_linestrings)
+
+
+def test_make_map_plot_empty():
+    """ Tests that the make_map_plot function raises a ValueError when there
+        are no shapes.
+    """
+    with pytest.raises(ValueError):
+        make_map_plot([])
+
+
+def test_make_map_plot_point_layer(test_data):
+    """ Tests that the make_map_plot function draws all of the points from
+        a single GeoJSON layer rather than one circle marker each.
+    """
+    html = make_map_plot(test_data).get_root().render()
+
+    assert html.count("L.circleMarker(") == 1
+    assert "pointToLayer" in html
+    assert "bindTooltip" in html
+
+
+def test_make_map_plot_point_layer_escapes_script(test_data):
+    """ Tests that the point layer can't be broken out of by a property
+        holding a closing script tag.
+    """
+    test_data[0]["date"] = "</script>"
+
+    html = make_map_plot(test_data).get_root().render()
+
+    assert '"date":"<\\/script>"' in html
+
+
+def test_make_map_plot_cluster(test_data):
+    """ Tests that the make_map_plot function draws clustered points from the
+        precomputed cluster levels.
+    """
+    html = make_map_plot(test_data, cluster=True).get_root().render()
+
+    assert '"offsets":[0,' in html
+    assert "zoomend" in html
+    assert "pointToLayer" not in html
+
+
+def _num_coordinates(map_plot):
+    """ Counts the coordinates of the GeoJSON layers (the linestrings and
+        polygons) of a folium map.
+    """
+    return sum(
+        int(get_num_coordinates(shape(feature["geometry"])))
+        for child in map_plot._children.values()
+        if isinstance(child, folium.GeoJson)
+        for feature in child.data["features"]
+    )
+
+
+def test_make_map_plot_simplify(test_data):
+    """ Tests that the make_map_plot function can simplify the linestrings
+        and polygons, with and without preserving topology.
+    """
+    unsimplified = _num_coordinates(make_map_plot(test_data))
+    simplified = _num_coordinates(make_map_plot(test_data, simplify=True))
+    unpreserved = _num_coordinates(
+        make_map_plot(test_data, simplify=0.01, preserve_topology=False)
+    )
+
+    assert simplified < unsimplified
+    assert unpreserved < unsimplified
+
+
+def test_make_map_plot_coordinate_precision(test_data):
+    """ Tests that the make_map_plot function writes the rounded
+        coordinates.
+    """
+    html = make_map_plot(test_data, coordinate_precision=2).get_root().render()
+
+    assert '"coordinates":[-95.54,32.79]' in html
+    assert "-95.5425" not in html
+
+
+def test_make_map_plot_raster(test_data):
+    """ Tests that the make_map_plot function draws the points as an image
+        overlay in raster mode.
+    """
+    html = make_map_plot(test_data, raster="count").get_root().render()
+
+    assert "imageOverlay" in html
+    assert "pointToLayer" not in html
+
+
+def test_make_map_plot_hexbin(test_data):
+    """ Tests that the make_map_plot function draws the points as hexagons
+        in hexbin mode.
+    """
+    html = make_map_plot(test_data, hexbin="count").get_root().render()
+
+    assert '"count":' in html
+    assert "pointToLayer" not in html
+
+
+def test_make_map_plot_raster_hexbin(test_data):
+    """ Tests that the make_map_plot function refuses both a raster and a
+        hexbin.
+    """
+    with pytest.raises(ValueError):
+        make_map_plot(test_data, raster="count", hexbin="count")
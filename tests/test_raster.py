@@ -0,0 +1,198 @@
+import numpy as np
+import pytest
+
+from shapely.geometry import LineString, Point, Polygon
+
+from map_maker.util import (
+    GeometryTable,
+    RasterAggregator,
+    rasterize_geometry_tables,
+    shade,
+)
+
+
+@pytest.fixture()
+def points():
+    """ Fixture with four points on a 2 x 2 grid over (0, 0, 2, 2), three in
+        the bottom left pixel and one in the top right.
+    """
+    return GeometryTable.from_shapes(
+        [Point(0.1, 0.1), Point(0.5, 0.5), Point(0.9, 0.2), Point(2.0, 2.0)],
+        {
+            "value": np.array(["1", "2", "", "4"], dtype=object),
+            "kind": np.array(["a", "b", "a", "b"], dtype=object),
+        },
+    )
+
+
+def test_raster_aggregator_count(points):
+    """ Tests that the count aggregation counts the points per pixel, with
+        the max edge in the last pixel and row 0 at the bottom.
+    """
+    aggregator = RasterAggregator((0, 0, 2, 2), 2, 2)
+    aggregator.update(points)
+    aggregator.update(points)
+
+    assert aggregator.aggregate().tolist() == [[6, 0], [0, 2]]
+
+
+def test_raster_aggregator_sum_mean(points):
+    """ Tests that the sum and mean aggregations skip missing values.
+    """
+    summed = RasterAggregator((0, 0, 2, 2), 2, 2, how="sum", column="value")
+    mean = RasterAggregator((0, 0, 2, 2), 2, 2, how="mean", column="value")
+    summed.update(points)
+    mean.update(points)
+
+    assert summed.aggregate().tolist() == [[3, 0], [0, 4]]
+    np.testing.assert_array_equal(
+        mean.aggregate(), [[1.5, np.nan], [np.nan, 4.0]]
+    )
+
+
+def test_raster_aggregator_categorical(points):
+    """ Tests that the categorical aggregation counts every value per pixel.
+    """
+    aggregator = RasterAggregator(
+        (0, 0, 2, 2), 2, 2, how="categorical", column="kind"
+    )
+    aggregator.update(points)
+
+    assert aggregator.categories == ["a", "b"]
+    assert aggregator.aggregate().tolist() == [
+        [[2, 0], [0, 0]],
+        [[1, 0], [0, 1]],
+    ]
+
+
+def test_raster_aggregator_max_categories():
+    """ Tests that the categorical aggregation counts the values past
+        max_categories as other, in grids that grow by doubling.
+    """
+    kinds = np.array(["v{}".format(ii) for ii in range(20)], dtype=object)
+    many = GeometryTable.from_shapes(
+        [Point(0.5, 0.5)] * len(kinds), {"kind": kinds}
+    )
+    aggregator = RasterAggregator(
+        (0, 0, 2, 2),
+        2,
+        2,
+        how="categorical",
+        column="kind",
+        max_categories=4,
+    )
+    aggregator.update(many)
+    aggregator.update(many)
+
+    assert aggregator.categories == ["v0", "v1", "v10", "v11", "other"]
+    assert aggregator.aggregate()[:, 0, 0].tolist() == [2, 2, 2, 2, 32]
+    assert len(aggregator._category_counts) == 5
+
+
+def test_raster_aggregator_outside(points):
+    """ Tests that points outside the bounds are ignored.
+    """
+    aggregator = RasterAggregator((0, 0, 1, 1), 1, 1)
+    aggregator.update(points)
+
+    assert aggregator.aggregate().tolist() == [[3]]
+
+
+def test_raster_aggregator_project():
+    """ Tests that lon / lat points are binned in Web Mercator.
+    """
+    aggregator = RasterAggregator((0, 0, 80, 80), 1, 2, project=True)
+    aggregator.update(GeometryTable.from_shapes([Point(40, 40)]))
+
+    # 40 degrees is less than half way up to 80 in Web Mercator.
+    assert aggregator.aggregate().tolist() == [[1], [0]]
+
+
+def test_raster_aggregator_bad_args():
+    """ Tests that the RasterAggregator raises ValueErrors for unknown
+        aggregations and missing columns.
+    """
+    with pytest.raises(ValueError):
+        RasterAggregator((0, 0, 1, 1), 1, 1, how="max", column="value")
+    with pytest.raises(ValueError):
+        RasterAggregator((0, 0, 1, 1), 1, 1, how="sum")
+
+
+def test_shade():
+    """ Tests that the shade function ramps the values along the colormap
+        and leaves empty pixels transparent.
+    """
+    agg = np.array([[0, 1], [10, 100]])
+
+    linear = shade(agg, cmap=["#000000", "#ff0000"], how="linear")
+    eq_hist = shade(agg, cmap=["#000000", "#ff0000"])
+
+    assert linear[0, 0].tolist() == [0, 0, 0, 0]
+    assert linear[:, :, 0].tolist() == [[0, 0], [23, 255]]
+    assert eq_hist[:, :, 0].tolist() == [[0, 0], [127, 255]]
+    assert linear[1, 1, 3] == 255
+
+    with pytest.raises(ValueError):
+        shade(agg, how="sqrt")
+
+
+def test_shade_categorical():
+    """ Tests that the categorical colors are mixed by count.
+    """
+    agg = np.array([[[2, 0]], [[2, 1]]])
+
+    image = shade(agg, category_colors=["#ff0000", "#0000ff"])
+
+    assert image[0, 0, :3].tolist() == [128, 0, 128]
+    assert image[0, 1, :3].tolist() == [0, 0, 255]
+
+
+def test_rasterize_geometry_tables():
+    """ Tests that the rasterize_geometry_tables function aggregates the
+        points and collects the other layers and the bounds.
+    """
+    shape_data = [
+        {"shape": "POINT (0 0)"},
+        {"shape": "POINT (1 1)"},
+        {"shape": LineString([(0, 0), (4, 4)])},
+        {"shape": Polygon([(0, 0), (1, 0), (1, 1)])},
+    ]
+
+    aggregator, linestrings, polygons, bounds = rasterize_geometry_tables(
+        shape_data, 4, 4, project=False
+    )
+
+    assert aggregator.aggregate().sum() == 2
+    assert len(linestrings) == 1
+    assert len(polygons) == 1
+    assert bounds == (0, 0, 4, 4)
+
+
+def test_rasterize_geometry_tables_iterator():
+    """ Tests that an iterator is rasterized in one pass, with or without
+        its bounds.
+    """
+    shape_data = [
+        {"shape": "POINT (0 0)", "kind": "a"},
+        {"shape": "POINT (1 1)", "kind": "b"},
+        {"shape": "POINT (1 1)"},
+    ]
+
+    aggregator, _, _, bounds = rasterize_geometry_tables(
+        iter(shape_data),
+        4,
+        4,
+        how="categorical",
+        column="kind",
+        project=False,
+    )
+
+    assert bounds == (0, 0, 1, 1)
+    assert sorted(aggregator.categories) == ["None", "a", "b"]
+    assert aggregator.aggregate().sum() == 3
+
+    aggregator, _, _, _ = rasterize_geometry_tables(
+        iter(shape_data), 4, 4, project=False, bounds=(0, 0, 1, 1)
+    )
+
+    assert aggregator.aggregate().sum() == 3
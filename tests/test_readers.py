@@ -0,0 +1,318 @@
+import json
+import numpy as np
+import os
+import pytest
+
+from csv import DictReader
+from shapely import bounds, from_wkt, to_geojson, to_wkb
+
+from map_maker.readers import ArrowFiles, CSVFiles, GeoJSONFiles, ShapeFiles
+from map_maker.readers import geojson_files
+from map_maker.readers.csv_files import csv_record_ranges
+from map_maker.util import extract_geometry_tables
+
+
+@pytest.fixture()
+def test_files():
+    """ Fixture with the paths of the test data files.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    return [
+        os.path.join(current_dir, "test_data/test_data_points.csv"),
+        os.path.join(current_dir, "test_data/test_data_polygons_lines.csv"),
+    ]
+
+
+def test_csv_files(test_files):
+    """ Tests that CSVFiles streams the rows of every file in order, and can
+        be iterated more than once.
+    """
+    truth = []
+    for test_file in test_files:
+        truth.extend(DictReader(open(test_file, "r")))
+
+    csv_files = CSVFiles(test_files)
+
+    assert list(csv_files) == truth
+    assert list(csv_files) == truth
+
+
+def test_csv_files_quoted_newlines(tmp_path):
+    """ Tests that CSVFiles keeps line breaks inside quoted fields.
+    """
+    path = tmp_path / "quoted.csv"
+    path.write_text(
+        'shape,name\n"POINT (0 0)","two\nlines"\n"POINT (1 1)",one\n'
+    )
+
+    answer = list(CSVFiles([str(path)]))
+
+    assert [row["name"] for row in answer] == ["two\nlines", "one"]
+
+
+def test_csv_record_ranges(tmp_path):
+    """ Tests that csv_record_ranges only splits at line breaks that end a
+        record, not those inside quoted fields.
+    """
+    path = tmp_path / "quoted.csv"
+    rows = [
+        '"POINT ({0} {0})","a ""quoted""\nname {0}"\n'.format(i)
+        for i in range(20)
+    ]
+    path.write_text("shape,name\n" + "".join(rows))
+
+    header, ranges = csv_record_ranges(str(path), range_size=16)
+
+    assert header == b"shape,name\n"
+    assert ranges[0][0] == len(header)
+    assert ranges[-1][1] == os.path.getsize(str(path))
+    assert all(a[1] == b[0] for a, b in zip(ranges[:-1], ranges[1:]))
+    # Every range is whole records, which here are exactly the rows.
+    data = path.read_bytes()
+    chunks = [data[start:end].decode() for start, end in ranges]
+    assert len(chunks) > 1
+    assert all(chunk in "".join(rows) for chunk in chunks)
+    assert all(chunk.startswith('"POINT') for chunk in chunks)
+    assert all(chunk.endswith('"\n') for chunk in chunks)
+
+
+def test_csv_files_iter_geometry_tables(test_files):
+    """ Tests that parsing CSVFiles in byte ranges with several workers
+        gives the same tables as parsing the rows serially.
+    """
+    csv_files = CSVFiles(test_files, range_size=4096)
+
+    truth = extract_geometry_tables(csv_files)
+    answer = extract_geometry_tables(csv_files, workers=2)
+
+    for truth_table, answer_table in zip(truth, answer):
+        assert np.array_equal(truth_table.coords, answer_table.coords)
+        assert np.array_equal(
+            truth_table.ring_offsets, answer_table.ring_offsets
+        )
+        for column, values in truth_table.properties.items():
+            assert list(answer_table.properties[column]) == list(values)
+
+
+@pytest.fixture()
+def arrow_files(test_files, tmp_path):
+    """ Fixture that writes the test points to a GeoParquet file with a
+        bbox covering column, sorted by longitude in row groups of 50 rows,
+        and to a Feather file.
+    """
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    feather = pytest.importorskip("pyarrow.feather")
+
+    rows = list(DictReader(open(test_files[0], "r")))
+    shapes = from_wkt([row.pop("shape") for row in rows])
+    extents = bounds(shapes)
+    order = np.argsort(extents[:, 0], kind="stable")
+    keys = ["xmin", "ymin", "xmax", "ymax"]
+
+    columns = {
+        "geometry": to_wkb(shapes[order]),
+        **{
+            name: [rows[ii][name] for ii in order]
+            for name in ("color", "date", "classification")
+        },
+        "alpha": np.full(len(rows), 0.5),
+        "bbox": pa.StructArray.from_arrays(
+            [pa.array(extents[order, ii]) for ii in range(4)], keys
+        ),
+    }
+    geo = {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {
+            "geometry": {
+                "encoding": "WKB",
+                "geometry_types": ["Point"],
+                "covering": {"bbox": {key: ["bbox", key] for key in keys}},
+            }
+        },
+    }
+    table = pa.table(columns).replace_schema_metadata(
+        {"geo": json.dumps(geo)}
+    )
+
+    parquet_path = str(tmp_path / "points.parquet")
+    feather_path = str(tmp_path / "points.feather")
+    pq.write_table(table, parquet_path, row_group_size=50)
+    feather.write_feather(table, feather_path, chunksize=50)
+    return parquet_path, feather_path
+
+
+def test_arrow_files(test_files, arrow_files):
+    """ Tests that ArrowFiles reads the same points as the csv, from
+        Parquet and Feather, without the bbox covering column.
+    """
+    truth = extract_geometry_tables(CSVFiles(test_files[:1]))[0]
+    order = np.lexsort(truth.coords.T)
+
+    for path in arrow_files:
+        points, linestrings, polygons = extract_geometry_tables(
+            ArrowFiles([path])
+        )
+
+        assert len(linestrings) == len(polygons) == 0
+        assert set(points.properties) == {
+            "color",
+            "date",
+            "classification",
+            "alpha",
+        }
+        assert points.properties["alpha"].dtype == float
+        answer_order = np.lexsort(points.coords.T)
+        assert np.allclose(points.coords[answer_order], truth.coords[order])
+        assert list(points.properties["date"][answer_order]) == list(
+            truth.properties["date"][order]
+        )
+
+
+def test_arrow_files_rows(arrow_files):
+    """ Tests that iterating ArrowFiles yields dicts with the WKB shape.
+    """
+    rows = list(ArrowFiles(arrow_files[:1]))
+
+    assert len(rows) == 203
+    assert set(rows[0]) == {
+        "shape",
+        "color",
+        "date",
+        "classification",
+        "alpha",
+    }
+    assert isinstance(rows[0]["shape"], bytes)
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_arrow_files_bbox(arrow_files, workers):
+    """ Tests that ArrowFiles only reads the requested columns, skips the
+        row groups outside the bbox and keeps the shapes inside it.
+    """
+    bbox = (-100.0, 30.0, -95.0, 33.0)
+    arrow = ArrowFiles(arrow_files[:1], columns=["date"], bbox=bbox)
+
+    jobs, _ = arrow._jobs(None)
+    points, _, _ = extract_geometry_tables(arrow, workers=workers)
+
+    assert len(jobs) < 5
+    assert set(points.properties) == {"color", "alpha", "date"}
+    lon_lat = extract_geometry_tables(arrow, project=False)[0].coords
+    assert len(lon_lat) == 77
+    assert (lon_lat >= bbox[:2]).all() and (lon_lat <= bbox[2:]).all()
+    assert len(points) == 77
+
+
+def test_shape_files(test_files, arrow_files):
+    """ Tests that ShapeFiles reads every file with the reader for its
+        extension, in order, and refuses a bbox for csv files.
+    """
+    shape_files = ShapeFiles([test_files[1], arrow_files[0]])
+
+    assert [type(reader) for reader in shape_files.readers] == [
+        CSVFiles,
+        ArrowFiles,
+    ]
+    points, linestrings, polygons = extract_geometry_tables(shape_files)
+    assert (len(points), len(linestrings), len(polygons)) == (203, 3, 4)
+
+    with pytest.raises(ValueError):
+        ShapeFiles(test_files, bbox=(-100.0, 30.0, -95.0, 33.0))
+
+
+@pytest.fixture()
+def geojson_features(test_files):
+    """ Fixture with the test data as GeoJSON features.
+    """
+    features = []
+    for test_file in test_files:
+        for row in DictReader(open(test_file, "r")):
+            shape = from_wkt(row.pop("shape"))
+            features.append(
+                {
+                    "type": "Feature",
+                    "geometry": json.loads(to_geojson(shape)),
+                    "properties": row,
+                }
+            )
+    return features
+
+
+def test_geojson_files(geojson_features, tmp_path, monkeypatch):
+    """ Tests that GeoJSONFiles streams a FeatureCollection a feature at a
+        time, even when features span the blocks it reads.
+    """
+    monkeypatch.setattr(geojson_files, "_BLOCK_SIZE", 64)
+    path = tmp_path / "features.geojson"
+    path.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    *geojson_features,
+                    {"type": "Feature", "geometry": None, "properties": {}},
+                ],
+                "bbox": [-180, -90, 180, 90],
+            },
+            indent=2,
+        )
+    )
+    truth = [
+        {**feature["properties"], "shape": feature["geometry"]}
+        for feature in geojson_features
+    ]
+
+    geojson = GeoJSONFiles([str(path)])
+
+    assert list(geojson) == truth
+    assert list(geojson) == truth
+    points, linestrings, polygons = extract_geometry_tables(
+        geojson, shape_format="wkt"
+    )
+    assert (len(points), len(linestrings), len(polygons)) == (203, 3, 4)
+    assert points.properties["color"][0] == "black"
+
+
+def test_geojson_files_sequence(geojson_features, tmp_path):
+    """ Tests that GeoJSONFiles reads newline-delimited GeoJSON and GeoJSON
+        text sequences, whose texts can span lines.
+    """
+    ndjson_path = tmp_path / "features.ndjson"
+    ndjson_path.write_text(
+        "\n".join(json.dumps(feature) for feature in geojson_features) + "\n"
+    )
+    seq_path = tmp_path / "features.geojsons"
+    seq_path.write_text(
+        "".join(
+            "\x1e" + json.dumps(feature, indent=1) + "\n"
+            for feature in geojson_features
+        )
+    )
+    truth = [
+        {**feature["properties"], "shape": feature["geometry"]}
+        for feature in geojson_features
+    ]
+
+    assert list(GeoJSONFiles([str(ndjson_path)])) == truth
+    assert list(GeoJSONFiles([str(seq_path)])) == truth
+
+
+def test_geojson_files_single(tmp_path, monkeypatch):
+    """ Tests that GeoJSONFiles reads a lone feature or geometry, including
+        numbers split across blocks.
+    """
+    monkeypatch.setattr(geojson_files, "_BLOCK_SIZE", 8)
+    feature_path = tmp_path / "feature.json"
+    feature_path.write_text(
+        '{"properties": {"size": 12345}, "type": "Feature", '
+        '"geometry": {"type": "Point", "coordinates": [1.5, 2]}}'
+    )
+    geometry_path = tmp_path / "geometry.geojson"
+    geometry_path.write_text('{"type": "Point", "coordinates": [1.5, 2]}')
+
+    answer = list(GeoJSONFiles([str(feature_path), str(geometry_path)]))
+
+    point = {"type": "Point", "coordinates": [1.5, 2]}
+    assert answer == [{"size": 12345, "shape": point}, {"shape": point}]
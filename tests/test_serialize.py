@@ -0,0 +1,114 @@
+import pytest
+import json
+import numpy as np
+
+from shapely.geometry import Point
+
+from map_maker.util import JSONEncoder, GeometryTable, dumps, dumps_geojson
+from map_maker.util.serialize import orjson
+
+ENCODERS = ["json"] + (["orjson"] if orjson is not None else [])
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_json_encoder_numpy(encoder):
+    """ Tests that the JSONEncoder writes NumPy arrays and scalars.
+    """
+    obj = {
+        "x": np.array([1.5, 2.0]),
+        "y": np.int64(3),
+        "z": np.array(["a", None], dtype=object),
+    }
+
+    truth = {"x": [1.5, 2.0], "y": 3, "z": ["a", None]}
+    answer = json.loads(JSONEncoder(encoder).encode(obj))
+
+    assert truth == answer
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_json_encoder_float_precision(encoder):
+    """ Tests that the JSONEncoder rounds floats when float_precision is
+        set.
+    """
+    obj = {"x": np.array([1.23456, 2.0]), "y": [0.33333, "a"]}
+
+    truth = '{"x":[1.23,2.0],"y":[0.33,"a"]}'
+    answer = JSONEncoder(encoder, float_precision=2).encode(obj)
+
+    assert truth == answer
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_json_encoder_encode_many(encoder):
+    """ Tests that the encode_many method encodes numeric arrays and lists
+        value by value.
+    """
+    json_encoder = JSONEncoder(encoder)
+
+    assert json_encoder.encode_many(np.array([1, 2])) == ["1", "2"]
+    assert json_encoder.encode_many(np.array([], dtype=float)) == []
+    assert json_encoder.encode_many(["a,b", None]) == ['"a,b"', "null"]
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_json_encoder_non_finite(encoder):
+    """ Tests that the JSONEncoder writes NaN and infinite floats as null,
+        whichever backend it uses.
+    """
+    obj = {
+        "a": float("nan"),
+        "b": [float("inf"), 1.5],
+        "c": np.array([np.nan, 2.0]),
+        "d": np.float64(-np.inf),
+    }
+    json_encoder = JSONEncoder(encoder)
+
+    assert json_encoder.encode(obj) == (
+        '{"a":null,"b":[null,1.5],"c":[null,2.0],"d":null}'
+    )
+    assert json_encoder.encode_many(np.array([1.0, np.nan])) == [
+        "1.0",
+        "null",
+    ]
+
+
+def test_json_encoder_unknown():
+    """ Tests that the JSONEncoder raises a ValueError for an unknown
+        encoder.
+    """
+    with pytest.raises(ValueError):
+        JSONEncoder("ujson")
+
+
+def test_dumps():
+    """ Tests that the dumps function writes compact JSON.
+    """
+    assert dumps({"a": [1, 2.5]}, encoder="json") == '{"a":[1,2.5]}'
+
+
+@pytest.mark.parametrize("encoder", ENCODERS)
+def test_dumps_geojson_encoder(encoder):
+    """ Tests that dumps_geojson gives the same output with every encoder,
+        including numeric property columns.
+    """
+    table = GeometryTable.from_shapes(
+        [Point(0.0, 0.0), Point(1.0, 1.0)],
+        {
+            "alpha": np.array([1, 0]),
+            "count": np.array([1, 2]),
+            "name": np.array(["a", "b"], dtype=object),
+        },
+    )
+
+    truth = dumps_geojson(table, "blue", 1.0, 1.0, encoder="json")
+    answer = dumps_geojson(table, "blue", 1.0, 1.0, encoder=encoder)
+
+    assert truth == answer
+    assert json.loads(answer)["features"][1]["properties"] == {
+        "color": "blue",
+        "alpha": 0.0,
+        "size": 1.0,
+        "count": 2,
+        "name": "b",
+    }
@@ -0,0 +1,63 @@
+import numpy as np
+
+from shapely.geometry import LineString, Polygon
+
+from map_maker.util import GeometryTable, pixel_tolerance, simplify_table
+
+
+def test_pixel_tolerance():
+    """ Tests that the pixel_tolerance function returns the larger of the
+        horizontal and vertical pixel sizes.
+    """
+    assert pixel_tolerance((0.0, 0.0, 800.0, 400.0), 800, 800) == 1.0
+    assert pixel_tolerance((0.0, 0.0, 100.0, 400.0), 800, 200) == 2.0
+
+
+def test_simplify_table():
+    """ Tests that the simplify_table function removes the vertices within
+        the tolerance, keeps the properties and reports the removed count.
+    """
+    table = GeometryTable.from_shapes(
+        [
+            LineString([(0.0, 0.0), (1.0, 0.1), (2.0, 0.0), (3.0, 0.0)]),
+            LineString([(0.0, 0.0), (1.0, 5.0), (2.0, 0.0)]),
+        ],
+        {"color": np.array(["red", "blue"], dtype=object)},
+    )
+
+    simplified, removed = simplify_table(table, 0.5)
+
+    assert removed == 2
+    assert simplified.to_shapes().tolist() == [
+        LineString([(0.0, 0.0), (3.0, 0.0)]),
+        LineString([(0.0, 0.0), (1.0, 5.0), (2.0, 0.0)]),
+    ]
+    assert simplified.properties["color"].tolist() == ["red", "blue"]
+
+
+def test_simplify_table_drops_collapsed():
+    """ Tests that shapes simplified away without preserving topology are
+        dropped along with their properties.
+    """
+    table = GeometryTable.from_shapes(
+        [
+            Polygon([(0.0, 0.0), (0.1, 0.0), (0.1, 0.1), (0.0, 0.1)]),
+            Polygon([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0), (0.0, 10.0)]),
+        ],
+        {"color": np.array(["red", "blue"], dtype=object)},
+    )
+
+    simplified, _ = simplify_table(table, 1.0, preserve_topology=False)
+    preserved, _ = simplify_table(table, 1.0)
+
+    assert simplified.properties["color"].tolist() == ["blue"]
+    assert len(preserved) == 2
+
+
+def test_simplify_table_no_tolerance():
+    """ Tests that the simplify_table function returns the table untouched
+        without a tolerance.
+    """
+    table = GeometryTable.from_shapes([LineString([(0, 0), (1, 0), (2, 0)])])
+
+    assert simplify_table(table, 0) == (table, 0)
@@ -0,0 +1,265 @@
+import numpy as np
+import os
+import pytest
+
+from csv import DictReader
+from shapely import box
+from shapely.geometry import Point
+
+from bokeh.document import Document
+from bokeh.events import RangesUpdate
+from map_maker.bokeh import make_vector_tile_document
+from map_maker.folium import make_vector_tile_plot as make_folium_plot
+from map_maker.tiles import (
+    assign_tiles,
+    iter_tile_jobs,
+    read_metadata,
+    read_tiles,
+    thin_points,
+    tile_bounds,
+    write_tiles,
+)
+from map_maker.util import extract_geometry_tables
+from map_maker.util.cluster import MERC_HALF_WORLD
+
+mapbox_vector_tile = pytest.importorskip("mapbox_vector_tile")
+
+
+@pytest.fixture()
+def test_data():
+    """ Fixture that reads in the test data.
+    """
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    test_data_points = os.path.join(
+        current_dir, "test_data/test_data_points.csv"
+    )
+    test_data_polygons_lines = os.path.join(
+        current_dir, "test_data/test_data_polygons_lines.csv"
+    )
+
+    dataset = [line for line in DictReader(open(test_data_points, "r"))] + [
+        line for line in DictReader(open(test_data_polygons_lines, "r"))
+    ]
+
+    return dataset
+
+
+def _read_tile(tile_dir, z, x, y):
+    path = os.path.join(tile_dir, str(z), str(x), "{}.pbf".format(y))
+    with open(path, "rb") as f:
+        return mapbox_vector_tile.decode(f.read())
+
+
+def test_tile_bounds():
+    """ Tests that tile_bounds returns the Web Mercator extent of XYZ tiles,
+        with y counting down from the top.
+    """
+    assert tile_bounds(0, 0, 0) == pytest.approx(
+        (-MERC_HALF_WORLD, -MERC_HALF_WORLD, MERC_HALF_WORLD, MERC_HALF_WORLD)
+    )
+    assert tile_bounds(1, 1, 0) == pytest.approx(
+        (0.0, 0.0, MERC_HALF_WORLD, MERC_HALF_WORLD)
+    )
+
+
+def test_assign_tiles():
+    """ Tests that assign_tiles lists every tile a shape's bounding box
+        touches.
+    """
+    shapes = np.array(
+        [
+            Point(1.0, 1.0),
+            box(-1.0, -1.0, 1.0, 1.0),
+            Point(MERC_HALF_WORLD * 2, -MERC_HALF_WORLD * 2),
+        ]
+    )
+
+    x, y, rows = assign_tiles(shapes, 1)
+
+    assert sorted(zip(rows.tolist(), x.tolist(), y.tolist())) == [
+        (0, 1, 0),
+        (1, 0, 0),
+        (1, 0, 1),
+        (1, 1, 0),
+        (1, 1, 1),
+        # Outside of the world is clipped to the edge tiles.
+        (2, 1, 1),
+    ]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_write_tiles(test_data, tmp_path, jobs):
+    """ Tests that write_tiles writes a decodable pyramid with every point
+        in the single zoom 0 tile, and the metadata.
+    """
+    tile_dir = str(tmp_path)
+    metadata = write_tiles(
+        test_data, tile_dir, max_zoom=3, jobs=jobs, thin_zoom=0
+    )
+
+    assert metadata == read_metadata(tile_dir)
+    assert metadata["minzoom"] == 0
+    assert metadata["maxzoom"] == 3
+    assert metadata["layers"]["points"] == [
+        "color",
+        "alpha",
+        "date",
+        "classification",
+    ]
+    assert metadata["bounds"] == pytest.approx(
+        [-103.7439, 28.725, -93.61667, 36.0]
+    )
+    assert sorted(os.listdir(tile_dir)) == [
+        "0",
+        "1",
+        "2",
+        "3",
+        "metadata.json",
+    ]
+
+    tile = _read_tile(tile_dir, 0, 0, 0)
+    assert len(tile["points"]["features"]) == 203
+    assert len(tile["linestrings"]["features"]) == 3
+    assert len(tile["polygons"]["features"]) == 4
+    assert tile["points"]["features"][0]["properties"]["color"] == "black"
+
+
+def test_write_tiles_thin(test_data, tmp_path):
+    """ Tests that write_tiles thins the points to one per pixel below
+        thin_zoom, and keeps every point from there up.
+    """
+    tile_dir = str(tmp_path)
+    write_tiles(test_data, tile_dir, max_zoom=1, jobs=1)
+    points = extract_geometry_tables(test_data)[0].to_shapes()
+
+    thinned = _read_tile(tile_dir, 0, 0, 0)["points"]["features"]
+    assert len(thinned) == len(thin_points(points, 0)) < 203
+    # Texas is in the north west zoom 1 tile.
+    full = _read_tile(tile_dir, 1, 0, 0)["points"]["features"]
+    assert len(full) == 203
+
+
+def test_thin_points():
+    """ Tests that thin_points keeps the first point in every pixel.
+    """
+    pixel = 2 * MERC_HALF_WORLD / 2 ** 2 / 256
+    shapes = np.array(
+        [
+            Point(0.1 * pixel, 0.1 * pixel),
+            Point(0.5 * pixel, 0.2 * pixel),
+            Point(1.5 * pixel, 0.2 * pixel),
+            Point(0.9 * pixel, 0.9 * pixel),
+        ]
+    )
+
+    assert thin_points(shapes, 2).tolist() == [0, 2]
+    assert thin_points(shapes, 4).tolist() == [0, 1, 2, 3]
+
+
+def test_iter_tile_jobs(test_data):
+    """ Tests that iter_tile_jobs lazily yields one job per tile, with a
+        layer entry for every layer in the tile.
+    """
+    tables = extract_geometry_tables(test_data)
+    jobs = iter_tile_jobs(tables, 2)
+
+    assert iter(jobs) is jobs
+    jobs = list(jobs)
+    tiles = [tile for tile, _ in jobs]
+    assert len(set(tiles)) == len(tiles)
+    assert all(tile[0] == 2 for tile in tiles)
+    n_points = sum(
+        len(shapes)
+        for _, layers in jobs
+        for name, shapes, _ in layers
+        if name == "points"
+    )
+    assert n_points >= 203
+    for _, layers in jobs:
+        names = [name for name, _, _ in layers]
+        assert len(set(names)) == len(names)
+        assert all(
+            len(shapes) == len(properties)
+            for _, shapes, properties in layers
+        )
+
+
+def test_write_tiles_bad_zoom(test_data, tmp_path):
+    """ Tests that write_tiles raises a ValueError when min_zoom is above
+        max_zoom.
+    """
+    with pytest.raises(ValueError):
+        write_tiles(test_data, str(tmp_path), min_zoom=4, max_zoom=3)
+
+
+def test_read_tiles(test_data, tmp_path):
+    """ Tests that read_tiles decodes the tiles covering the bounds back
+        into Web Mercator tables, with every point once.
+    """
+    tile_dir = str(tmp_path)
+    write_tiles(test_data, tile_dir, max_zoom=3, jobs=1)
+    # Texas is in the northern half of the world.
+    north = (-MERC_HALF_WORLD, 1.0, MERC_HALF_WORLD, MERC_HALF_WORLD)
+    south = (-MERC_HALF_WORLD, -MERC_HALF_WORLD, MERC_HALF_WORLD, -1.0)
+    truth = extract_geometry_tables(test_data)[0]
+
+    points, linestrings, polygons = read_tiles(tile_dir, 3, north)
+
+    assert len(points) == 203
+    assert len(linestrings) == 3
+    assert len(polygons) == 4
+    assert list(points.properties) == [
+        "color",
+        "alpha",
+        "date",
+        "classification",
+    ]
+    # Quantized to the 4096 grid of a zoom 3 tile.
+    np.testing.assert_allclose(
+        np.sort(points.coords, axis=0),
+        np.sort(truth.coords, axis=0),
+        atol=2 * MERC_HALF_WORLD / 8 / 4096,
+    )
+    assert len(read_tiles(tile_dir, 3, south)[0]) == 0
+
+
+def test_make_vector_tile_document(test_data, tmp_path):
+    """ Tests that the Bokeh vector tile document draws the tiles for the
+        view and reloads them at the zoom level of a new view.
+    """
+    tile_dir = str(tmp_path)
+    write_tiles(test_data, tile_dir, max_zoom=3, jobs=1)
+    doc = Document()
+    make_vector_tile_document(tile_dir)(doc)
+    map_plot = doc.roots[0]
+    points = map_plot.select_one({"name": "points"}).data_source
+
+    # The whole of the data fits past the highest zoom level.
+    assert len(points.data["x"]) == 203
+    assert set(points.data) >= {"x", "y", "color", "date", "classification"}
+    assert map_plot.select_one({"name": "polygons"}) is not None
+
+    # The whole world is zoom level 0, which is thinned.
+    map_plot._trigger_event(
+        RangesUpdate(
+            map_plot,
+            x0=-MERC_HALF_WORLD,
+            x1=MERC_HALF_WORLD,
+            y0=-MERC_HALF_WORLD,
+            y1=MERC_HALF_WORLD,
+        )
+    )
+
+    assert 0 < len(points.data["x"]) < 203
+
+
+def test_make_vector_tile_plot_folium(test_data, tmp_path):
+    """ Tests that the folium vector tile map loads the tiles with
+        VectorGrid.
+    """
+    write_tiles(test_data, str(tmp_path), max_zoom=2, jobs=1)
+    html = make_folium_plot(str(tmp_path)).get_root().render()
+
+    assert "Leaflet.VectorGrid.bundled.min.js" in html
+    assert 'L.vectorGrid.protobuf("{z}/{x}/{y}.pbf"' in html
+    assert "maxNativeZoom: 2" in html
@@ -1,4 +1,7 @@
 import pytest
+import io
+import json
+import numpy as np
 
 from shapely.geometry import (
     Point,
@@ -9,7 +12,52 @@ from shapely.geometry import (
     MultiPolygon,
     MultiPoint,
 )
-from map_maker.util import to_shape, extract_geometries, get_bounds, to_geojson
+from map_maker.util import (
+    lla_to_merc,
+    sniff_shape_format,
+    detect_shape_format,
+    to_shape,
+    to_shapes,
+    extract_geometries,
+    extract_geometry_tables,
+    iter_geometries,
+    iter_geometry_tables,
+    get_bounds,
+    to_property_columns,
+    to_geojson,
+    dumps_geojson,
+    write_geojson,
+    BoundsAccumulator,
+    GeometryTable,
+)
+
+
+def test_lla_to_merc():
+    """ Tests that the lla_to_merc function projects a single shape.
+    """
+    truth = Point(-10875914.250502829, 3542170.62764302)
+    answer = lla_to_merc(Point(-97.7, 30.3))
+
+    assert truth.equals_exact(answer, 1e-6)
+
+
+def test_lla_to_merc_array():
+    """ Tests that the lla_to_merc function projects an array of shapes of
+        different types in one go.
+    """
+    shapes = np.array(
+        [Point(0.0, 0.0), LineString([[0.0, 0.0], [1.0, 1.0]])], dtype=object
+    )
+
+    truth = [
+        Point(0.0, 0.0),
+        LineString([[0.0, 0.0], [111319.490793, 111325.142866]]),
+    ]
+    answer = lla_to_merc(shapes)
+
+    assert len(answer) == 2
+    for t, a in zip(truth, answer):
+        assert t.equals_exact(a, 1e-6)
 
 
 def test_to_shape_wkt():
@@ -48,6 +96,27 @@ def test_to_shape_non_serializable_string():
         to_shape("POINT ( 0.0")
 
 
+def test_to_shape_wkb():
+    """ Tests that the to_shape function works when the input shape is WKB.
+    """
+    shape_ser = Point(0.0, 0.0).wkb
+    truth = Point(0.0, 0.0)
+    answer = to_shape(shape_ser)
+
+    assert truth == answer
+
+
+def test_to_shape_hex_wkb():
+    """ Tests that the to_shape function works when the input shape is hex
+        encoded WKB.
+    """
+    shape_ser = Point(0.0, 0.0).wkb_hex
+    truth = Point(0.0, 0.0)
+    answer = to_shape(shape_ser)
+
+    assert truth == answer
+
+
 def test_to_shape_mapping():
     """ Tests that the to_shape function returns the correct value when the
         input is a mapping.
@@ -78,6 +147,119 @@ def test_to_shape_non_serializable_object():
         to_shape(3)
 
 
+def test_to_shape_shape_format():
+    """ Tests that the to_shape function uses the provided shape format.
+    """
+    shape_ser = '{"type": "Point", "coordinates": [0.0, 0.0]}'
+    truth = Point(0.0, 0.0)
+    answer = to_shape(shape_ser, shape_format="geojson")
+
+    assert truth == answer
+
+
+def test_to_shape_wrong_shape_format():
+    """ Tests that the to_shape function raises a TypeError when the input
+        doesn't match the provided shape format.
+    """
+    with pytest.raises(TypeError):
+        to_shape("POINT (0.0 0.0)", shape_format="geojson")
+
+
+def test_to_shape_unknown_shape_format():
+    """ Tests that the to_shape function raises a ValueError when the shape
+        format isn't known.
+    """
+    with pytest.raises(ValueError):
+        to_shape("POINT (0.0 0.0)", shape_format="kml")
+
+
+def test_sniff_shape_format():
+    """ Tests that the sniff_shape_format function returns the correct
+        format for each kind of input.
+    """
+    assert sniff_shape_format("  POINT (0.0 0.0)") == "wkt"
+    assert sniff_shape_format('  {"type": "Point"}') == "geojson"
+    assert sniff_shape_format(Point(0.0, 0.0).wkb) == "wkb"
+    assert sniff_shape_format(Point(0.0, 0.0).wkb_hex) == "hexwkb"
+    assert sniff_shape_format({"type": "Point"}) == "mapping"
+    assert sniff_shape_format(Point(0.0, 0.0)) == "shapely"
+    assert sniff_shape_format("( 0.0") is None
+    assert sniff_shape_format(3) is None
+
+
+def test_detect_shape_format():
+    """ Tests that the detect_shape_format function returns the most common
+        format in the sample.
+    """
+    shape_sers = [
+        '{"type": "Point", "coordinates": [0.0, 0.0]}',
+        '{"type": "Point", "coordinates": [1.0, 1.0]}',
+        "POINT (2.0 2.0)",
+    ]
+
+    assert detect_shape_format(shape_sers) == "geojson"
+    assert detect_shape_format(shape_sers[2:]) == "wkt"
+    assert detect_shape_format([3, None]) is None
+
+
+def test_to_shapes():
+    """ Tests that the to_shapes function parses a mixed column of WKT,
+        GeoJSON, mappings and shapes in order.
+    """
+    shape_sers = [
+        "POINT (0.0 0.0)",
+        '{"type": "Point", "coordinates": [1.0, 1.0]}',
+        {"type": "Point", "coordinates": [2.0, 2.0]},
+        Point(3.0, 3.0),
+        "LINESTRING (0.0 0.0, 1.0 1.0)",
+    ]
+
+    truth = [
+        Point(0.0, 0.0),
+        Point(1.0, 1.0),
+        Point(2.0, 2.0),
+        Point(3.0, 3.0),
+        LineString([[0.0, 0.0], [1.0, 1.0]]),
+    ]
+    answer = to_shapes(shape_sers)
+
+    assert truth == list(answer)
+
+
+def test_to_shapes_wkb():
+    """ Tests that the to_shapes function parses columns of binary and hex
+        encoded WKB.
+    """
+    truth = [Point(0.0, 0.0), LineString([[0.0, 0.0], [1.0, 1.0]])]
+
+    assert truth == list(to_shapes([t.wkb for t in truth]))
+    assert truth == list(to_shapes([t.wkb_hex for t in truth]))
+    assert truth == list(
+        to_shapes([t.wkb_hex for t in truth], shape_format="hexwkb")
+    )
+
+
+def test_to_shapes_non_serializable_string():
+    """ Tests that the to_shapes function raises a TypeError when one of the
+        inputs is a non-geometric string.
+    """
+    with pytest.raises(TypeError):
+        to_shapes(["POINT (0.0 0.0)", "POINT ( 0.0"])
+
+
+def test_to_shapes_shape_format():
+    """ Tests that the to_shapes function raises a TypeError when a row
+        doesn't match the provided shape format.
+    """
+    shape_sers = [
+        '{"type": "Point", "coordinates": [0.0, 0.0]}',
+        "POINT (1.0 1.0)",
+    ]
+
+    with pytest.raises(TypeError):
+        to_shapes(shape_sers, shape_format="geojson")
+
+
 def test_extract_geometries():
     """ Tests that the extract_geometries function returns the correct
         value.
@@ -104,7 +286,7 @@ def test_extract_geometries():
         {"shape": box(0.0, 0.0, 1.0, 1.0), "color": "red", "x": 4},
         {
             "shape": MultiPolygon(
-                box(0.0, 0.0, 0.5, 0.5), box(0.5, 0.5, 1.0, 1.0)
+                [box(0.0, 0.0, 0.5, 0.5), box(0.5, 0.5, 1.0, 1.0)]
             ),
             "color": "green",
             "x": 5,
@@ -115,6 +297,9 @@ def test_extract_geometries():
 
     assert len(points) == 3
     assert isinstance(points[0]["shape_obj"], Point)
+    assert points[0]["shape"] is shape_data[0]["shape"]
+    assert points[2]["shape"] is shape_data[1]["shape"]
+    assert set(points[0]) == {"shape", "shape_obj", "color", "x"}
     assert points[0]["color"] == "black"
     assert points[0]["x"] == 1
     assert isinstance(points[1]["shape_obj"], Point)
@@ -136,6 +321,144 @@ def test_extract_geometries():
     assert polygons[1]["x"] == 5
 
 
+def test_extract_geometries_mixed_columns():
+    """ Tests that the extract_geometries function only gives every record
+        the keys of its own row, so the defaults fill in the rest.
+    """
+    shape_data = [
+        {"shape": "POINT (1 2)", "alpha": "0.2", "color": "red"},
+        {"shape": "POINT (3 4)"},
+    ]
+
+    points, _, _ = extract_geometries(shape_data)
+
+    assert set(points[0]) == {"shape", "shape_obj", "alpha", "color"}
+    assert set(points[1]) == {"shape", "shape_obj"}
+
+    features = to_geojson(points, "black", 0.5, 3)["features"]
+    assert features[1]["properties"]["color"] == "black"
+    assert features[1]["properties"]["alpha"] == 0.5
+
+
+def test_extract_geometry_tables():
+    """ Tests that the extract_geometry_tables function splits the data into
+        tables and only keeps the columns each layer has.
+    """
+    shape_data = [
+        {"shape": "MULTIPOINT (1.0 1.0, 2.0 2.0)", "x": 1},
+        {"shape": "LINESTRING (0.0 0.0, 1.0 1.0)", "y": "a"},
+        {"shape": "POLYGON ((0 0, 1 0, 1 1, 0 0))", "x": 2, "y": "b"},
+        {"shape": "POINT EMPTY", "x": 3},
+    ]
+
+    points, linestrings, polygons = extract_geometry_tables(
+        shape_data, project=False
+    )
+
+    assert len(points) == 2
+    assert points.properties["x"].tolist() == [1, 1]
+    assert list(points.properties) == ["x"]
+    assert len(linestrings) == 1
+    assert list(linestrings.properties) == ["y"]
+    assert len(polygons) == 1
+    assert polygons.properties["x"].tolist() == [2]
+    assert polygons.properties["y"].tolist() == ["b"]
+
+
+def test_extract_geometry_tables_chunks():
+    """ Tests that the extract_geometry_tables function gives the same result
+        when a generator is consumed in chunks, and collects the bounds.
+    """
+    shape_data = [
+        {"shape": "POINT ({} {})".format(ii, -ii), "x": ii} for ii in range(5)
+    ] + [{"shape": "LINESTRING (0 0, 10 1)", "x": 5}]
+    bounds = BoundsAccumulator()
+
+    points, linestrings, _ = extract_geometry_tables(
+        (sd for sd in shape_data), project=False, chunk_size=2, bounds=bounds
+    )
+
+    assert points.properties["x"].tolist() == [0, 1, 2, 3, 4]
+    assert points.coords[:, 1].tolist() == [0, -1, -2, -3, -4]
+    assert len(linestrings) == 1
+    assert bounds.bounds == (0.0, -4.0, 10.0, 1.0)
+
+
+def test_extract_geometry_tables_workers():
+    """ Tests that the extract_geometry_tables function gives the same result
+        in input order when the chunks are parsed by worker processes.
+    """
+    shape_data = [
+        {"shape": "POINT ({} {})".format(ii, -ii), "x": ii} for ii in range(50)
+    ] + [{"shape": "LINESTRING (0 0, 10 1)", "x": 50}]
+    bounds = BoundsAccumulator()
+
+    truth = extract_geometry_tables(shape_data, chunk_size=7)
+    answer = extract_geometry_tables(
+        (sd for sd in shape_data), chunk_size=7, bounds=bounds, workers=2
+    )
+
+    for truth_table, answer_table in zip(truth, answer):
+        assert np.array_equal(truth_table.coords, answer_table.coords)
+    assert answer[0].properties["x"].tolist() == list(range(50))
+    assert answer[1].properties["x"].tolist() == [50]
+    assert bounds.bounds is not None
+
+
+def test_iter_geometry_tables():
+    """ Tests that the iter_geometry_tables function yields one tuple of
+        tables per chunk.
+    """
+    shape_data = [
+        {"shape": "POINT (0 0)"},
+        {"shape": "POLYGON ((0 0, 1 0, 1 1, 0 0))"},
+        {"shape": "POINT (1 1)"},
+    ]
+
+    answer = list(
+        iter_geometry_tables(shape_data, project=False, chunk_size=2)
+    )
+
+    assert len(answer) == 2
+    assert [len(t) for t in answer[0]] == [1, 0, 1]
+    assert [len(t) for t in answer[1]] == [1, 0, 0]
+
+
+def test_iter_geometries():
+    """ Tests that the iter_geometries function yields the layer and record
+        of every shape and updates the bounds.
+    """
+    shape_data = [
+        {"shape": "MULTIPOINT (0 0, 1 1)", "x": 1},
+        {"shape": "LINESTRING (0 0, 2 2)", "x": 2},
+    ]
+    bounds = BoundsAccumulator()
+
+    answer = list(iter_geometries(shape_data, project=False, bounds=bounds))
+
+    assert [layer for layer, _ in answer] == [
+        "points",
+        "points",
+        "linestrings",
+    ]
+    assert answer[1][1] == {"x": 1, "shape_obj": Point(1, 1)}
+    assert bounds.bounds == (0.0, 0.0, 2.0, 2.0)
+
+
+def test_bounds_accumulator():
+    """ Tests that the BoundsAccumulator merges bounds and ignores None.
+    """
+    bounds = BoundsAccumulator()
+
+    assert bounds.bounds is None
+
+    bounds.update((0.0, 1.0, 2.0, 3.0))
+    bounds.update(None)
+    bounds.update((-1.0, 2.0, 1.0, 4.0))
+
+    assert bounds.bounds == (-1.0, 1.0, 2.0, 4.0)
+
+
 def test_get_bounds():
     """ Tests that the _get_bounds function returns the correct value.
     """
@@ -147,6 +470,46 @@ def test_get_bounds():
     assert truth == answer
 
 
+def test_get_bounds_layers():
+    """ Tests that the get_bounds function merges the bounds of several
+        layers, including linestring-only data and GeometryTables.
+    """
+    linestrings = [{"shape_obj": LineString([[0.0, 0.0], [2.0, 1.0]])}]
+    polygons = GeometryTable.from_shapes([box(-1.0, 0.0, 1.0, 3.0)])
+
+    assert get_bounds([], linestrings, []) == (0.0, 0.0, 2.0, 1.0)
+    assert get_bounds([], linestrings, polygons) == (-1.0, 0.0, 2.0, 3.0)
+
+
+def test_get_bounds_empty():
+    """ Tests that the get_bounds function returns None when there are no
+        shapes.
+    """
+    assert get_bounds([], GeometryTable.from_shapes([])) is None
+    assert get_bounds([{"shape_obj": Point()}]) is None
+
+
+def test_to_property_columns():
+    """ Tests that the to_property_columns function fills in the style
+        defaults and converts alpha and size to floats.
+    """
+    table = GeometryTable.from_shapes(
+        [Point(0.0, 0.0), Point(1.0, 1.0)],
+        {
+            "color": np.array(["green", None], dtype=object),
+            "size": np.array(["3", "4.5"], dtype=object),
+            "x": np.array([1, 2], dtype=object),
+        },
+    )
+
+    answer = to_property_columns(table, "blue", 0.5, 1.0)
+
+    assert answer["color"].tolist() == ["green", "blue"]
+    assert answer["alpha"].tolist() == [0.5, 0.5]
+    assert answer["size"].tolist() == [3.0, 4.5]
+    assert answer["x"].tolist() == [1, 2]
+
+
 def test_to_geojson():
     """ Tests that the _to_geojson function returns the correct value.
     """
@@ -181,6 +544,49 @@ def test_to_geojson():
     assert truth == answer
 
 
+def test_to_geojson_table():
+    """ Tests that the to_geojson function returns the correct value for a
+        GeometryTable, filling in defaults for missing values.
+    """
+    table = GeometryTable.from_shapes(
+        [Point(0.0, 0.0), Point(1.0, 1.0)],
+        {
+            "color": np.array(["green", None], dtype=object),
+            "x": np.array([1, 2], dtype=object),
+        },
+    )
+
+    truth = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "color": "green",
+                    "alpha": 1.0,
+                    "size": 1.0,
+                    "x": 1,
+                },
+                "geometry": {"type": "Point", "coordinates": [0.0, 0.0]},
+            },
+            {
+                "type": "Feature",
+                "properties": {
+                    "color": "blue",
+                    "alpha": 1.0,
+                    "size": 1.0,
+                    "x": 2,
+                },
+                "geometry": {"type": "Point", "coordinates": [1.0, 1.0]},
+            },
+        ],
+    }
+
+    answer = to_geojson(table, "blue", 1.0, 1.0)
+
+    assert truth == answer
+
+
 def test_to_geojson_default_color_alpha():
     """ Tests that the to_geojson function returns the correct value when
         default color, alpha and size are provided.
@@ -206,3 +612,70 @@ def test_to_geojson_default_color_alpha():
     answer = to_geojson(shape_data, "blue", 1.0, 1.0)
 
     assert truth == answer
+
+
+@pytest.fixture()
+def geojson_shape_data():
+    """ Fixture with shape data dicts for the GeoJSON serializers.
+    """
+    return [
+        {
+            "shape_obj": Point(0.0, 0.0),
+            "color": "green",
+            "alpha": "0.3",
+            "x": 1,
+        },
+        {
+            "shape_obj": box(0.0, 0.0, 1.0, 1.0),
+            "size": 3,
+            "x": "a \"quoted\" string",
+        },
+    ]
+
+
+def test_dumps_geojson(geojson_shape_data):
+    """ Tests that the dumps_geojson function matches to_geojson for shape
+        data dicts.
+    """
+    truth = json.loads(
+        json.dumps(to_geojson(geojson_shape_data, "blue", 1.0, 1.0))
+    )
+    answer = json.loads(dumps_geojson(geojson_shape_data, "blue", 1.0, 1.0))
+
+    assert truth == answer
+
+
+def test_dumps_geojson_table(geojson_shape_data):
+    """ Tests that the dumps_geojson function matches to_geojson for a
+        GeometryTable.
+    """
+    table = GeometryTable.from_shapes(
+        [sd["shape_obj"] for sd in geojson_shape_data],
+        {
+            "color": np.array(["green", None], dtype=object),
+            "size": np.array([None, 3], dtype=object),
+            "x": np.array([1, "a"], dtype=object),
+        },
+    )
+
+    truth = json.loads(json.dumps(to_geojson(table, "blue", 1.0, 1.0)))
+    answer = json.loads(dumps_geojson(table, "blue", 1.0, 1.0))
+
+    assert truth == answer
+
+
+def test_write_geojson(geojson_shape_data):
+    """ Tests that the write_geojson function writes the same thing as
+        dumps_geojson.
+    """
+    fp = io.StringIO()
+    write_geojson(geojson_shape_data, fp, "blue", 1.0, 1.0)
+
+    truth = dumps_geojson(geojson_shape_data, "blue", 1.0, 1.0)
+    answer = fp.getvalue()
+
+    assert truth == answer
+    assert json.loads(dumps_geojson([], "blue", 1.0, 1.0)) == {
+        "type": "FeatureCollection",
+        "features": [],
+    }
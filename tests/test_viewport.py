@@ -0,0 +1,80 @@
+import numpy as np
+
+from shapely.geometry import LineString, Point, box
+
+from map_maker.util import GeometryTable, ViewportIndex
+
+
+def _index():
+    points = GeometryTable.from_shapes(
+        [Point(5.0, 5.0), Point(0.5, 0.5), Point(0.6, 0.6), Point(-5.0, 0.0)],
+        {"id": np.arange(4)},
+    )
+    linestrings = GeometryTable.from_shapes(
+        [
+            LineString([(0.0, 0.0), (0.5, 0.01), (1.0, 0.0)]),
+            LineString([(8.0, 8.0), (9.0, 9.0)]),
+        ],
+        {"id": np.arange(2)},
+    )
+    polygons = GeometryTable.from_shapes(
+        [box(-1.0, -1.0, 2.0, 2.0)], {"id": np.arange(1)}
+    )
+    return ViewportIndex(points, linestrings, polygons)
+
+
+def test_viewport_index_bounds():
+    """ Tests that the ViewportIndex bounds cover every layer.
+    """
+    assert _index().bounds() == (-5.0, -1.0, 9.0, 9.0)
+
+
+def test_viewport_index_query():
+    """ Tests that the ViewportIndex returns just the shapes in view, with
+        their properties.
+    """
+    points, linestrings, polygons = _index().query((0.0, 0.0, 1.0, 1.0))
+
+    assert sorted(points.properties["id"].tolist()) == [1, 2]
+    assert linestrings.properties["id"].tolist() == [0]
+    assert len(linestrings.coords) == 3
+    assert polygons.properties["id"].tolist() == [0]
+
+
+def test_viewport_index_query_screen_resolution():
+    """ Tests that the ViewportIndex keeps one point per pixel and
+        simplifies the shapes to a pixel when given the plot size.
+    """
+    points, linestrings, _ = _index().query((0.0, 0.0, 1.0, 1.0), 2, 2)
+
+    assert len(points) == 1
+    # The middle vertex is well inside a pixel of the line.
+    assert len(linestrings.coords) == 2
+
+
+def test_viewport_index_query_points_grid():
+    """ Tests that the ViewportIndex point grid finds the same points as a
+        scan of every point, and only looks at the cells in view, for a
+        tall, narrow dataset and a thin horizontal strip.
+    """
+    rng = np.random.default_rng(0)
+    coords = rng.random((20000, 2)) * [1.0, 1000.0]
+    empty = GeometryTable.from_shapes(np.empty(0, dtype=object))
+    index = ViewportIndex(
+        GeometryTable.from_shapes(
+            [Point(x, y) for x, y in coords], {"id": np.arange(len(coords))}
+        ),
+        empty,
+        empty,
+    )
+    strip = (0.0, 500.0, 1.0, 501.0)
+
+    answer = index.query_points(strip).properties["id"]
+
+    x, y = coords.T
+    truth = np.flatnonzero(
+        (x >= strip[0]) & (x <= strip[2]) & (y >= strip[1]) & (y <= strip[3])
+    )
+    assert sorted(answer.tolist()) == truth.tolist()
+    assert len(index._candidate_rows(strip)) < len(coords) / 10
+    assert len(index.query_points((5.0, 5.0, 6.0, 6.0))) == 0